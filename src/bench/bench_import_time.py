@@ -0,0 +1,102 @@
+"""
+@author Eric Zair
+@file bench_import_time.py
+
+Benchmark of how long it takes to import the bsaber modules, using python -X importtime.
+
+Each module is imported in a fresh interpreter, a few times over, and the fastest run is
+reported along with the slowest modules it pulled in. With --check, the run fails if any of
+them pulled in the http, html parsing or multiprocessing stacks, which are only imported
+once a download, a listing parse or a worker pool is actually needed.
+
+Run from the src/ folder:
+    python bench/bench_import_time.py
+    python bench/bench_import_time.py --check
+"""
+
+# Handling the arguments.
+import argparse
+
+# Importing each module in a fresh interpreter.
+import subprocess
+import sys
+
+# Handling file system navigation and paths.
+from os.path import dirname, abspath
+from os import environ, pathsep
+
+
+""" Modules that are timed. None of them may import the web stack up front. """
+MODULES = ['bsaber.extractor', 'bsaber.library', 'bsaber.scraper']
+
+""" Modules that none of the timed modules may import. """
+FORBIDDEN_MODULES = ['requests', 'urllib3', 'bs4', 'ssl', 'http.client', 'html.parser',
+                     'multiprocessing', 'concurrent.futures']
+
+""" Number of times each module is imported. The fastest run is reported. """
+NUMBER_OF_RUNS = 5
+
+
+def time_import(module, path_to_src):
+    """Import module in a fresh interpreter with -X importtime.
+
+    Returns:
+        dict(str, int): imported module name -> cumulative microseconds that it took.
+    """
+    environment = dict(environ)
+    environment['PYTHONPATH'] = path_to_src + pathsep + environ.get('PYTHONPATH', '')
+
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                               env=environment, capture_output=True, text=True, check=True)
+    import_times = {}
+
+    # Each line reads 'import time: <self us> | <cumulative us> | <indented name>'.
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+
+        _, cumulative, name = line[len('import time:'):].split('|')
+
+        if cumulative.strip().isdigit():
+            import_times[name.strip()] = int(cumulative)
+
+    return import_times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time importing the bsaber modules.")
+    parser.add_argument('--runs', type=int, default=NUMBER_OF_RUNS,
+                        help="Number of times each module is imported.")
+    parser.add_argument('--top', type=int, default=5,
+                        help="Number of the slowest dependencies shown for each module.")
+    parser.add_argument('--check', action='store_true',
+                        help="Fail if a timed module imports the web stack.")
+    arguments = parser.parse_args()
+
+    path_to_src = dirname(dirname(abspath(__file__)))
+    failed = False
+
+    for module in MODULES:
+        runs = [time_import(module, path_to_src) for _ in range(arguments.runs)]
+        fastest = min(runs, key=lambda import_times: import_times.get(module, 0))
+
+        print(f"{module:<20} {fastest.get(module, 0) / 1000:8.2f} ms "
+              f"({len(fastest)} modules imported)")
+
+        dependencies = sorted(((import_time, name) for name, import_time in fastest.items()
+                               if name != module), reverse=True)
+        for import_time, name in dependencies[: arguments.top]:
+            print(f"\t{name:<30} {import_time / 1000:8.2f} ms")
+
+        forbidden = [name for name in FORBIDDEN_MODULES if name in fastest]
+
+        if forbidden:
+            print(f"\t{module} imports {', '.join(forbidden)}")
+            failed = True
+
+    if arguments.check and failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+@author Eric Zair
+@file bench_listing_parser.py
+
+Micro-benchmark comparing parse_listing() against the old BeautifulSoup listing parser
+on the saved listing and search pages in bench/fixtures/.
+
+Run from the src/ folder:
+    python bench/bench_listing_parser.py
+"""
+
+# Timing each parser.
+import timeit
+
+# Handling file system navigation and paths.
+from os.path import join, dirname, abspath
+import sys
+
+# Makes the bsaber package importable when run as a script from anywhere.
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+# The parsers being compared.
+from bs4 import BeautifulSoup  # noqa: E402
+from bsaber.listing_parser import parse_listing  # noqa: E402
+import re  # noqa: E402
+
+
+""" Saved pages that each parser is timed on, and the number of cards to skip on each. """
+FIXTURE_PAGES = [('listing_new.html', 0), ('listing_top_30_days.html', 0), ('search_light.html', 1)]
+
+""" Number of times each page is parsed per timing run. """
+NUMBER_OF_PARSES = 50
+
+
+def parse_listing_with_beautifulsoup(html, number_of_songs=21, skip=0):
+    """The parser that SongScraper used before parse_listing(), kept here to compare against.
+
+    Returns:
+        dict(str, str): <song_title> -> <song_key>.
+    """
+    soup = BeautifulSoup(html, features='html.parser')
+    dict_of_songs = {}
+
+    for bs4_song_tag in soup.find_all(re.compile('h4$'))[skip: number_of_songs]:
+        html_tags = str(bs4_song_tag).split('\n')
+        song_title = html_tags[2].strip(' </a>')
+        dict_of_songs[song_title] = \
+            html_tags[1].replace('<a href="https://bsaber.com/songs/', "")[: 4]
+
+    return dict_of_songs
+
+
+def parse_listing_with_tokenizer(html, number_of_songs=21, skip=0):
+    """parse_listing() collected into the same dict as the old parser.
+
+    Returns:
+        dict(str, str): <song_title> -> <song_key>.
+    """
+    return {record.title: record.key for record in parse_listing(html, number_of_songs, skip)}
+
+
+def main():
+    path_to_fixtures = join(dirname(abspath(__file__)), 'fixtures')
+
+    for page_name, skip in FIXTURE_PAGES:
+        with open(join(path_to_fixtures, page_name), 'r', encoding='utf-8') as page_file:
+            html = page_file.read()
+
+        print(f"{page_name} ({len(html) / 1024:.1f} KiB)")
+
+        for parser in [parse_listing_with_beautifulsoup, parse_listing_with_tokenizer]:
+            number_of_songs = len(parser(html, skip=skip))
+            best_time = min(timeit.repeat(lambda: parser(html, skip=skip),
+                                          number=NUMBER_OF_PARSES, repeat=5))
+
+            print(f"\t{parser.__name__:<35} {best_time / NUMBER_OF_PARSES * 1000:8.3f} ms/page "
+                  f"({number_of_songs} songs)")
+
+
+if __name__ == "__main__":
+    main()
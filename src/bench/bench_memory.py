@@ -0,0 +1,150 @@
+"""
+@author Eric Zair
+@file bench_memory.py
+
+Benchmark of how much memory a crawl, download and extract run takes as it gets bigger.
+
+Each run crawls 'new' on a local FixtureServer and streams every song it finds through
+SongScraper.download_extract_stream() into an empty custom_levels folder, while tracemalloc
+records the peak memory that Python allocated. The server runs in its own process, so the
+zipfiles that it serves are not counted. With --check, the run fails if the peak of the
+biggest run grew past --tolerance times the peak of the smallest one, since a streaming run
+should take the same memory however many songs it installs.
+
+Run from the src/ folder:
+    python bench/bench_memory.py
+    python bench/bench_memory.py --sizes 50 500 2000 --check
+"""
+
+# Handling the arguments and measuring the memory.
+import argparse
+import tempfile
+import tracemalloc
+import time
+
+# Running the fixture server in its own process.
+import subprocess
+import socket
+import sys
+
+# Handling file system navigation and paths.
+from os.path import join, dirname, abspath
+
+# Makes the bsaber package importable when run as a script from anywhere.
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+# The code being benchmarked.
+from bsaber.scraper import SongScraper  # noqa: E402
+from bsaber.response_cache import MemoryResponseCache  # noqa: E402
+
+
+""" Number of songs installed by each run. """
+SIZES = [50, 200, 800]
+
+""" How much the peak of the biggest run may grow past the peak of the smallest one. """
+TOLERANCE = 1.5
+
+
+def free_port():
+    """Return a port on 127.0.0.1 that nothing listens on."""
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def start_fixture_server(number_of_pages, zipfile_size):
+    """Start bench/fixture_server.py in its own process, and wait until it answers.
+
+    Returns:
+        (subprocess.Popen, str): The server's process, and its bsaber_site url.
+    """
+    port = free_port()
+    server_process = subprocess.Popen([sys.executable, join(dirname(abspath(__file__)),
+                                                            'fixture_server.py'),
+                                       '--port', str(port), '--pages', str(number_of_pages),
+                                       '--zipfile-size', str(zipfile_size)],
+                                      stdout=subprocess.DEVNULL)
+
+    for _ in range(100):
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return server_process, f'http://127.0.0.1:{port}/'
+        except OSError:
+            time.sleep(0.1)
+
+    server_process.kill()
+    raise RuntimeError("Error: the fixture server did not start.")
+
+
+def measure_run(bsaber_site, number_of_songs, max_workers):
+    """Crawl, download and extract number_of_songs songs into an empty folder.
+
+    Returns:
+        (int, int, float): The number of songs installed, the peak bytes that tracemalloc
+                           saw and the seconds that the run took.
+    """
+    with tempfile.TemporaryDirectory() as path_to_custom_levels:
+        scraper = SongScraper(path_to_custom_levels, bsaber_site=bsaber_site,
+                              beatsaver_download_url=bsaber_site + 'api/download/key/',
+                              response_cache=MemoryResponseCache(max_pages=0))
+        number_installed = 0
+
+        tracemalloc.start()
+        start_time = time.perf_counter()
+
+        songs = scraper.crawl_songs('new', number_of_songs=number_of_songs,
+                                    max_workers=max_workers)
+        for _, result in scraper.download_extract_stream(songs, display_error_message=False,
+                                                         max_workers=max_workers):
+            number_installed += result.success
+
+        elapsed = time.perf_counter() - start_time
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return number_installed, peak, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the peak memory of streaming runs.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES,
+                        help="Number of songs installed by each run.")
+    parser.add_argument('--zipfile-size', type=int, default=64 * 1024,
+                        help="Bytes per synthetic song.")
+    parser.add_argument('--jobs', type=int, default=8,
+                        help="Number of pages or songs fetched at once.")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help="How much the biggest run's peak may grow past the smallest's.")
+    parser.add_argument('--check', action='store_true',
+                        help="Fail if the peak grows past the tolerance.")
+    arguments = parser.parse_args()
+
+    # Each recorded page lists about 20 songs, and every page gets its own keys.
+    server_process, bsaber_site = start_fixture_server(max(arguments.sizes) // 10 + 1,
+                                                       arguments.zipfile_size)
+    peaks = []
+
+    try:
+        # Warms up the imports and caches that every run shares, so the first run is not
+        # charged for them.
+        measure_run(bsaber_site, min(arguments.sizes), arguments.jobs)
+
+        for number_of_songs in sorted(arguments.sizes):
+            number_installed, peak, elapsed = measure_run(bsaber_site, number_of_songs,
+                                                          arguments.jobs)
+            peaks.append(peak)
+            print(f"{number_of_songs:>6} songs: {number_installed:>6} installed, "
+                  f"peak {peak / 1024 / 1024:8.2f} MiB, {elapsed:7.2f} s")
+    finally:
+        server_process.terminate()
+        server_process.wait()
+
+    growth = peaks[-1] / peaks[0]
+    print(f"Peak grew {growth:.2f}x from the smallest run to the biggest.")
+
+    if arguments.check and growth > arguments.tolerance:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+@author Eric Zair
+@file fixture_server.py
+
+Contains the FixtureServer object, a local stand-in for bsaber.com and beatsaver.com.
+
+FixtureServer serves the recorded listing and search pages in bench/fixtures/ and
+synthetic song zipfiles, so SongScraper can be benchmarked without touching the internet.
+Point a SongScraper at it with:
+    SongScraper(path, bsaber_site=server.bsaber_site,
+                beatsaver_download_url=server.beatsaver_download_url)
+
+Run on its own from the src/ folder to browse it:
+    python bench/fixture_server.py --port 8080
+"""
+
+# Handling the http server.
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from urllib.parse import urlparse
+from io import BytesIO
+import argparse
+import hashlib
+import random
+import re
+import zipfile
+
+# Handling file system navigation and paths.
+from os.path import join, dirname, abspath
+
+
+""" Folder holding the recorded pages. """
+FIXTURES_FOLDER = join(dirname(abspath(__file__)), 'fixtures')
+
+""" Links to songs on the recorded pages. The key is captured. """
+SONG_LINK_PATTERN = re.compile(r'(bsaber\.com/songs/)([0-9a-f]+)/')
+
+""" /songs/<sorted by>/page/<page>/ and /page/<page>/ both pick the page of a listing or search. """
+PAGE_PATTERN = re.compile(r'/page/(\d+)/?$')
+
+
+def build_song_zipfile(key, size):
+    """Return the bytes of a synthetic song zipfile that is about size bytes big.
+
+    The audio is random so that it does not compress, like a real .egg. The same key always
+    gives the same bytes.
+    """
+    audio_size = max(size - 1024, 0)
+    random_bytes = random.Random(key).getrandbits(8 * audio_size).to_bytes(audio_size, 'little')
+    zip_buffer = BytesIO()
+
+    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as song_zipfile:
+        song_zipfile.writestr('info.dat', '{"_songName": "%s", "_songFilename": "song.egg", '
+                                          '"_coverImageFilename": "cover.jpg", '
+                                          '"_difficultyBeatmapSets": []}' % key)
+        song_zipfile.writestr('song.egg', random_bytes)
+        song_zipfile.writestr('cover.jpg', b'\xff\xd8\xff' + bytes(512))
+
+    return zip_buffer.getvalue()
+
+
+class FixtureServer():
+    """Local http server standing in for bsaber.com and beatsaver.com."""
+
+    def __init__(self, number_of_pages=10, zipfile_size=256 * 1024, port=0):
+        """Constructs a FixtureServer object. The server is not started until start() is called.
+
+        Args:
+            number_of_pages (int, optional): The number of pages each listing has. Any page
+                                             past it is a 404. Defaults to 10.
+
+            zipfile_size (int, optional): The size of each synthetic song zipfile in bytes.
+                                          Defaults to 256 KiB.
+
+            port (int, optional): The port to listen on, 0 to pick a free one. Defaults to 0.
+        """
+        self.number_of_pages = number_of_pages
+        self.zipfile_size = zipfile_size
+
+        """ Recorded pages by name, e.g. 'listing_new'. """
+        self.pages = {}
+        for page_name in ['listing_new', 'listing_top_30_days', 'search_light']:
+            with open(join(FIXTURES_FOLDER, page_name + '.html'), 'r', encoding='utf-8') as page:
+                self.pages[page_name] = page.read()
+
+        """ key -> zipfile bytes, so each zipfile is only built once. """
+        self.__zipfiles = {}
+
+        self.__http_server = ThreadingHTTPServer(('127.0.0.1', port), self.__handler_class())
+        self.__http_server.daemon_threads = True
+        self.__thread = None
+
+
+    @property
+    def bsaber_site(self):
+        """The url to pass a SongScraper as its bsaber_site."""
+        return f'http://127.0.0.1:{self.__http_server.server_port}/'
+
+
+    @property
+    def beatsaver_download_url(self):
+        """The url to pass a SongScraper as its beatsaver_download_url."""
+        return self.bsaber_site + 'api/download/key/'
+
+
+    def song_zipfile(self, key):
+        """Return the bytes of the synthetic zipfile for the song with the given key."""
+        if key not in self.__zipfiles:
+            self.__zipfiles[key] = build_song_zipfile(key, self.zipfile_size)
+
+        return self.__zipfiles[key]
+
+
+    def listing_page(self, path, query):
+        """Return the html for the listing or search page at path, None if there isn't one."""
+        page_match = PAGE_PATTERN.search(path)
+        page = int(page_match.group(1)) if page_match else 1
+
+        if page > self.number_of_pages:
+            return None
+
+        if query.startswith('s='):
+            html = self.pages['search_light']
+        elif path.startswith('/songs/new'):
+            html = self.pages['listing_new']
+        elif path.startswith('/songs/'):
+            html = self.pages['listing_top_30_days']
+        else:
+            return None
+
+        # Every page gets its own keys, so crawling many pages finds many songs.
+        return SONG_LINK_PATTERN.sub(lambda match: f'{match.group(1)}{match.group(2)}{page:x}/',
+                                     html)
+
+
+    def __handler_class(self):
+        """Return the request handler class, bound to this server."""
+        fixture_server = self
+
+        class FixtureRequestHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                url = urlparse(self.path)
+
+                if url.path.startswith('/api/download/key/'):
+                    key = url.path.rstrip('/').rsplit('/', 1)[-1]
+                    self.send_body(fixture_server.song_zipfile(key), 'application/zip')
+                    return
+
+                html = fixture_server.listing_page(url.path, url.query)
+
+                if html is None:
+                    self.send_body(b'Not Found', 'text/plain', status=404)
+                else:
+                    self.send_body(html.encode('utf-8'), 'text/html; charset=UTF-8')
+
+            def send_body(self, body, content_type, status=200):
+                etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+
+                if status == 200 and self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                # Honor 'Range: bytes=<start>-' so resumed downloads can be benchmarked too.
+                range_match = re.match(r'bytes=(\d+)-$', self.headers.get('Range', ''))
+                if status == 200 and range_match:
+                    start = int(range_match.group(1))
+                    self.send_response(206)
+                    self.send_header('Content-Range', f'bytes {start}-{len(body) - 1}/{len(body)}')
+                    body = body[start:]
+                else:
+                    self.send_response(status)
+
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+        return FixtureRequestHandler
+
+
+    def start(self):
+        """Start serving requests on a background thread."""
+        self.__thread = Thread(target=self.__http_server.serve_forever, daemon=True)
+        self.__thread.start()
+        return self
+
+
+    def serve_forever(self):
+        """Serve requests on this thread until the process is stopped."""
+        self.__http_server.serve_forever()
+
+
+    def stop(self):
+        """Stop serving requests."""
+        self.__http_server.shutdown()
+        self.__http_server.server_close()
+
+
+    def __enter__(self):
+        return self.start()
+
+
+    def __exit__(self, *exception_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for bsaber.com and beatsaver.com.')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--pages', type=int, default=10, help='pages per listing')
+    parser.add_argument('--zipfile-size', type=int, default=256 * 1024, help='bytes per song')
+    arguments = parser.parse_args()
+
+    server = FixtureServer(arguments.pages, arguments.zipfile_size, arguments.port)
+    print(f"Serving bsaber at {server.bsaber_site} and beatsaver at {server.beatsaver_download_url}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+@author Eric Zair
+@file run_benchmarks.py
+
+Offline benchmark suite for the SongScraper hot paths: parsing, listing fetch, download,
+extraction and local search. Everything runs against a local FixtureServer, so no request
+leaves the machine.
+
+Each benchmark reports its throughput and latency percentiles. The results are written as
+JSON so that two runs can be compared, e.g.:
+    python bench/run_benchmarks.py --output before.json
+    python bench/run_benchmarks.py --output after.json --baseline before.json
+"""
+
+# Timing and reporting each benchmark.
+import argparse
+import json
+import platform
+import random
+import tempfile
+import time
+
+# Handling file system navigation and paths.
+from os.path import join, dirname, abspath
+from os import listdir
+import sys
+
+# Makes the bsaber package and the fixture server importable when run as a script from anywhere.
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+sys.path.insert(0, dirname(abspath(__file__)))
+
+# The code being benchmarked.
+from bsaber.scraper import SongScraper  # noqa: E402
+from bsaber.listing_parser import parse_listing  # noqa: E402
+from bsaber.response_cache import MemoryResponseCache  # noqa: E402
+from bsaber.extractor import extract_song_zipfiles  # noqa: E402
+from bsaber.song import Song, SongCollection  # noqa: E402
+from bsaber.song_search import SongSearchIndex  # noqa: E402
+from fixture_server import FixtureServer  # noqa: E402
+
+
+""" Version of the JSON that results are written in. Bumped whenever its layout changes. """
+RESULTS_FORMAT_VERSION = 1
+
+""" Words that the titles, artists and mappers of the local search benchmark are made of. """
+SEARCH_WORDS = ['light', 'it', 'up', 'night', 'fire', 'dance', 'heart', 'love', 'star', 'run',
+                'rain', 'dream', 'ghost', 'storm', 'neon', 'city', 'wild', 'echo', 'gold', 'sky',
+                'shadow', 'rise', 'fall', 'break', 'free', 'time', 'world', 'electric', 'dark']
+
+
+def percentile(sorted_samples, fraction):
+    """Return the sample at fraction (0 to 1) of the way through sorted_samples."""
+    if not sorted_samples:
+        return 0.0
+
+    return sorted_samples[min(int(fraction * len(sorted_samples)), len(sorted_samples) - 1)]
+
+
+def summarize(latencies, total_seconds, units_done, unit):
+    """Return the throughput and latency percentiles of a benchmark.
+
+    Args:
+        latencies (list(float)): Seconds that each operation took.
+
+        total_seconds (float): Wall clock seconds that the whole benchmark took.
+
+        units_done (float): How much work was done, in unit.
+
+        unit (str): What the throughput is measured in, e.g. 'pages' or 'MiB'.
+
+    Returns:
+        dict: The benchmark's results.
+    """
+    latencies = sorted(latencies)
+
+    return {'operations': len(latencies),
+            'total_seconds': round(total_seconds, 6),
+            'throughput': round(units_done / total_seconds, 3) if total_seconds else 0.0,
+            'throughput_unit': f'{unit}/s',
+            'latency_ms': {'p50': round(percentile(latencies, 0.50) * 1000, 3),
+                           'p90': round(percentile(latencies, 0.90) * 1000, 3),
+                           'p99': round(percentile(latencies, 0.99) * 1000, 3),
+                           'max': round(latencies[-1] * 1000, 3) if latencies else 0.0}}
+
+
+def benchmark_parsing(server, repeats):
+    """Time parse_listing() on every recorded page."""
+    latencies = []
+    start_time = time.perf_counter()
+
+    for _ in range(repeats):
+        for html in server.pages.values():
+            page_start_time = time.perf_counter()
+            list(parse_listing(html))
+            latencies.append(time.perf_counter() - page_start_time)
+
+    return summarize(latencies, time.perf_counter() - start_time, len(latencies), 'pages')
+
+
+def benchmark_listing_fetch(server, path_to_custom_levels, repeats):
+    """Time fetching and parsing listing pages with the response cache turned off."""
+    scraper = SongScraper(path_to_custom_levels, bsaber_site=server.bsaber_site,
+                          beatsaver_download_url=server.beatsaver_download_url,
+                          response_cache=MemoryResponseCache(max_pages=0))
+    latencies = []
+    start_time = time.perf_counter()
+
+    for page in range(1, repeats + 1):
+        page_start_time = time.perf_counter()
+        scraper.get_song_results('top', '30-days', page=(page - 1) % server.number_of_pages + 1)
+        latencies.append(time.perf_counter() - page_start_time)
+
+    return summarize(latencies, time.perf_counter() - start_time, len(latencies), 'pages')
+
+
+def benchmark_download(server, path_to_custom_levels, number_of_songs, max_workers):
+    """Time downloading number_of_songs synthetic songs to path_to_custom_levels."""
+    scraper = SongScraper(path_to_custom_levels, bsaber_site=server.bsaber_site,
+                          beatsaver_download_url=server.beatsaver_download_url)
+    songs = SongCollection(Song(f'{i:x}', f'song {i}', scraper.download_link_for_key(f'{i:x}'))
+                           for i in range(number_of_songs))
+
+    start_time = time.perf_counter()
+    download_results = scraper.download_songs(songs, max_workers=max_workers,
+                                              skip_installed=False)
+    total_seconds = time.perf_counter() - start_time
+
+    megabytes = sum(result.bytes_written for result in download_results) / 1024 / 1024
+    return summarize([result.elapsed for result in download_results], total_seconds,
+                     megabytes, 'MiB')
+
+
+def benchmark_extraction(path_to_custom_levels, max_workers):
+    """Time extracting every zipfile in path_to_custom_levels."""
+    paths_to_song_zipfiles = [join(path_to_custom_levels, file)
+                              for file in listdir(path_to_custom_levels) if file.endswith('.zip')]
+
+    extraction_summary = extract_song_zipfiles(paths_to_song_zipfiles, max_workers=max_workers)
+    return summarize([result.elapsed for result in extraction_summary.results],
+                     extraction_summary.elapsed, len(extraction_summary.results), 'songs')
+
+
+def benchmark_local_search(number_of_songs, repeats):
+    """Time queries, some with typos, against a search index of number_of_songs songs."""
+    random_words = random.Random(0)
+    search_index = SongSearchIndex(':memory:')
+
+    def random_name(number_of_words):
+        return ' '.join(random_words.choice(SEARCH_WORDS) for _ in range(number_of_words))
+
+    search_index.add_records(Song(f'{i:x}', random_name(3), None, mapper=random_name(1) + str(i))
+                             for i in range(number_of_songs))
+
+    queries = ['light it up', 'ligth it up', 'neon city', 'electirc dream', 'ghost storm rise']
+    latencies = []
+    start_time = time.perf_counter()
+
+    for _ in range(repeats):
+        for query in queries:
+            query_start_time = time.perf_counter()
+            search_index.search(query)
+            latencies.append(time.perf_counter() - query_start_time)
+
+    return summarize(latencies, time.perf_counter() - start_time, len(latencies), 'queries')
+
+
+def compare(results, baseline):
+    """Print how much each benchmark's throughput and p50 latency changed from baseline."""
+    print("\nCompared to the baseline:")
+
+    for name, benchmark in results['benchmarks'].items():
+        old_benchmark = baseline.get('benchmarks', {}).get(name)
+
+        if old_benchmark is None or not old_benchmark['throughput']:
+            continue
+
+        throughput_change = benchmark['throughput'] / old_benchmark['throughput'] - 1
+        old_p50 = old_benchmark['latency_ms']['p50']
+        p50_change = benchmark['latency_ms']['p50'] / old_p50 - 1 if old_p50 else 0.0
+        print(f"\t{name:<16} throughput {throughput_change:+7.1%}   p50 latency {p50_change:+7.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline SongScraper benchmarks.')
+    parser.add_argument('--songs', type=int, default=100, help='songs to download and extract')
+    parser.add_argument('--zipfile-size', type=int, default=256 * 1024, help='bytes per song')
+    parser.add_argument('--pages', type=int, default=50, help='listing pages to fetch')
+    parser.add_argument('--jobs', type=int, default=8, help='download and extraction workers')
+    parser.add_argument('--search-songs', type=int, default=10000,
+                        help='songs in the local search index')
+    parser.add_argument('--output', help='file to write the results to as JSON')
+    parser.add_argument('--baseline', help='results of an earlier run to compare against')
+    arguments = parser.parse_args()
+
+    results = {'format_version': RESULTS_FORMAT_VERSION,
+               'timestamp': time.time(),
+               'python': platform.python_version(),
+               'platform': platform.platform(),
+               'parameters': vars(arguments),
+               'benchmarks': {}}
+
+    with FixtureServer(number_of_pages=arguments.pages, zipfile_size=arguments.zipfile_size) \
+            as server, tempfile.TemporaryDirectory() as path_to_custom_levels:
+        benchmarks = results['benchmarks']
+        benchmarks['parse'] = benchmark_parsing(server, repeats=50)
+        benchmarks['listing_fetch'] = benchmark_listing_fetch(server, path_to_custom_levels,
+                                                              arguments.pages)
+        benchmarks['download'] = benchmark_download(server, path_to_custom_levels,
+                                                    arguments.songs, arguments.jobs)
+        benchmarks['extract'] = benchmark_extraction(path_to_custom_levels, arguments.jobs)
+        benchmarks['local_search'] = benchmark_local_search(arguments.search_songs, repeats=20)
+
+    for name, benchmark in results['benchmarks'].items():
+        latency = benchmark['latency_ms']
+        print(f"{name:<16} {benchmark['throughput']:>10.2f} {benchmark['throughput_unit']:<9} "
+              f"p50 {latency['p50']:8.3f} ms  p90 {latency['p90']:8.3f} ms  "
+              f"p99 {latency['p99']:8.3f} ms")
+
+    if arguments.output:
+        with open(arguments.output, 'w', encoding='utf-8') as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if arguments.baseline:
+        with open(arguments.baseline, 'r', encoding='utf-8') as baseline_file:
+            compare(results, json.load(baseline_file))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,799 @@
+"""
+@author Eric Zair
+@file async_scraper.py
+
+Contains the AsyncSongScraper object.
+
+AsyncSongScraper gives asyncio programs the same API as SongScraper, with every method
+awaitable, so that scraping and downloading songs never blocks the event loop:
+
+    async with AsyncSongScraper(path_to_custom_levels) as scraper:
+        songs = await scraper.get_song_results('top', '7-days')
+
+        async for download_result in scraper.download_songs_as_completed(songs):
+            print(download_result)
+
+Pages and songs are fetched with aiohttp over one pooled keep-alive ClientSession, so no
+thread is spent waiting on the network. The urls, the listing and API parsers, the response
+cache and the SongLibrary are the same ones SongScraper uses. Only the work that needs the
+CPU or the disk, parsing a page, checking a zipfile and extracting it, is run on a small pool
+of worker threads, starting as soon as each page or song arrives. Every request is sent
+inside of a permit from the same RateGovernor that SongScraper uses, which can be shared
+between the two.
+"""
+
+# Handling the event loop and the worker threads.
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from itertools import count
+from functools import partial
+from io import BytesIO
+import asyncio
+import hashlib
+import time
+
+# Handling http requests.
+import aiohttp
+
+# Handling file system navigation and paths.
+from os import replace
+
+# The urls, parsers and caches that are shared with SongScraper.
+from bsaber.scraper import BSABER_SITE, BEATSAVER_DOWNLOAD_URL, METADATA_BACKENDS, \
+    MAX_LOCAL_SEARCH_HITS, SORTED_BY_OPTIONS, TIME_PERIOD_OPTIONS, listing_page_url, \
+    search_page_url, page_of_search_hits, song_download_link, unseen_records
+from bsaber.beatsaver_api import BEATSAVER_API_URL, listing_url, search_url, batch_urls, parse_songs
+from bsaber.response_cache import CachedPage, MemoryResponseCache, DEFAULT_PAGE_TTLS
+from bsaber.listing_parser import parse_listing
+from bsaber.rate_governor import RateGovernor
+from bsaber.session import USER_AGENT
+
+# Downloading, extracting and recording songs.
+from bsaber.downloader import DownloadResult, CorruptArchiveError, IncompleteDownloadError, \
+    RETRYABLE_STATUS_CODES, DOWNLOAD_CHUNK_SIZE, check_zipfile
+from bsaber.extractor import ExtractionSummary
+from bsaber.library import SongLibrary
+from bsaber.song import Song, SongCollection, as_song_collection
+from bsaber.events import EventEmitter
+
+
+def _parse_listing_records(html, number_of_songs, skip):
+    """Helper function for AsyncSongScraper. Runs on a worker thread.
+    Return the list of ListingRecords on a bsaber.com listing or search page.
+    """
+    return list(parse_listing(html, number_of_songs=number_of_songs, skip=skip))
+
+
+def _save_zipfile(content, save_location):
+    """Helper function for AsyncSongScraper. Runs on a worker thread.
+    Write a downloaded song's zipfile to save_location. It is written to a .part file first,
+    so a crash never leaves a broken .zip behind.
+    """
+    with open(save_location + '.part', 'wb') as download_file:
+        download_file.write(content)
+
+    replace(save_location + '.part', save_location)
+
+
+class AsyncSongScraper():
+    """Object used for scrapping, downloading and extracting songs from asyncio code."""
+
+    def __init__(self, path_to_custom_levels_folder, path_to_song_index=None,
+                 response_cache=None, page_ttls=None, path_to_blob_store=None,
+                 bsaber_site=BSABER_SITE, beatsaver_download_url=BEATSAVER_DOWNLOAD_URL,
+                 metadata_backend='html', beatsaver_api_url=BEATSAVER_API_URL,
+                 path_to_search_index=None, max_connections=16, max_per_host=4,
+                 max_retries=3, backoff=0.5, max_workers=4, rate_governor=None):
+        """Constructs an AsyncSongScraper object. The arguments that it shares with
+        SongScraper mean the same thing, see SongScraper.
+
+        Args:
+            path_to_custom_levels_folder (str): The location of the custom_levels/
+                                                folder in your beatsaber game.
+
+            max_connections (int, optional): The max number of connections that the pooled
+                                             session keeps open at once. Defaults to 16.
+
+            max_per_host (int, optional): The max number of connections open against a
+                                          single host at once. Defaults to 4.
+
+            max_retries (int, optional): The number of times a failed download is tried
+                                         again. Defaults to 3.
+
+            backoff (float, optional): Seconds waited before the first retry, doubled for
+                                       every retry after it. Defaults to 0.5.
+
+            max_workers (int, optional): The max number of pages parsed and songs checked or
+                                         extracted at once, on worker threads. Defaults to 4.
+
+            rate_governor (RateGovernor, optional): Governs the requests sent to each host,
+                                                    and can be shared with a SongScraper.
+                                                    Defaults to a RateGovernor that only
+                                                    adapts concurrency.
+
+        Raises:
+            ValueError: If metadata_backend is not a member of METADATA_BACKENDS.
+        """
+        if metadata_backend not in METADATA_BACKENDS:
+            raise ValueError(f"Error: metadata_backend must be one of {METADATA_BACKENDS}.")
+
+        if max_workers < 1 or max_connections < 1 or max_per_host < 1:
+            raise ValueError("Error: max_workers, max_connections and max_per_host must be "
+                             "at least 1.")
+
+        """ Where songs are scraped, downloaded and searched from. """
+        self.__bsaber_site = bsaber_site
+        self.__beatsaver_download_url = beatsaver_download_url
+        self.__metadata_backend = metadata_backend
+        self.__beatsaver_api_url = beatsaver_api_url
+
+        """ Cache of the listing and search pages, and how long each type of page stays fresh. """
+        self.__response_cache = response_cache if response_cache is not None \
+            else MemoryResponseCache()
+        self.__page_ttls = dict(DEFAULT_PAGE_TTLS, **(page_ttls or {}))
+
+        """ Hands the events of each run to whoever subscribed to them. """
+        self.__events = EventEmitter()
+
+        """ The custom_levels folder that songs are extracted to, its index and blob store. """
+        self.__library = SongLibrary(path_to_custom_levels_folder, path_to_song_index,
+                                     path_to_blob_store, events=self.__events,
+                                     path_to_search_index=path_to_search_index)
+
+        """ Pooled keep-alive session shared by every request. Built on first use, inside of
+        the event loop that it belongs to. """
+        self.__session = None
+        self.__max_connections = max_connections
+        self.__max_per_host = max_per_host
+
+        """ Sits under every request, like SongScraper's. """
+        self.__rate_governor = rate_governor if rate_governor is not None else RateGovernor()
+
+        """ How failed downloads are tried again. """
+        self.__max_retries = max_retries
+        self.__backoff = backoff
+
+        """ Worker threads that parsing, checking and extracting are run on. """
+        self.__executor = ThreadPoolExecutor(max_workers=max_workers,
+                                             thread_name_prefix='bsaber-async')
+
+        """ (query, its local search hits) of the last search that was paged through. """
+        self.__last_local_search = None
+
+
+    async def __aenter__(self):
+        return self
+
+
+    async def __aexit__(self, exception_type, exception, traceback):
+        await self.close()
+
+
+    async def close(self):
+        """Close the pooled connections, and wait for the worker threads to finish what they
+        are running.
+        """
+        if self.__session is not None:
+            await self.__session.close()
+            self.__session = None
+
+        # Waited for on another thread, so the event loop keeps running in the meantime.
+        await asyncio.to_thread(self.__executor.shutdown, wait=True)
+
+
+    def library(self):
+        """Return the custom_levels folder that the scraper installs songs into.
+
+        Returns:
+            SongLibrary: The scraper's song library.
+        """
+        return self.__library
+
+
+    def subscribe(self, listener, event_names=None):
+        """Call listener with each Event the scraper emits that is named in event_names.
+        Listeners are called from the event loop and from the worker threads, so they have
+        to be thread safe. See SongScraper.subscribe().
+        """
+        self.__events.subscribe(listener, event_names)
+
+
+    def download_link_for_key(self, key):
+        """Return the link that the song with the given beatsaver key is downloaded from."""
+        return self.__beatsaver_download_url + key
+
+
+    def download_link_for_record(self, record):
+        """Return the link that the song of a ListingRecord or SongRecord is downloaded from,
+        the direct link from the beatsaver API when it gave one.
+        """
+        return song_download_link(record, self.__beatsaver_download_url)
+
+
+    def __run(self, function, *args, **kwargs):
+        """Run function(*args, **kwargs) on a worker thread.
+
+        Returns:
+            asyncio.Future: Resolves to what function returned.
+        """
+        return asyncio.get_running_loop().run_in_executor(self.__executor,
+                                                          partial(function, *args, **kwargs))
+
+
+    def __get_session(self):
+        """Return the pooled session that all of the scraper's requests are sent with."""
+        if self.__session is None:
+            connector = aiohttp.TCPConnector(limit=self.__max_connections,
+                                             limit_per_host=self.__max_per_host)
+            self.__session = aiohttp.ClientSession(connector=connector,
+                                                   headers={'User-Agent': USER_AGENT})
+
+        return self.__session
+
+
+    def __check_options(self, sorted_by, time_period):
+        """Make sure that sorted_by and time_period are options that songs can be queried by.
+
+        Raises:
+            ValueError: If either of them is not.
+        """
+        if sorted_by not in SORTED_BY_OPTIONS:
+            raise ValueError(f"Error: Option must be of the following: {SORTED_BY_OPTIONS}")
+
+        if time_period not in TIME_PERIOD_OPTIONS:
+            raise ValueError(f"Error: Option must be of the following: {TIME_PERIOD_OPTIONS}")
+
+
+    def __page_ttl(self, sorted_by, time_period):
+        """Return the seconds that a page of songs sorted by sorted_by from time_period stays
+        fresh.
+        """
+        return self.__page_ttls['new' if sorted_by == 'new' else time_period]
+
+
+    async def __fetch_page(self, url_to_songs, page_ttl):
+        """Return the cached page for url_to_songs, only going to the site if the cached page
+        has expired. See SongScraper.__fetch_page().
+
+        Raises:
+            aiohttp.ClientError: If the page could not be fetched.
+        """
+        cached_page = self.__response_cache.get(url_to_songs)
+
+        if cached_page is not None and cached_page.is_fresh():
+            self.__events.emit('page_fetched', url=url_to_songs, status_code=200, from_cache=True,
+                               duration=0.0, bytes=len(cached_page.body))
+            return cached_page
+
+        headers = {}
+
+        if cached_page is not None:
+            if cached_page.etag is not None:
+                headers['If-None-Match'] = cached_page.etag
+            if cached_page.last_modified is not None:
+                headers['If-Modified-Since'] = cached_page.last_modified
+
+        start_time = time.perf_counter()
+
+        async with self.__rate_governor.limit(url_to_songs) as permit, \
+                self.__get_session().get(url_to_songs, headers=headers) as response:
+            permit.record(response.status, response.headers.get('Retry-After'))
+            content = await response.read()
+            await permit.throttle_async(len(content))
+
+            self.__events.emit('page_fetched', url=url_to_songs, status_code=response.status,
+                               from_cache=response.status == 304,
+                               duration=time.perf_counter() - start_time, bytes=len(content))
+
+            if response.status == 304 and cached_page is not None:
+                cached_page.expires_at = time.time() + page_ttl
+            elif response.status == 200:
+                cached_page = CachedPage(url_to_songs,
+                                         content.decode(response.charset or 'utf-8', 'replace'),
+                                         etag=response.headers.get('ETag'),
+                                         last_modified=response.headers.get('Last-Modified'),
+                                         expires_at=time.time() + page_ttl)
+            else:
+                response.raise_for_status()
+                raise aiohttp.ClientResponseError(response.request_info, response.history,
+                                                  status=response.status,
+                                                  message='Unable to access the page.')
+
+        self.__response_cache.set(url_to_songs, cached_page)
+        return cached_page
+
+
+    async def __parse_page(self, cached_page, parse_options, parse, *args):
+        """Return parse(*args) for cached_page, run on a worker thread the first time and
+        kept on the page for as long as the page is cached.
+        """
+        if parse_options not in cached_page.parsed:
+            start_time = time.perf_counter()
+            cached_page.parsed[parse_options] = await self.__run(parse, *args)
+            self.__events.emit('page_parsed', url=cached_page.url,
+                               duration=time.perf_counter() - start_time,
+                               songs=len(cached_page.parsed[parse_options]))
+
+        return cached_page.parsed[parse_options]
+
+
+    async def __fetch_song_records(self, url_to_songs, page_ttl):
+        """Return the SongRecords in the API's answer at url_to_songs.
+
+        Raises:
+            aiohttp.ClientError: If the answer could not be fetched.
+            ValueError: If the answer is not JSON from the API.
+        """
+        cached_page = await self.__fetch_page(url_to_songs, page_ttl)
+        return await self.__parse_page(cached_page, 'api', parse_songs, cached_page.body)
+
+
+    async def __fetch_song_records_or_none(self, url_to_songs, page_ttl):
+        """Return the SongRecords in the API's answer at url_to_songs, None if the scraper does
+        not use the API, url_to_songs is None, or the API could not answer, in which case the
+        pages of bsaber.com should be scraped instead.
+        """
+        if self.__metadata_backend != 'api' or url_to_songs is None:
+            return None
+
+        try:
+            return await self.__fetch_song_records(url_to_songs, page_ttl)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            return None
+
+
+    async def __fetch_listing_records(self, url_to_songs, page_ttl, number_of_songs=None,
+                                      skip=0):
+        """Return the ListingRecords on the bsaber.com listing or search page at url_to_songs."""
+        cached_page = await self.__fetch_page(url_to_songs, page_ttl)
+        return await self.__parse_page(cached_page, (number_of_songs, skip),
+                                       _parse_listing_records, cached_page.body,
+                                       number_of_songs, skip)
+
+
+    async def __remember_songs(self, records):
+        """Add the songs seen on a listing, search or API answer to the local search index,
+        and return their SongCollection.
+        """
+        await self.__run(self.__library.search_index().add_records, records)
+        return SongCollection(Song.from_record(record, self.download_link_for_record(record))
+                              for record in records)
+
+
+    async def search_local(self, query, limit=20, installed_only=False):
+        """Awaitable SongScraper.search_local(). Nothing is fetched.
+
+        Returns:
+            list(SearchHit): The songs that matched, an empty list on a miss.
+        """
+        return await self.__run(self.__library.search, query, limit=limit,
+                                installed_only=installed_only)
+
+
+    async def get_song_results(self, sorted_by='new', time_period='all', page=1):
+        """Awaitable SongScraper.get_song_results().
+
+        Returns:
+            SongCollection: The songs on the page.
+        """
+        self.__check_options(sorted_by, time_period)
+        records = await self.__fetch_page_of_listing(sorted_by, time_period, page,
+                                                     number_of_songs=21)
+        return await self.__remember_songs(records)
+
+
+    async def __fetch_page_of_listing(self, sorted_by, time_period, page, number_of_songs=None):
+        """Return the songs on the given page of songs sorted by sorted_by from time_period,
+        as SongRecords when they come from the API and as ListingRecords otherwise.
+        """
+        page_ttl = self.__page_ttl(sorted_by, time_period)
+        song_records = await self.__fetch_song_records_or_none(
+            listing_url(self.__beatsaver_api_url, sorted_by, time_period, page), page_ttl)
+
+        if song_records is not None:
+            return song_records
+
+        return await self.__fetch_listing_records(
+            listing_page_url(self.__bsaber_site, sorted_by, time_period, page), page_ttl,
+            number_of_songs=number_of_songs)
+
+
+    async def get_searched_for_song_results(self, song, page=1, remote=False):
+        """Awaitable SongScraper.get_searched_for_song_results(). The local hits are paged
+        through first, then the site's search results.
+
+        Returns:
+            SongCollection: The songs on the page.
+        """
+        if not remote:
+            if page == 1 or self.__last_local_search is None or \
+                    self.__last_local_search[0] != song:
+                self.__last_local_search = \
+                    song, await self.search_local(song, limit=MAX_LOCAL_SEARCH_HITS)
+
+            search_hits, page = page_of_search_hits(self.__last_local_search[1], page)
+
+            if search_hits:
+                return SongCollection(Song(hit.key, hit.title, self.download_link_for_key(hit.key),
+                                           mapper=hit.mapper)
+                                      for hit in search_hits)
+
+        page_ttl = self.__page_ttls['search']
+        records = await self.__fetch_song_records_or_none(
+            search_url(self.__beatsaver_api_url, song, page), page_ttl)
+
+        # The first card of a search page is the search itself.
+        if records is None:
+            records = await self.__fetch_listing_records(
+                search_page_url(self.__bsaber_site, song, page), page_ttl, number_of_songs=21,
+                skip=1)
+
+        return await self.__remember_songs(records)
+
+
+    async def get_songs_by_keys(self, keys):
+        """Awaitable SongScraper.get_songs_by_keys(). The batches are looked up at once.
+
+        Returns:
+            dict(str, SongRecord): key -> the song with that key.
+
+        Raises:
+            aiohttp.ClientError: If the API could not be reached.
+            ValueError: If the API's answer could not be read.
+        """
+        batches = await asyncio.gather(*(self.__fetch_song_records(url, self.__page_ttls['keys'])
+                                         for url in batch_urls(self.__beatsaver_api_url,
+                                                               dict.fromkeys(keys))))
+        songs_by_key = {song_record.key: song_record
+                        for song_records in batches for song_record in song_records}
+
+        await self.__remember_songs(list(songs_by_key.values()))
+        return songs_by_key
+
+
+    async def crawl_songs(self, sorted_by='new', time_period='all', number_of_songs=None,
+                          first_page=1, last_page=None, max_workers=4):
+        """Asynchronous SongScraper.crawl_songs(), used with async for. max_workers pages are
+        fetched at once, and the songs are yielded in page order as soon as the page that they
+        are on has arrived.
+
+        Yields:
+            ListingRecord or SongRecord: The next song that has not been yielded yet.
+
+        Raises:
+            ValueError: If neither number_of_songs nor last_page is given.
+        """
+        self.__check_options(sorted_by, time_period)
+
+        if number_of_songs is None and last_page is None:
+            raise ValueError("Error: number_of_songs or last_page must be given.")
+
+        pages = count(first_page) if last_page is None else iter(range(first_page, last_page + 1))
+        pending_pages = deque()
+        seen_keys = set()
+
+        try:
+            while True:
+                self.__schedule_pages(pending_pages, pages, max_workers, sorted_by, time_period)
+
+                if not pending_pages:
+                    return
+
+                page, pending_page = pending_pages.popleft()
+                records = await self.__records_or_end_of_listing(page == first_page, pending_page)
+
+                # An empty page, or a page that could not be fetched, is past the last one.
+                if not records:
+                    return
+
+                await self.__run(self.__library.search_index().add_records, records)
+                new_records = unseen_records(records, seen_keys)
+
+                # A page without a new song is past the last one too, since some sites answer
+                # every page after the last with the same songs.
+                if not new_records:
+                    return
+
+                for record in new_records:
+                    seen_keys.add(record.key)
+                    yield record
+
+                    if number_of_songs is not None and len(seen_keys) >= number_of_songs:
+                        return
+        finally:
+            await self.__cancel([pending_page for _, pending_page in pending_pages])
+
+
+    def __schedule_pages(self, pending_pages, pages, max_workers, sorted_by, time_period):
+        """Helper method for crawl_songs().
+        Start fetching the next pages until max_workers pages are in flight ahead of the page
+        being read, or there are no pages left.
+        """
+        while len(pending_pages) < max_workers:
+            page = next(pages, None)
+
+            if page is None:
+                return
+
+            pending_pages.append((page, asyncio.create_task(
+                self.__fetch_page_of_listing(sorted_by, time_period, page))))
+
+
+    async def __records_or_end_of_listing(self, is_first_page, pending_page):
+        """Helper method for crawl_songs().
+        Return the records of the page, or [] if the page could not be fetched because the
+        listing already ended, e.g. the site 404s on the page after the last one.
+
+        Raises:
+            aiohttp.ClientError: If the first page of the crawl could not be fetched.
+        """
+        try:
+            return await pending_page
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            if is_first_page:
+                raise
+            return []
+
+
+    async def __cancel(self, tasks):
+        """Cancel tasks, and wait until they are done so none of them is left running."""
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+    def __split_installed_songs(self, songs, skip_installed):
+        """Split songs into a SongCollection of the songs that still need to be downloaded and
+        a skipped DownloadResult for each song that the index says is already installed.
+        """
+        songs = as_song_collection(songs)
+
+        if not skip_installed:
+            return songs, []
+
+        song_index = self.__library.song_index()
+        songs_to_download = SongCollection()
+        skipped_results = []
+
+        for song in songs:
+            if song.key in song_index:
+                result = DownloadResult(song.title, song.download_link, None)
+                result.success = result.skipped = True
+                skipped_results.append(result)
+            else:
+                songs_to_download.add(song)
+
+        return songs_to_download, skipped_results
+
+
+    def __should_retry(self, error):
+        """Return True if the download that failed with error is worth trying again."""
+        if isinstance(error, aiohttp.ClientResponseError):
+            return error.status in RETRYABLE_STATUS_CODES
+
+        return isinstance(error, (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError,
+                                  asyncio.TimeoutError, IncompleteDownloadError,
+                                  CorruptArchiveError))
+
+
+    async def __download_once(self, song, url, download_buffer):
+        """Send one request for the song at url, asking for only the bytes that are not
+        already in download_buffer.
+
+        Raises:
+            aiohttp.ClientResponseError: If the server answered with an error.
+            IncompleteDownloadError: If fewer bytes arrived than the server said it would send.
+        """
+        offset = download_buffer.tell()
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
+        report_progress = self.__events.has_listeners('download_progress')
+
+        async with self.__rate_governor.limit(url) as permit, \
+                self.__get_session().get(url, headers=headers) as response:
+            permit.record(response.status, response.headers.get('Retry-After'))
+
+            # 416 means we asked for bytes past the end, so everything already arrived.
+            if offset and response.status == 416:
+                return
+
+            response.raise_for_status()
+
+            # The server ignored the range and is sending the whole song again.
+            if response.status != 206:
+                offset = 0
+
+            expected_size = None if response.content_length is None \
+                else offset + response.content_length
+            download_buffer.seek(offset)
+            download_buffer.truncate()
+
+            async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                await permit.throttle_async(len(chunk))
+                download_buffer.write(chunk)
+
+                if report_progress:
+                    self.__events.emit('download_progress', song=song,
+                                       bytes=download_buffer.tell(), total_bytes=expected_size)
+
+        if expected_size is not None and download_buffer.tell() != expected_size:
+            raise IncompleteDownloadError(f"Error: only {download_buffer.tell()} of "
+                                          f"{expected_size} bytes arrived.")
+
+
+    async def __download(self, song, save_location, worker_slots):
+        """Download the song into memory, check that it is a valid zipfile, and save it to
+        save_location. Failed downloads are retried with exponential backoff, picking up
+        where the last try left off.
+
+        Returns:
+            DownloadResult: The outcome of the download. Errors are stored on the result
+                            instead of being raised.
+        """
+        result = DownloadResult(song.title, song.download_link, save_location)
+        download_buffer = BytesIO()
+
+        async with worker_slots:
+            start_time = time.perf_counter()
+
+            for attempt in range(self.__max_retries + 1):
+                result.attempts += 1
+
+                try:
+                    await self.__download_once(song.title, song.download_link, download_buffer)
+                    content = download_buffer.getvalue()
+                    await self.__run(check_zipfile, BytesIO(content))
+                    await self.__run(_save_zipfile, content, save_location)
+                    result.success, result.error = True, None
+                    break
+                except Exception as e:
+                    result.error = e
+
+                    # A corrupt download is thrown away so that the retry starts over.
+                    if isinstance(e, CorruptArchiveError):
+                        download_buffer = BytesIO()
+
+                    if attempt == self.__max_retries or not self.__should_retry(e):
+                        break
+
+                    # A Retry-After from the host is waited out by the governor, for every
+                    # request to that host.
+                    await asyncio.sleep(self.__backoff * 2 ** attempt)
+
+            result.elapsed = time.perf_counter() - start_time
+
+        if result.success:
+            result.bytes_written = len(content)
+            result.sha1 = hashlib.sha1(content).hexdigest()
+
+        self.__events.emit('download_done', song=song.title, duration=result.elapsed,
+                           bytes=result.bytes_written, success=result.success,
+                           attempts=result.attempts)
+        return result
+
+
+    async def __download_as_completed(self, songs, max_workers):
+        """Download each song in the SongCollection songs to a .zip in the custom_levels
+        folder, yielding (Song, DownloadResult) as each download finishes. Leaving early
+        cancels the downloads that are not done.
+        """
+        worker_slots = asyncio.Semaphore(max_workers)
+        pending_downloads = {}
+
+        for song in songs:
+            pending_download = asyncio.create_task(
+                self.__download(song, self.__library.song_folder(song) + '.zip', worker_slots))
+            pending_downloads[pending_download] = song
+
+        try:
+            while pending_downloads:
+                done, _ = await asyncio.wait(pending_downloads,
+                                             return_when=asyncio.FIRST_COMPLETED)
+
+                for pending_download in done:
+                    yield pending_downloads.pop(pending_download), pending_download.result()
+        finally:
+            await self.__cancel(list(pending_downloads))
+
+
+    async def download_songs_as_completed(self, songs, display_error_message=True, max_workers=8,
+                                          skip_installed=True):
+        """Asynchronous SongScraper.download_songs_as_completed(), used with async for. The
+        results of the skipped songs come first. Leaving the loop early cancels the downloads
+        that are not done.
+
+        Yields:
+            DownloadResult: The outcome of the next song that finished downloading.
+        """
+        songs, skipped_results = self.__split_installed_songs(songs, skip_installed)
+
+        for result in skipped_results:
+            yield result
+
+        download_results = self.__download_as_completed(songs, max_workers)
+
+        try:
+            async for _, result in download_results:
+                if display_error_message and not result.success:
+                    print(result.error)
+
+                yield result
+        finally:
+            await download_results.aclose()
+
+
+    async def download_songs(self, songs, display_error_message=True, max_workers=8,
+                             skip_installed=True):
+        """Awaitable SongScraper.download_songs(). The songs are not added to the song
+        index, since a song only counts as installed once it is extracted.
+
+        Returns:
+            list(DownloadResult): The outcome of each song's download, in the order of songs.
+                                  The results of the skipped songs come last.
+        """
+        songs, skipped_results = self.__split_installed_songs(songs, skip_installed)
+        worker_slots = asyncio.Semaphore(max_workers)
+        download_results = await asyncio.gather(
+            *(self.__download(song, self.__library.song_folder(song) + '.zip', worker_slots)
+              for song in songs))
+
+        if display_error_message:
+            for result in download_results:
+                if not result.success:
+                    print(result.error)
+
+        return list(download_results) + skipped_results
+
+
+    async def download_extract_songs(self, songs, display_error_message=True, max_workers=8,
+                                     skip_installed=True):
+        """Download all of the given songs and extract each of them in the custom_levels
+        folder. Each song is extracted on a worker thread as soon as it is downloaded, while
+        the rest are still downloading, and is only added to the song index once it is.
+
+        Args:
+            songs (SongCollection): The songs to download.
+
+            display_error_message (bool, optional): True if user wants to display possible errors,
+                                                    False otherwise. Defaults to True.
+
+            max_workers (int, optional): The max number of songs downloaded at once.
+                                         Defaults to 8.
+
+            skip_installed (bool, optional): True if songs whose key is in the song index should
+                                             not be downloaded again. Defaults to True.
+
+        Returns:
+            ExtractionSummary: The outcome of each downloaded song's extraction, in the order
+                               that the downloads finished.
+        """
+        start_time = time.perf_counter()
+        songs, _ = self.__split_installed_songs(songs, skip_installed)
+        download_results = self.__download_as_completed(songs, max_workers)
+        pending_extractions = []
+
+        try:
+            async for song, download_result in download_results:
+                if download_result.success:
+                    pending_extractions.append(self.__run(self.__extract_and_record, song,
+                                                          download_result, display_error_message))
+                elif display_error_message:
+                    print(download_result.error)
+        finally:
+            await download_results.aclose()
+
+        extraction_results = list(await asyncio.gather(*pending_extractions))
+        return ExtractionSummary(extraction_results, time.perf_counter() - start_time)
+
+
+    def __extract_and_record(self, song, download_result, display_error_message):
+        """Helper method for download_extract_songs(). Runs on a worker thread.
+        Extract the song's zipfile, and only add the song to the song index if that worked.
+        """
+        extraction_result = self.__library.extract_song_zipfile(download_result.save_location,
+                                                                display_error_message)
+
+        if extraction_result.success:
+            self.__library.record_installed_song(song, download_result)
+
+        return extraction_result
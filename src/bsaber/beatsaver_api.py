@@ -0,0 +1,192 @@
+"""
+@author Eric Zair
+@file beatsaver_api.py
+
+Contains the SongRecord object and the helpers that SongScraper uses to get songs from
+beatsaver's JSON API instead of scraping the pages of bsaber.com.
+
+The API answers with a small JSON document instead of a whole html page, and a single
+batch lookup resolves up to MAX_KEYS_PER_BATCH keys at once. The helpers here only build
+the urls and read the answers, so the pages can be fetched and cached by SongScraper
+like any other page.
+"""
+
+# Handling the urls and the JSON answers.
+from urllib.parse import quote, urlencode
+from datetime import datetime, timezone
+import json
+import time
+
+
+""" Root of beatsaver's JSON API. """
+BEATSAVER_API_URL = 'https://api.beatsaver.com/'
+
+""" The most keys that a single batch lookup can ask for. """
+MAX_KEYS_PER_BATCH = 50
+
+""" How the API sorts the songs of each sorted_by option that it supports. """
+API_SORT_ORDERS = {'new': 'Latest', 'top': 'Rating'}
+
+""" Seconds covered by each time period. 'all' is not limited. """
+TIME_PERIOD_SECONDS = {'24-hours': 24 * 60 * 60,
+                       '7-days': 7 * 24 * 60 * 60,
+                       '30-days': 30 * 24 * 60 * 60,
+                       '3-months': 91 * 24 * 60 * 60}
+
+
+class SongRecord():
+    """A single song as described by the beatsaver API."""
+
+    __slots__ = ('key', 'hash', 'title', 'mapper', 'duration', 'download_url')
+
+    def __init__(self, key, hash, title, mapper, duration, download_url):
+        """Constructs a SongRecord object.
+
+        Args:
+            key (str): The song's beatsaver key.
+
+            hash (str): sha1 hash of the song's latest version, as the game computes it.
+
+            title (str): The song's title.
+
+            mapper (str): The name of the person who mapped the song.
+
+            duration (int): The length of the song in seconds.
+
+            download_url (str): The direct link to the zipfile of the song's latest version,
+                                None if the API did not give one.
+        """
+        self.key = key
+        self.hash = hash
+        self.title = title
+        self.mapper = mapper
+        self.duration = duration
+        self.download_url = download_url
+
+
+    def __repr__(self):
+        return (f"SongRecord(key={self.key!r}, hash={self.hash!r}, title={self.title!r}, "
+                f"mapper={self.mapper!r}, duration={self.duration!r})")
+
+
+def listing_url(api_url, sorted_by, time_period, page, now=None):
+    """Return the url of the given page of songs sorted by sorted_by from time_period.
+
+    The start of the time period is rounded down to the hour, so the url stays the same,
+    and can be served from the response cache, for an hour at a time.
+
+    Args:
+        api_url (str): Root of the API, ending in '/'.
+
+        sorted_by (str): 'new' or 'top'.
+
+        time_period (str): Ignored when sorted_by is 'new'.
+
+        page (int): The page of songs, starting at 1.
+
+        now (float, optional): The current time. Defaults to time.time().
+
+    Returns:
+        str: The url, None if the API can not sort songs by sorted_by.
+    """
+    if sorted_by not in API_SORT_ORDERS:
+        return None
+
+    query = {'sortOrder': API_SORT_ORDERS[sorted_by]}
+
+    if sorted_by != 'new' and time_period in TIME_PERIOD_SECONDS:
+        start_of_hour = ((now or time.time()) // 3600) * 3600
+        start = datetime.fromtimestamp(start_of_hour - TIME_PERIOD_SECONDS[time_period],
+                                       tz=timezone.utc)
+        query['from'] = start.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    # The API counts its pages from 0.
+    return f'{api_url}search/text/{page - 1}?{urlencode(query)}'
+
+
+def search_url(api_url, song, page):
+    """Return the url of the given page of songs that match the search for song."""
+    return f"{api_url}search/text/{page - 1}?{urlencode({'q': song, 'sortOrder': 'Relevance'})}"
+
+
+def batch_urls(api_url, keys):
+    """Return the urls that look up every song in keys, MAX_KEYS_PER_BATCH keys per url."""
+    keys = list(keys)
+
+    return [api_url + 'maps/ids/' + quote(','.join(keys[i:i + MAX_KEYS_PER_BATCH]), safe=',')
+            for i in range(0, len(keys), MAX_KEYS_PER_BATCH)]
+
+
+def _object_or_empty(value):
+    """Helper method for _song_record_from_map().
+    Return value if it is a JSON object, otherwise an empty one, so a malformed field reads
+    as a missing one.
+    """
+    return value if isinstance(value, dict) else {}
+
+
+def _song_record_from_map(beatmap):
+    """Helper method for parse_songs().
+    Return the SongRecord of a single map in an answer from the API, None if the map has
+    no key or no version that can be downloaded.
+    """
+    if not isinstance(beatmap, dict) or not isinstance(beatmap.get('id'), str):
+        return None
+
+    versions = beatmap.get('versions')
+    versions = [version for version in versions if isinstance(version, dict)] \
+        if isinstance(versions, list) else []
+    published_versions = [version for version in versions
+                          if version.get('state', 'Published') == 'Published'] or versions
+
+    if not published_versions:
+        return None
+
+    latest_version = max(published_versions,
+                         key=lambda version: str(version.get('createdAt', '')))
+    metadata = _object_or_empty(beatmap.get('metadata'))
+    mapper = metadata.get('levelAuthorName') or \
+        _object_or_empty(beatmap.get('uploader')).get('name')
+
+    download_url = latest_version.get('downloadURL')
+
+    # Anything but a web link is dropped, and the song is downloaded through its key instead.
+    if not isinstance(download_url, str) or not download_url.startswith(('https://', 'http://')):
+        download_url = None
+
+    return SongRecord(beatmap['id'], latest_version.get('hash'), beatmap.get('name', ''), mapper,
+                      metadata.get('duration', 0), download_url)
+
+
+def parse_songs(body):
+    """Return a SongRecord for each song in an answer from the API.
+
+    Args:
+        body (str): The JSON of a search, listing or batch lookup.
+
+    Returns:
+        list(SongRecord): The songs, in the order that the API gave them.
+
+    Raises:
+        ValueError: If body is not an answer from the API. Songs in the answer that are
+                    malformed, e.g. without a key, are left out instead.
+    """
+    answer = json.loads(body)
+
+    if not isinstance(answer, dict):
+        raise ValueError("Error: the beatsaver API sent an answer that is not an object.")
+
+    # Searches give their songs under 'docs', a lookup of one key gives the song itself and
+    # a batch lookup gives key -> song, with null for keys that do not exist.
+    if 'docs' in answer:
+        beatmaps = answer['docs']
+
+        if not isinstance(beatmaps, list):
+            raise ValueError("Error: the beatsaver API sent 'docs' that is not a list.")
+    elif 'id' in answer:
+        beatmaps = [answer]
+    else:
+        beatmaps = [beatmap for beatmap in answer.values() if isinstance(beatmap, dict)]
+
+    song_records = (_song_record_from_map(beatmap) for beatmap in beatmaps)
+    return [song_record for song_record in song_records if song_record is not None]
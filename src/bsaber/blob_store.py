@@ -0,0 +1,138 @@
+"""
+@author Eric Zair
+@file blob_store.py
+
+Contains the BlobStore object.
+
+BlobStore is a content addressed store for the files inside of song zipfiles. Each file is
+stored once under its sha256 and hard linked into every song folder that uses it, so songs
+that ship the same audio or cover image only take up the space of one copy.
+
+Every member is hashed while it is inflated, before anything is linked. The CRC-32 and size
+that a zipfile claims for a member are never trusted to pick a stored file, since a crafted
+zipfile could make them match the file of another song. So storing a member always costs a
+full inflate and sha256 of it, even when the store already has its bytes, and only the disk
+write is saved. Re-extracting a song stays cheap because selective extraction only hands the
+store the members that are missing or changed in the song folder, see extractor.py, and the
+unchanged ones are never read at all.
+"""
+
+# Hashing and linking the stored files.
+import hashlib
+import shutil
+import uuid
+
+# Handling file system navigation and paths.
+from os.path import join, exists, dirname
+from os import makedirs, link, remove, replace, walk, stat
+
+
+""" Size of each chunk that is read from a zip member while it is being stored. """
+STORE_CHUNK_SIZE = 64 * 1024
+
+
+class BlobStore():
+    """Object used for storing the files of songs once and linking them into song folders."""
+
+    def __init__(self, path_to_store):
+        """Constructs a BlobStore object, creating the store's folders if they do not exist.
+
+        Args:
+            path_to_store (str): The folder that the store lives in. It must be on the same
+                                 drive as the custom_levels/ folder for files to be linked.
+        """
+        self.__path_to_blobs = join(path_to_store, 'blobs')
+        self.__path_to_temp = join(path_to_store, 'tmp')
+
+        for folder in [self.__path_to_blobs, self.__path_to_temp]:
+            makedirs(folder, exist_ok=True)
+
+
+    def __blob_path(self, sha256):
+        """Return the path that the file with the given sha256 is stored at."""
+        return join(self.__path_to_blobs, sha256[:2], sha256)
+
+
+    def __store_zip_member(self, zipfile_to_extract, member):
+        """Helper method for link_zip_member().
+        Inflate member, hashing it as it goes, and store it unless the store already has its
+        bytes.
+
+        Returns:
+            (str, bool): The member's sha256, and True if the store already had it.
+        """
+        temp_path = join(self.__path_to_temp, uuid.uuid4().hex)
+        sha256 = hashlib.sha256()
+
+        with zipfile_to_extract.open(member) as member_file, open(temp_path, 'wb') as temp_file:
+            for chunk in iter(lambda: member_file.read(STORE_CHUNK_SIZE), b''):
+                sha256.update(chunk)
+                temp_file.write(chunk)
+
+        sha256 = sha256.hexdigest()
+        blob_path = self.__blob_path(sha256)
+
+        # Another song already stored the same bytes, so we only needed the hash.
+        if exists(blob_path):
+            remove(temp_path)
+            return sha256, True
+
+        makedirs(dirname(blob_path), exist_ok=True)
+        replace(temp_path, blob_path)
+        return sha256, False
+
+
+    def link_zip_member(self, zipfile_to_extract, member, destination):
+        """Put the zip member at destination, storing it first if the store does not have it.
+
+        Args:
+            zipfile_to_extract (zipfile.ZipFile): The open zipfile that member is in.
+
+            member (zipfile.ZipInfo): The file in the zipfile that is extracted.
+
+            destination (str): The path that the file is linked to.
+
+        Returns:
+            bool: True if the file was already in the store, False if it had to be stored.
+        """
+        sha256, already_stored = self.__store_zip_member(zipfile_to_extract, member)
+
+        if exists(destination):
+            remove(destination)
+
+        try:
+            link(self.__blob_path(sha256), destination)
+        except OSError:
+            # Hard links don't work across drives, so the song gets its own copy instead.
+            shutil.copyfile(self.__blob_path(sha256), destination)
+
+        return already_stored
+
+
+    def garbage_collect(self):
+        """Remove every stored file that no song folder links to anymore. This should not be
+        run while songs are being extracted into the store.
+
+        A stored file that is not linked into any song folder only has the one link that the
+        store itself holds, so no list of references needs to be kept.
+
+        Returns:
+            (int, int): The number of files removed and the number of bytes freed.
+        """
+        number_of_files_removed = 0
+        number_of_bytes_freed = 0
+
+        for root, _, files in walk(self.__path_to_blobs):
+            for file in files:
+                blob_stat = stat(join(root, file))
+
+                if blob_stat.st_nlink == 1:
+                    remove(join(root, file))
+                    number_of_files_removed += 1
+                    number_of_bytes_freed += blob_stat.st_size
+
+        # Temp files left by a crash.
+        for file in next(walk(self.__path_to_temp))[2]:
+            remove(join(self.__path_to_temp, file))
+
+        return number_of_files_removed, number_of_bytes_freed
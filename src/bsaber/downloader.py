@@ -0,0 +1,398 @@
+"""
+@author Eric Zair
+@file downloader.py
+
+Contains the SongDownloader and DownloadResult objects.
+
+SongDownloader downloads many custom song zipfiles at the same time using a bounded pool
+of worker threads. Every worker shares one pooled keep-alive session, and the number of
+requests that are open against a single host at once can be capped.
+
+A song is first written to '<save location>.part' and only renamed to its real name once
+its size matches the Content-Length and the zipfile passes its CRC checks, so a failed
+download never leaves a broken .zip behind. If a .part file is already there, the download
+picks up where it left off with an HTTP Range request. Failed downloads are retried with
+exponential backoff, and every request goes through a RateGovernor so that a host that
+asks us to slow down is listened to.
+"""
+
+# Handling the worker pool and the per host limits.
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from threading import BoundedSemaphore, Lock
+from urllib.parse import urlparse
+from io import BytesIO
+import hashlib
+import time
+
+# Handling http requests.
+import requests
+
+# Handling file system navigation and paths.
+from os.path import exists, getsize
+from os import remove, replace
+import zipfile
+
+# Keeping each host's request rate, bandwidth and concurrency in check.
+from bsaber.rate_governor import RateGovernor
+
+
+""" Size of each chunk that is written to disk while a song is downloading. """
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+""" Status codes that mean the server may answer the same request fine a little later. """
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class IncompleteDownloadError(Exception):
+    """Raised when the server stops sending a song before all of its bytes arrived."""
+
+
+class CorruptArchiveError(Exception):
+    """Raised when a downloaded song is not a valid zipfile."""
+
+
+class DownloadResult():
+    """The outcome of downloading a single song."""
+
+    def __init__(self, song, url, save_location):
+        """Constructs a DownloadResult object.
+
+        Args:
+            song (str): The name of the song that was downloaded.
+
+            url (str): The link that the song was downloaded from.
+
+            save_location (str): The path that the song's zipfile was saved to,
+                                 None if the song was downloaded into memory.
+        """
+        self.song = song
+        self.url = url
+        self.save_location = save_location
+
+        """ True if the whole zipfile made it to disk. """
+        self.success = False
+
+        """ The size of the downloaded zipfile in bytes. """
+        self.bytes_written = 0
+
+        """ Number of seconds that the download took. """
+        self.elapsed = 0.0
+
+        """ Number of requests it took to download the song. """
+        self.attempts = 0
+
+        """ Bytes that were already on disk from an earlier try when the download started. """
+        self.resumed_from = 0
+
+        """ The exception that stopped the download, None if it succeeded. """
+        self.error = None
+
+        """ sha1 hex digest of the downloaded zipfile. """
+        self.sha1 = None
+
+        """ True if the song was already installed, so it was not downloaded. """
+        self.skipped = False
+
+        """ The zipfile's bytes when the song was downloaded into memory, None otherwise. """
+        self.content = None
+
+
+    def __repr__(self):
+        return (f"DownloadResult(song={self.song!r}, success={self.success}, skipped={self.skipped}, "
+                f"bytes_written={self.bytes_written}, attempts={self.attempts}, "
+                f"elapsed={self.elapsed:.3f}, error={self.error!r})")
+
+
+def check_zipfile(archive):
+    """Make sure that archive is a zipfile whose members all pass their CRC checks.
+
+    Args:
+        archive (str or file object): The zipfile's path, or a file object holding its bytes.
+
+    Raises:
+        CorruptArchiveError: If archive is not a valid zipfile.
+    """
+    try:
+        with zipfile.ZipFile(archive, 'r') as zipfile_to_check:
+            bad_member = zipfile_to_check.testzip()
+    except zipfile.BadZipFile as e:
+        raise CorruptArchiveError(f"Error: downloaded file is not a zipfile ({e}).")
+
+    if bad_member is not None:
+        raise CorruptArchiveError(f"Error: {bad_member} failed its CRC check.")
+
+
+class SongDownloader():
+    """Object used for downloading many songs at once over one shared session."""
+
+    def __init__(self, session, max_workers=8, max_per_host=4, max_retries=3, backoff=0.5,
+                 events=None, governor=None):
+        """Constructs a SongDownloader object.
+
+        Args:
+            session (requests.Session): The pooled session that every download is sent with.
+
+            max_workers (int, optional): The max number of songs downloaded at once.
+                                         Defaults to 8.
+
+            max_per_host (int, optional): The max number of downloads that are open against a
+                                          single host at once. Defaults to 4.
+
+            max_retries (int, optional): The number of times a failed download is retried.
+                                         Defaults to 3.
+
+            backoff (float, optional): Seconds waited before the first retry. The wait doubles
+                                       with every retry after that. Defaults to 0.5.
+
+            events (EventEmitter, optional): Emits download_progress and download_done.
+                                             Defaults to None.
+
+            governor (RateGovernor, optional): Governs the requests sent to each host.
+                                               Defaults to a RateGovernor with the default
+                                               budget.
+        """
+        if max_workers < 1 or max_per_host < 1:
+            raise ValueError("Error: max_workers and max_per_host must be at least 1.")
+
+        self.__session = session
+        self.__max_workers = max_workers
+        self.__max_per_host = max_per_host
+        self.__max_retries = max_retries
+        self.__backoff = backoff
+        self.__events = events
+        self.__governor = governor if governor is not None else RateGovernor()
+
+        """ host -> BoundedSemaphore limiting the open downloads against that host. """
+        self.__host_limits = {}
+        self.__host_limits_lock = Lock()
+
+
+    def __host_limit(self, url):
+        """Return the semaphore that limits the number of open downloads for url's host."""
+        host = urlparse(url).netloc
+
+        with self.__host_limits_lock:
+            if host not in self.__host_limits:
+                self.__host_limits[host] = BoundedSemaphore(self.__max_per_host)
+
+            return self.__host_limits[host]
+
+
+    def download(self, song, url, save_location=None):
+        """Download a single song's zipfile to save_location.
+
+        Args:
+            song (str): The name of the song that is being downloaded.
+
+            url (str): The link to the song's zipfile.
+
+            save_location (str, optional): The path that the zipfile is written to. If None,
+                                           the zipfile is kept in memory on result.content.
+                                           Defaults to None.
+
+        Returns:
+            DownloadResult: The outcome of the download. Errors are stored on the result
+                            instead of being raised.
+        """
+        result = DownloadResult(song, url, save_location)
+        start_time = time.perf_counter()
+
+        # Songs downloaded into memory keep their partial bytes here between tries.
+        download_buffer = BytesIO() if save_location is None else None
+        part_path = None if save_location is None else save_location + '.part'
+
+        if part_path is not None and exists(part_path):
+            result.resumed_from = getsize(part_path)
+
+        for attempt in range(self.__max_retries + 1):
+            result.attempts += 1
+
+            try:
+                self.__download_once(song, url, part_path, download_buffer)
+                self.__finish_download(part_path, download_buffer, result)
+                result.success = True
+                result.error = None
+                break
+            except Exception as e:
+                result.error = e
+
+                if attempt == self.__max_retries or not self.__should_retry(e):
+                    break
+
+                time.sleep(self.__backoff * 2 ** attempt)
+
+        result.elapsed = time.perf_counter() - start_time
+
+        if self.__events is not None:
+            self.__events.emit('download_done', song=song, duration=result.elapsed,
+                               bytes=result.bytes_written, success=result.success,
+                               attempts=result.attempts)
+
+        return result
+
+
+    def __should_retry(self, error):
+        """Helper method for download().
+        Return True if the download that failed with error is worth trying again.
+        """
+        if isinstance(error, requests.exceptions.HTTPError):
+            return error.response is not None and \
+                error.response.status_code in RETRYABLE_STATUS_CODES
+
+        return isinstance(error, (requests.exceptions.ConnectionError,
+                                  requests.exceptions.Timeout,
+                                  requests.exceptions.ChunkedEncodingError,
+                                  IncompleteDownloadError, CorruptArchiveError))
+
+
+    def __download_once(self, song, url, part_path, download_buffer):
+        """Helper method for download().
+        Send one request for the song at url, asking for only the bytes that are not already
+        in part_path or download_buffer.
+
+        Raises:
+            requests.exceptions.HTTPError: If the server answered with an error.
+            IncompleteDownloadError: If fewer bytes arrived than the server said it would send.
+        """
+        if download_buffer is not None:
+            offset = download_buffer.tell()
+        else:
+            offset = getsize(part_path) if exists(part_path) else 0
+
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
+
+        with self.__host_limit(url), self.__governor.limit(url) as permit:
+            with self.__session.get(url, stream=True, headers=headers) as response:
+                permit.record(response.status_code, response.headers.get('Retry-After'))
+
+                # 416 means we asked for bytes past the end, so everything already arrived.
+                if offset and response.status_code == 416:
+                    return
+
+                # If we get a 404 or 403 error, we do not want to save the error page.
+                response.raise_for_status()
+
+                # The server ignored the range and is sending the whole song again.
+                if response.status_code != 206:
+                    offset = 0
+
+                content_length = response.headers.get('Content-Length')
+                expected_size = offset + int(content_length) if content_length else None
+
+                if download_buffer is not None:
+                    download_buffer.seek(offset)
+                    download_buffer.truncate()
+                    size = self.__copy_response(song, response, download_buffer, offset,
+                                                expected_size, permit)
+                else:
+                    with open(part_path, 'ab' if offset else 'wb') as download_file:
+                        size = self.__copy_response(song, response, download_file, offset,
+                                                    expected_size, permit)
+
+        if expected_size is not None and size != expected_size:
+            raise IncompleteDownloadError(f"Error: only {size} of {expected_size} bytes arrived.")
+
+
+    def __copy_response(self, song, response, download_file, offset, expected_size, permit):
+        """Helper method for download().
+        Copy the body of response into download_file, which already holds offset bytes, and
+        return the size of download_file. Reading is slowed down to the host's byte budget.
+        """
+        size = offset
+        report_progress = self.__events is not None and \
+            self.__events.has_listeners('download_progress')
+
+        for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+            permit.throttle(len(chunk))
+            download_file.write(chunk)
+            size += len(chunk)
+
+            if report_progress:
+                self.__events.emit('download_progress', song=song, bytes=size,
+                                   total_bytes=expected_size)
+
+        return size
+
+
+    def __finish_download(self, part_path, download_buffer, result):
+        """Helper method for download().
+        Check that the downloaded song is a valid zipfile, hash it, and hand it over: either
+        by renaming the .part file to result.save_location, or by storing the bytes on
+        result.content. A corrupt download is thrown away so that the retry starts over.
+
+        Raises:
+            CorruptArchiveError: If the downloaded song is not a valid zipfile.
+        """
+        try:
+            check_zipfile(part_path if download_buffer is None else download_buffer)
+        except CorruptArchiveError:
+            if download_buffer is None:
+                remove(part_path)
+            else:
+                download_buffer.seek(0)
+                download_buffer.truncate()
+            raise
+
+        sha1 = hashlib.sha1()
+
+        if download_buffer is not None:
+            result.content = download_buffer.getvalue()
+            sha1.update(result.content)
+            result.bytes_written = len(result.content)
+        else:
+            with open(part_path, 'rb') as download_file:
+                for chunk in iter(lambda: download_file.read(DOWNLOAD_CHUNK_SIZE), b''):
+                    sha1.update(chunk)
+                    result.bytes_written += len(chunk)
+
+            replace(part_path, result.save_location)
+
+        result.sha1 = sha1.hexdigest()
+
+
+    def download_all(self, songs_to_download):
+        """Download every song in songs_to_download using the worker pool.
+
+        Args:
+            songs_to_download (list((str, str, str))): Each entry is
+                                                      (song name, download link, save location).
+
+        Returns:
+            list(DownloadResult): One result per song, in the same order that they were given.
+        """
+        download_results = [None] * len(songs_to_download)
+
+        for index, result in self.download_as_completed(songs_to_download):
+            download_results[index] = result
+
+        return download_results
+
+
+    def download_as_completed(self, songs_to_download):
+        """Download every song in songs_to_download using the worker pool, yielding each
+        result as soon as its download finishes. Closing the generator early cancels the
+        downloads that have not started yet.
+
+        Args:
+            songs_to_download (list((str, str, str))): Each entry is
+                                                      (song name, download link, save location).
+
+        Yields:
+            (int, DownloadResult): The position of the song in songs_to_download, and the
+                                   outcome of its download.
+        """
+        if not songs_to_download:
+            return
+
+        number_of_workers = min(self.__max_workers, len(songs_to_download))
+
+        with ThreadPoolExecutor(max_workers=number_of_workers) as executor:
+            pending_downloads = {executor.submit(self.download, *song): index
+                                 for index, song in enumerate(songs_to_download)}
+
+            try:
+                for pending_download in as_completed(pending_downloads):
+                    yield pending_downloads[pending_download], pending_download.result()
+            finally:
+                for pending_download in pending_downloads:
+                    pending_download.cancel()
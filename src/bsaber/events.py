@@ -0,0 +1,229 @@
+"""
+@author Eric Zair
+@file events.py
+
+Contains the Event, EventEmitter, MetricsCollector and JsonLinesEventWriter objects, and
+profile_run().
+
+SongScraper emits an Event at each step of a run, so callers can see where the time goes:
+
+    page_fetched       url, status_code, from_cache, duration, bytes
+    page_parsed        url, duration, songs
+    download_progress  song, bytes, total_bytes
+    download_done      song, duration, bytes, success, attempts
+    extract_done       song_folder, duration, success, skipped
+
+Subscribe a MetricsCollector to turn them into counters and histograms that can be
+exported in the Prometheus text format or as JSON, or a JsonLinesEventWriter to log every
+event as a line of JSON.
+"""
+
+# Handling the listeners and the metrics.
+from threading import Lock
+import cProfile
+import json
+import time
+
+
+""" Upper bounds, in seconds, of the buckets that durations are counted in. """
+DURATION_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+
+
+class Event():
+    """Something that happened during a SongScraper run."""
+
+    __slots__ = ('name', 'timestamp', 'fields')
+
+    def __init__(self, name, fields):
+        """Constructs an Event object, timestamped now.
+
+        Args:
+            name (str): What happened, e.g. 'page_fetched'.
+
+            fields (dict): The details of the event, e.g. its duration and byte count.
+        """
+        self.name = name
+        self.timestamp = time.time()
+        self.fields = fields
+
+
+    def to_dict(self):
+        """Return the event as a dict that can be written as JSON."""
+        return dict(self.fields, event=self.name, timestamp=self.timestamp)
+
+
+    def __repr__(self):
+        return f"Event(name={self.name!r}, fields={self.fields!r})"
+
+
+class EventEmitter():
+    """Hands each emitted event to the listeners that subscribed to it."""
+
+    def __init__(self):
+        """Constructs an EventEmitter object with no listeners."""
+
+        """ event name -> listeners of it. Listeners of every event are under None. """
+        self.__listeners = {}
+        self.__lock = Lock()
+
+
+    def subscribe(self, listener, event_names=None):
+        """Call listener with each Event named in event_names.
+
+        Args:
+            listener (function(Event)): Called with each event. It may be called from worker
+                                        threads, so it has to be thread safe.
+
+            event_names (list(str), optional): The events to listen to. Defaults to every event.
+        """
+        with self.__lock:
+            for event_name in event_names or [None]:
+                self.__listeners.setdefault(event_name, []).append(listener)
+
+
+    def has_listeners(self, event_name):
+        """Return True if anyone listens to event_name, so costly events can be skipped."""
+        return bool(self.__listeners.get(event_name) or self.__listeners.get(None))
+
+
+    def emit(self, event_name, **fields):
+        """Hand an Event with the given name and fields to everyone listening to it."""
+        listeners = self.__listeners.get(event_name, []) + self.__listeners.get(None, [])
+
+        if not listeners:
+            return
+
+        event = Event(event_name, fields)
+
+        for listener in listeners:
+            listener(event)
+
+
+class MetricsCollector():
+    """Listener that turns events into counters and duration histograms."""
+
+    def __init__(self):
+        """Constructs a MetricsCollector object with every metric at zero."""
+        self.__lock = Lock()
+
+        """ event name -> number of times it was emitted. """
+        self.event_counts = {}
+
+        """ event name -> total of its 'bytes' field. """
+        self.byte_counts = {}
+
+        """ event name -> [count of durations in each of DURATION_BUCKETS, then +Inf]. """
+        self.duration_buckets = {}
+
+        """ event name -> sum of its durations. """
+        self.duration_sums = {}
+
+        """ event name -> number of events whose 'success' field was False. """
+        self.failure_counts = {}
+
+
+    def __call__(self, event):
+        with self.__lock:
+            self.event_counts[event.name] = self.event_counts.get(event.name, 0) + 1
+
+            # Progress events carry a running total, which would be counted many times over.
+            if 'bytes' in event.fields and event.name != 'download_progress':
+                self.byte_counts[event.name] = \
+                    self.byte_counts.get(event.name, 0) + event.fields['bytes']
+
+            if event.fields.get('success') is False:
+                self.failure_counts[event.name] = self.failure_counts.get(event.name, 0) + 1
+
+            if 'duration' in event.fields:
+                duration = event.fields['duration']
+                buckets = self.duration_buckets.setdefault(event.name,
+                                                           [0] * (len(DURATION_BUCKETS) + 1))
+                bucket = next((i for i, upper_bound in enumerate(DURATION_BUCKETS)
+                               if duration <= upper_bound), len(DURATION_BUCKETS))
+                buckets[bucket] += 1
+                self.duration_sums[event.name] = self.duration_sums.get(event.name, 0.0) + duration
+
+
+    def to_json(self):
+        """Return every metric as a dict that can be written as JSON."""
+        with self.__lock:
+            return {'events': dict(self.event_counts),
+                    'bytes': dict(self.byte_counts),
+                    'failures': dict(self.failure_counts),
+                    'duration_seconds': {name: {'buckets': dict(zip(DURATION_BUCKETS + ['+Inf'],
+                                                                     buckets)),
+                                                'sum': self.duration_sums[name],
+                                                'count': sum(buckets)}
+                                         for name, buckets in self.duration_buckets.items()}}
+
+
+    def to_prometheus(self):
+        """Return every metric in the Prometheus text exposition format."""
+        metrics = self.to_json()
+        lines = ['# TYPE bsaber_events_total counter']
+        lines += [f'bsaber_events_total{{event="{name}"}} {count}'
+                  for name, count in metrics['events'].items()]
+
+        lines.append('# TYPE bsaber_bytes_total counter')
+        lines += [f'bsaber_bytes_total{{event="{name}"}} {count}'
+                  for name, count in metrics['bytes'].items()]
+
+        lines.append('# TYPE bsaber_failures_total counter')
+        lines += [f'bsaber_failures_total{{event="{name}"}} {count}'
+                  for name, count in metrics['failures'].items()]
+
+        lines.append('# TYPE bsaber_duration_seconds histogram')
+        for name, histogram in metrics['duration_seconds'].items():
+            cumulative_count = 0
+
+            for upper_bound, count in histogram['buckets'].items():
+                cumulative_count += count
+                lines.append(f'bsaber_duration_seconds_bucket{{event="{name}",le="{upper_bound}"}} '
+                             f'{cumulative_count}')
+
+            lines.append(f'bsaber_duration_seconds_sum{{event="{name}"}} {histogram["sum"]}')
+            lines.append(f'bsaber_duration_seconds_count{{event="{name}"}} {histogram["count"]}')
+
+        return '\n'.join(lines) + '\n'
+
+
+class JsonLinesEventWriter():
+    """Listener that writes each event to a file as a line of JSON."""
+
+    def __init__(self, output_file):
+        """Constructs a JsonLinesEventWriter object.
+
+        Args:
+            output_file (file object): Opened for writing text.
+        """
+        self.__output_file = output_file
+        self.__lock = Lock()
+
+
+    def __call__(self, event):
+        line = json.dumps(event.to_dict(), default=str)
+
+        with self.__lock:
+            self.__output_file.write(line + '\n')
+
+
+def profile_run(path_to_stats, function, *args, **kwargs):
+    """Run function(*args, **kwargs) under cProfile and write the stats to path_to_stats.
+
+    The stats can be read with pstats, e.g. python -m pstats <path_to_stats>. Only the calling thread
+    is profiled, so time spent in worker threads shows up as waiting on them.
+
+    Args:
+        path_to_stats (str): The file that the profile is written to.
+
+        function (function): The run to profile, e.g. scraper.download_extract_songs.
+
+    Returns:
+        object: Whatever function returned.
+    """
+    profiler = cProfile.Profile()
+
+    try:
+        return profiler.runcall(function, *args, **kwargs)
+    finally:
+        profiler.dump_stats(path_to_stats)
@@ -0,0 +1,145 @@
+"""
+@author Eric Zair
+@file extraction_manifest.py
+
+Contains the ExtractionManifest object and the helpers that selective extraction uses to
+decide which members of a song's zipfile have to be written.
+
+Each song folder keeps a small manifest of the zipfile it was extracted from: the
+zipfile's size and modification time, and the name, size and CRC of each member along with
+the size and modification time that the member's file had on disk once it was written.
+Comparing a zipfile's central directory against the manifest and a stat of each file tells
+which files are missing, were changed on disk, or changed in an updated zipfile, without
+inflating anything.
+"""
+
+# Handling the manifest file.
+import json
+import zlib
+
+# Handling file system navigation and paths.
+from os.path import join
+from os import replace, stat
+
+
+""" Name of the manifest file inside of each song folder. """
+MANIFEST_NAME = '.bsaber_manifest.json'
+
+""" Version of the manifest's layout. A manifest of another version is ignored. """
+MANIFEST_VERSION = 1
+
+""" Size of each chunk that is read from disk while a file's CRC is computed. """
+CRC_CHUNK_SIZE = 64 * 1024
+
+
+def archive_signature(path_to_song_zipfile):
+    """Return [size, modification time] of the zipfile at path_to_song_zipfile, None if the
+    song is extracted from memory and has no path.
+    """
+    if path_to_song_zipfile is None:
+        return None
+
+    zipfile_stat = stat(path_to_song_zipfile)
+    return [zipfile_stat.st_size, zipfile_stat.st_mtime_ns]
+
+
+def file_crc32(path):
+    """Return the CRC-32 of the file at path, the same way a zipfile computes it."""
+    crc = 0
+
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(CRC_CHUNK_SIZE), b''):
+            crc = zlib.crc32(chunk, crc)
+
+    return crc
+
+
+class ExtractionManifest():
+    """What a song folder was extracted from, and what its files looked like afterwards."""
+
+    def __init__(self, archive=None, members=None):
+        """Constructs an ExtractionManifest object.
+
+        Args:
+            archive (list(int), optional): [size, modification time] of the zipfile, None if
+                                           it was extracted from memory. Defaults to None.
+
+            members (dict(str, list(int)), optional): member name ->
+                                                      [size, CRC, size on disk,
+                                                       modification time on disk].
+                                                      Defaults to no members.
+        """
+        self.archive = archive
+        self.members = members if members is not None else {}
+
+
+    @staticmethod
+    def load(song_folder):
+        """Return the manifest of song_folder, None if it has none or it can not be read."""
+        try:
+            with open(join(song_folder, MANIFEST_NAME), 'r', encoding='utf-8') as manifest_file:
+                manifest = json.load(manifest_file)
+        except (OSError, ValueError):
+            return None
+
+        if not isinstance(manifest, dict) or manifest.get('version') != MANIFEST_VERSION:
+            return None
+
+        return ExtractionManifest(manifest.get('archive'), manifest.get('members', {}))
+
+
+    def save(self, song_folder):
+        """Write the manifest into song_folder, replacing the old one in one step."""
+        path_to_manifest = join(song_folder, MANIFEST_NAME)
+
+        with open(path_to_manifest + '.tmp', 'w', encoding='utf-8') as manifest_file:
+            json.dump({'version': MANIFEST_VERSION, 'archive': self.archive,
+                       'members': self.members}, manifest_file)
+
+        replace(path_to_manifest + '.tmp', path_to_manifest)
+
+
+    def record(self, member, destination):
+        """Remember member as written to destination, as it is on disk right now."""
+        file_stat = stat(destination)
+        self.members[member.filename] = [member.file_size, member.CRC,
+                                         file_stat.st_size, file_stat.st_mtime_ns]
+
+
+    def files_unchanged(self, song_folder):
+        """Return True if every file in the manifest is still on disk as it was written."""
+        for name, (_, _, size_on_disk, mtime_on_disk) in self.members.items():
+            try:
+                file_stat = stat(join(song_folder, name))
+            except OSError:
+                return False
+
+            if file_stat.st_size != size_on_disk or file_stat.st_mtime_ns != mtime_on_disk:
+                return False
+
+        return True
+
+
+    def is_stale(self, member, destination):
+        """Return True if member has to be written to destination.
+
+        That is when the file is missing, has the wrong size, changed in the zipfile, or
+        changed on disk since it was written. A file the manifest does not know about, e.g.
+        in a folder that was extracted before there were manifests, is checked by its CRC.
+        """
+        try:
+            file_stat = stat(destination)
+        except OSError:
+            return True
+
+        if file_stat.st_size != member.file_size:
+            return True
+
+        entry = self.members.get(member.filename)
+
+        if entry is None:
+            return file_crc32(destination) != member.CRC
+
+        size, crc, size_on_disk, mtime_on_disk = entry
+        return size != member.file_size or crc != member.CRC or \
+            file_stat.st_size != size_on_disk or file_stat.st_mtime_ns != mtime_on_disk
@@ -0,0 +1,388 @@
+"""
+@author Eric Zair
+@file extractor.py
+
+Contains the ExtractionResult and ExtractionSummary objects, and the functions used to
+extract custom song zipfiles into their own folders.
+
+Extracting a zipfile is mostly deflate work and disk I/O, so independent songs can be
+extracted in parallel by a pool of worker processes.
+
+By default extraction is selective: each song folder keeps an ExtractionManifest, and only
+the members that are missing or changed, on disk or in an updated zipfile, are written, while
+the files that an updated zipfile no longer has are removed. A song whose zipfile and files are
+unchanged is skipped after a stat of each, without the zipfile being opened.
+
+A new song folder is extracted into a temporary folder next to it and renamed into place once
+every file is written, so a failed extraction never leaves an empty or partial song behind.
+"""
+
+# Handling the worker pool.
+from functools import partial
+import shutil
+import time
+import uuid
+
+# Handling file system navigation and paths.
+from os.path import join, exists, splitext, normpath, isabs, dirname
+from os import mkdir, makedirs, remove, replace, sep, rename
+import zipfile
+
+# Only writing the members of a zipfile that are missing or changed.
+from bsaber.extraction_manifest import ExtractionManifest, archive_signature
+
+# Storing the files of each song only once.
+from bsaber.blob_store import BlobStore
+
+
+""" Size of each chunk that is copied from a zip member to disk. """
+EXTRACT_CHUNK_SIZE = 64 * 1024
+
+
+class ExtractionResult():
+    """The outcome of extracting a single song's zipfile."""
+
+    def __init__(self, path_to_song_zipfile, song_folder):
+        """Constructs an ExtractionResult object.
+
+        Args:
+            path_to_song_zipfile (str): The zipfile that was extracted, None if the song
+                                        was extracted from memory.
+
+            song_folder (str): The folder that the zipfile was extracted into.
+        """
+        self.path_to_song_zipfile = path_to_song_zipfile
+        self.song_folder = song_folder
+
+        """ True if the zipfile was extracted without an error. """
+        self.success = False
+
+        """ True if the song folder was already up to date, so nothing was extracted. """
+        self.skipped = False
+
+        """ Number of files that were written, only counted by selective extraction. """
+        self.members_written = 0
+
+        """ Number of files whose bytes the blob store already had, so they were only linked. """
+        self.files_linked = 0
+
+        """ Number of seconds that the extraction took. """
+        self.elapsed = 0.0
+
+        """ The exception that stopped the extraction, None if it succeeded. """
+        self.error = None
+
+
+    def __repr__(self):
+        return (f"ExtractionResult(path_to_song_zipfile={self.path_to_song_zipfile!r}, "
+                f"success={self.success}, skipped={self.skipped}, "
+                f"elapsed={self.elapsed:.3f}, error={self.error!r})")
+
+
+class ExtractionSummary():
+    """The outcome of extracting a whole batch of song zipfiles."""
+
+    def __init__(self, results, elapsed):
+        """Constructs an ExtractionSummary object.
+
+        Args:
+            results (list(ExtractionResult)): The result for each zipfile in the batch.
+
+            elapsed (float): Wall clock seconds that the whole batch took.
+        """
+        self.results = results
+        self.elapsed = elapsed
+
+
+    def extracted(self):
+        """Return the results of the zipfiles that were extracted."""
+        return [result for result in self.results if result.success and not result.skipped]
+
+
+    def skipped(self):
+        """Return the results of the zipfiles whose song folder was already up to date."""
+        return [result for result in self.results if result.skipped]
+
+
+    def failed(self):
+        """Return the results of the zipfiles that could not be extracted."""
+        return [result for result in self.results if not result.success]
+
+
+    def __repr__(self):
+        return (f"ExtractionSummary(extracted={len(self.extracted())}, "
+                f"skipped={len(self.skipped())}, failed={len(self.failed())}, "
+                f"elapsed={self.elapsed:.3f})")
+
+
+def song_folder_for_zipfile(path_to_song_zipfile):
+    """Return the folder that a song's zipfile is extracted into, which is the zipfile's
+    path without the .zip extension.
+    """
+    return splitext(path_to_song_zipfile)[0]
+
+
+def _member_destination(song_folder, member_name):
+    """Return the path in song_folder that the zip member named member_name is extracted to.
+
+    Raises:
+        ValueError: If member_name would be extracted outside of song_folder.
+    """
+    member_path = normpath(member_name)
+
+    if isabs(member_path) or member_path == '..' or member_path.startswith('..' + sep):
+        raise ValueError(f"Error: zip member {member_name} is outside of the song folder.")
+
+    return join(song_folder, member_path)
+
+
+def _extract_into_blob_store(zipfile_to_extract, song_folder, blob_store, result):
+    """Helper method for extract_song_archive().
+    Link each member of zipfile_to_extract into song_folder through blob_store.
+    """
+    for member in zipfile_to_extract.infolist():
+        destination = _member_destination(song_folder, member.filename)
+
+        if member.is_dir():
+            makedirs(destination, exist_ok=True)
+            continue
+
+        makedirs(dirname(destination), exist_ok=True)
+
+        if blob_store.link_zip_member(zipfile_to_extract, member, destination):
+            result.files_linked += 1
+
+
+def _write_zip_member(zipfile_to_extract, member, destination):
+    """Helper method for _extract_selectively().
+    Inflate member to destination. The file is written next to destination first and then
+    renamed over it, so a crash never leaves a half written file behind, and a file that is
+    hard linked from the blob store is replaced instead of being changed.
+    """
+    temp_path = f'{destination}.bsaber-tmp-{uuid.uuid4().hex}'
+
+    try:
+        with zipfile_to_extract.open(member) as member_file, open(temp_path, 'wb') as temp_file:
+            shutil.copyfileobj(member_file, temp_file, EXTRACT_CHUNK_SIZE)
+
+        replace(temp_path, destination)
+    except BaseException:
+        if exists(temp_path):
+            remove(temp_path)
+        raise
+
+
+def _remove_dropped_members(manifest, new_manifest, song_folder):
+    """Helper method for _extract_selectively().
+    Remove the files that manifest recorded but new_manifest does not, i.e. the members that
+    an updated zipfile no longer has.
+
+    Returns:
+        int: The number of files removed.
+    """
+    number_of_files_removed = 0
+
+    for name in manifest.members.keys() - new_manifest.members.keys():
+        try:
+            remove(_member_destination(song_folder, name))
+            number_of_files_removed += 1
+        except FileNotFoundError:
+            pass
+
+    return number_of_files_removed
+
+
+def _extract_selectively(archive, song_folder, path_to_song_zipfile, path_to_blob_store, result):
+    """Helper method for extract_song_archive().
+    Write only the members of archive that are missing from song_folder or changed, then
+    save the song folder's manifest.
+    """
+    manifest = ExtractionManifest.load(song_folder) or ExtractionManifest()
+    signature = archive_signature(path_to_song_zipfile)
+
+    # Same zipfile and the files are untouched, so there is no need to even open it.
+    if signature is not None and manifest.archive == signature and manifest.members and \
+            manifest.files_unchanged(song_folder):
+        result.skipped = True
+        return
+
+    makedirs(song_folder, exist_ok=True)
+    blob_store = None if path_to_blob_store is None else BlobStore(path_to_blob_store)
+    new_manifest = ExtractionManifest(signature)
+
+    # Only the central directory is read until a member actually has to be written.
+    with zipfile.ZipFile(archive, 'r') as zipfile_to_extract:
+        for member in zipfile_to_extract.infolist():
+            destination = _member_destination(song_folder, member.filename)
+
+            if member.is_dir():
+                makedirs(destination, exist_ok=True)
+                continue
+
+            if manifest.is_stale(member, destination):
+                makedirs(dirname(destination), exist_ok=True)
+
+                if blob_store is None:
+                    _write_zip_member(zipfile_to_extract, member, destination)
+                elif blob_store.link_zip_member(zipfile_to_extract, member, destination):
+                    result.files_linked += 1
+
+                result.members_written += 1
+
+            new_manifest.record(member, destination)
+
+    number_of_files_removed = _remove_dropped_members(manifest, new_manifest, song_folder)
+    new_manifest.save(song_folder)
+    result.skipped = result.members_written == 0 and number_of_files_removed == 0
+
+
+def _extract_into_new_folder(archive, song_folder, path_to_song_zipfile, path_to_blob_store,
+                             selective, result):
+    """Helper method for extract_song_archive().
+    Extract archive into a temporary folder next to song_folder, then rename it to
+    song_folder in one step. The temporary folder is removed if anything goes wrong.
+    """
+    temp_folder = f'{song_folder}.bsaber-tmp-{uuid.uuid4().hex}'
+
+    try:
+        if selective:
+            _extract_selectively(archive, temp_folder, path_to_song_zipfile, path_to_blob_store,
+                                 result)
+        else:
+            mkdir(temp_folder)
+
+            with zipfile.ZipFile(archive, 'r') as zipfile_to_extract:
+                if path_to_blob_store is None:
+                    zipfile_to_extract.extractall(temp_folder)
+                else:
+                    _extract_into_blob_store(zipfile_to_extract, temp_folder,
+                                             BlobStore(path_to_blob_store), result)
+
+        rename(temp_folder, song_folder)
+    except BaseException:
+        shutil.rmtree(temp_folder, ignore_errors=True)
+        raise
+
+
+def extract_song_archive(archive, song_folder, path_to_song_zipfile=None, path_to_blob_store=None,
+                         selective=True):
+    """Builds a new folder for a custom song and extracts the archive's content
+    into that new folder.
+
+    Args:
+        archive (str or file object): The song's zipfile, either a path or a file object
+                                      holding the zipfile's bytes.
+
+        song_folder (str): The folder that the song is extracted into.
+
+        path_to_song_zipfile (str, optional): The zipfile's path, recorded on the result.
+                                              None if the song is extracted from memory.
+                                              Defaults to None.
+
+        path_to_blob_store (str, optional): If given, each file of the song is stored once in
+                                            the BlobStore at this path and linked into the
+                                            song folder. Defaults to None.
+
+        selective (bool, optional): True to only write the members that are missing from the
+                                    song folder or changed, which also repairs half extracted
+                                    folders and re-extracts updated zipfiles. False to skip any
+                                    song whose folder already exists. Defaults to True.
+
+    Returns:
+        ExtractionResult: The outcome of the extraction. Errors are stored on the result
+                          instead of being raised.
+    """
+    result = ExtractionResult(path_to_song_zipfile, song_folder)
+    start_time = time.perf_counter()
+
+    # Without selective extraction, don't want to extract into a folder that already exists.
+    if not selective and exists(song_folder):
+        result.success = True
+        result.skipped = True
+        return result
+
+    try:
+        if exists(song_folder):
+            _extract_selectively(archive, song_folder, path_to_song_zipfile, path_to_blob_store,
+                                 result)
+        else:
+            _extract_into_new_folder(archive, song_folder, path_to_song_zipfile,
+                                     path_to_blob_store, selective, result)
+
+        result.success = True
+    except Exception as e:
+        result.error = e
+
+    result.elapsed = time.perf_counter() - start_time
+    return result
+
+
+def extract_song_zipfile(path_to_song_zipfile, path_to_blob_store=None, keep_zipfile=True,
+                         selective=True):
+    """Extract the song zipfile at path_to_song_zipfile into a folder of the same name.
+
+    Args:
+        path_to_song_zipfile (str): The zipfile of the song that is extracted.
+
+        path_to_blob_store (str, optional): If given, the song's files are linked from the
+                                            BlobStore at this path. Defaults to None.
+
+        keep_zipfile (bool, optional): False if the zipfile should be removed once the song
+                                       has been extracted. Defaults to True.
+
+        selective (bool, optional): True to only write the members that are missing or
+                                    changed. Defaults to True.
+
+    Returns:
+        ExtractionResult: The outcome of the extraction.
+    """
+    result = extract_song_archive(path_to_song_zipfile,
+                                  song_folder_for_zipfile(path_to_song_zipfile),
+                                  path_to_song_zipfile, path_to_blob_store, selective)
+
+    if result.success and not keep_zipfile:
+        remove(path_to_song_zipfile)
+
+    return result
+
+
+def extract_song_zipfiles(paths_to_song_zipfiles, max_workers=1, path_to_blob_store=None,
+                          keep_zipfiles=True, selective=True):
+    """Extract each zipfile in paths_to_song_zipfiles into its own song folder.
+
+    Args:
+        paths_to_song_zipfiles (list(str)): The zipfiles that are extracted.
+
+        max_workers (int, optional): The number of worker processes that extract songs in
+                                     parallel. 1 extracts every song in this process.
+                                     Defaults to 1.
+
+        path_to_blob_store (str, optional): If given, the songs' files are linked from the
+                                            BlobStore at this path. Defaults to None.
+
+        keep_zipfiles (bool, optional): False if each zipfile should be removed once its song
+                                        has been extracted. Defaults to True.
+
+        selective (bool, optional): True to only write the members of each zipfile that are
+                                    missing or changed. Defaults to True.
+
+    Returns:
+        ExtractionSummary: The result of every zipfile in the same order that they were given.
+    """
+    if max_workers < 1:
+        raise ValueError("Error: max_workers must be at least 1.")
+
+    start_time = time.perf_counter()
+    extract = partial(extract_song_zipfile, path_to_blob_store=path_to_blob_store,
+                      keep_zipfile=keep_zipfiles, selective=selective)
+
+    if max_workers == 1 or len(paths_to_song_zipfiles) < 2:
+        results = [extract(path) for path in paths_to_song_zipfiles]
+    else:
+        # Imported here since multiprocessing is slow to import and only needed for a pool.
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(extract, paths_to_song_zipfiles))
+
+    return ExtractionSummary(results, time.perf_counter() - start_time)
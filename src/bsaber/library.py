@@ -0,0 +1,292 @@
+"""
+@author Eric Zair
+@file library.py
+
+Contains the SongLibrary object.
+
+SongLibrary is everything that SongScraper does with the custom_levels folder that does not
+need the network: extracting song zipfiles, verifying the song folders, keeping the index of
+installed songs, searching the installed and already seen songs, and cleaning up the blob
+store. It never imports the
+http or html parsing stacks, so programs that only work on songs that are already on disk,
+e.g. extract_custom_songs.py, start fast.
+"""
+
+# Handling file system navigation and paths.
+from os.path import join
+from os import listdir
+
+# Extracting song zipfiles in parallel.
+from bsaber.extractor import extract_song_zipfile, extract_song_zipfiles
+
+# Checking that the game can load each song folder.
+from bsaber.verifier import verify_custom_levels
+
+# Remembering which songs are already installed.
+from bsaber.song_index import SongIndex
+
+# Searching the installed and already seen songs without the network.
+from bsaber.song_search import SongSearchIndex, read_song_metadata
+
+# Storing the files of each song only once.
+from bsaber.blob_store import BlobStore
+
+
+class SongLibrary():
+    """Object used for extracting and keeping track of the songs in the custom_levels folder."""
+
+    def __init__(self, path_to_custom_levels_folder, path_to_song_index=None,
+                 path_to_blob_store=None, events=None, path_to_search_index=None,
+                 path_to_verification_report=None):
+        """Constructs a SongLibrary object.
+
+        Args:
+            path_to_custom_levels_folder (str): The location of the custom_levels/
+                                                folder in your beatsaber game.
+
+            path_to_song_index (str, optional): The location of the index of installed songs.
+                                                Defaults to bsaber_index.sqlite3 inside of the
+                                                custom_levels/ folder.
+
+            path_to_blob_store (str, optional): If given, each song's files are stored once in a
+                                                BlobStore at this path and hard linked into the
+                                                song folders, and zipfiles are removed once they
+                                                are extracted. Defaults to None.
+
+            events (EventEmitter, optional): Emits extract_done. Defaults to None.
+
+            path_to_search_index (str, optional): The location of the search index of the
+                                                  installed and already seen songs. Defaults to
+                                                  bsaber_search.sqlite3 inside of the
+                                                  custom_levels/ folder.
+
+            path_to_verification_report (str, optional): Where the reports of verify() are
+                                                         cached. Defaults to
+                                                         bsaber_verify.json inside of the
+                                                         custom_levels/ folder.
+        """
+
+        """ Location that custom songs are saved at. """
+        self.path = path_to_custom_levels_folder
+
+        """ Content addressed store that song files are linked from, None to extract normally. """
+        self.path_to_blob_store = path_to_blob_store
+
+        """ Index of the installed songs, keyed by beatsaver key. Opened on first use. """
+        self.__path_to_song_index = path_to_song_index or \
+            join(path_to_custom_levels_folder, 'bsaber_index.sqlite3')
+        self.__song_index = None
+
+        """ Search index of the installed and already seen songs. Opened on first use. """
+        self.__path_to_search_index = path_to_search_index or \
+            join(path_to_custom_levels_folder, 'bsaber_search.sqlite3')
+        self.__search_index = None
+
+        """ Cached report of every song folder, so unchanged folders are not verified again. """
+        self.__path_to_verification_report = path_to_verification_report or \
+            join(path_to_custom_levels_folder, 'bsaber_verify.json')
+
+        self.__events = events
+
+
+    def song_folder(self, song):
+        """Return the folder that song is extracted to.
+
+        Args:
+            song (Song): The song.
+
+        Returns:
+            str: '<custom_levels>/<key> (<title>)'.
+        """
+        return join(self.path, song.folder_name)
+
+
+    def song_index(self):
+        """Return the index of the songs that are installed in the custom_levels folder.
+
+        Returns:
+            SongIndex: The index of installed songs.
+        """
+        if self.__song_index is None:
+            self.__song_index = SongIndex(self.__path_to_song_index)
+
+        return self.__song_index
+
+
+    def search_index(self):
+        """Return the search index of the installed songs and the songs seen on listings.
+
+        Returns:
+            SongSearchIndex: The search index.
+        """
+        if self.__search_index is None:
+            self.__search_index = SongSearchIndex(self.__path_to_search_index)
+
+        return self.__search_index
+
+
+    def search(self, query, limit=20, installed_only=False):
+        """Return the installed and already seen songs that best match query, best first.
+        Nothing is fetched, so this only takes a few milliseconds.
+
+        Args:
+            query (str): What to search for. Titles, artists and mappers are searched, and
+                         small typos are forgiven.
+
+            limit (int, optional): The most songs that are returned. Defaults to 20.
+
+            installed_only (bool, optional): True to only return installed songs.
+                                             Defaults to False.
+
+        Returns:
+            list(SearchHit): The songs that matched, an empty list on a miss.
+        """
+        return self.search_index().search(query, limit=limit, installed_only=installed_only)
+
+
+    def rebuild_song_index(self):
+        """Repopulate the index of installed songs from the custom_levels folder, and bring
+        the search index up to date with it, reading each song's title, artist and mapper
+        from its info.dat.
+
+        Returns:
+            int: The number of songs in the index after it was rebuilt.
+        """
+        number_of_songs = self.song_index().rebuild(self.path)
+        search_index = self.search_index()
+
+        for record in self.song_index().records():
+            title, artist, mapper = read_song_metadata(record['folder']) or (None, None, None)
+            search_index.add(record['key'], title or record['title'], artist, mapper,
+                             installed=True)
+
+        search_index.set_installed_keys(self.song_index().installed_keys())
+        return number_of_songs
+
+
+    def record_installed_song(self, song, download_result):
+        """Add a successfully downloaded song to the index of installed songs.
+
+        Args:
+            song (Song): The song that was installed.
+
+            download_result (DownloadResult): The outcome of the song's download.
+        """
+        self.song_index().add(song.key, title=song.title, folder=self.song_folder(song),
+                              archive_hash=download_result.sha1,
+                              size=download_result.bytes_written)
+        self.search_index().add(song.key, song.title, mapper=song.mapper, installed=True)
+
+
+    def garbage_collect_blob_store(self):
+        """Remove the stored song files that no song folder uses anymore.
+
+        Returns:
+            (int, int): The number of files removed and the number of bytes freed.
+
+        Raises:
+            ValueError: If the library was not given a path_to_blob_store.
+        """
+        if self.path_to_blob_store is None:
+            raise ValueError("Error: this song library does not use a blob store.")
+
+        return BlobStore(self.path_to_blob_store).garbage_collect()
+
+
+    def __report_extraction(self, result, display_error_message):
+        """Emit extract_done for result, and print its error if it failed and the user
+        wants to see errors.
+        """
+        if self.__events is not None:
+            self.__events.emit('extract_done', song_folder=result.song_folder,
+                               duration=result.elapsed, success=result.success,
+                               skipped=result.skipped)
+
+        if display_error_message and not result.success:
+            print(result.error)
+
+
+    def extract_song_zipfile(self, path_to_song_zipfile, display_error_message=True):
+        """Extract a single zipfile into its own song folder.
+
+        Args:
+            path_to_song_zipfile (str): The zipfile that is extracted.
+
+            display_error_message (bool, optional): If the user wants to see the potential
+                                                    errors that are thrown. Defaults to True.
+
+        Returns:
+            ExtractionResult: The outcome of the extraction.
+        """
+        result = extract_song_zipfile(path_to_song_zipfile,
+                                      path_to_blob_store=self.path_to_blob_store,
+                                      keep_zipfile=self.path_to_blob_store is None)
+        self.__report_extraction(result, display_error_message)
+        return result
+
+
+    def extract_song_zipfiles(self, paths_to_song_zipfiles, display_error_message=True,
+                              max_workers=1):
+        """Extract each of the given zipfiles into its own song folder.
+
+        Args:
+            paths_to_song_zipfiles (list(str)): The zipfiles that are extracted.
+
+            display_error_message (bool, optional): If the user wants to see the potential
+                                                    errors that are thrown. Defaults to True.
+
+            max_workers (int, optional): The number of worker processes that extract songs in
+                                         parallel. Defaults to 1.
+
+        Returns:
+            ExtractionSummary: The timing and outcome of each zipfile's extraction.
+        """
+        extraction_summary = extract_song_zipfiles(paths_to_song_zipfiles, max_workers=max_workers,
+                                                   path_to_blob_store=self.path_to_blob_store,
+                                                   keep_zipfiles=self.path_to_blob_store is None)
+
+        for result in extraction_summary.results:
+            self.__report_extraction(result, display_error_message)
+
+        return extraction_summary
+
+
+    def verify(self, max_workers=1, force=False):
+        """Check that the game can load the map in each song folder, reading each map's
+        metadata and hash. Only the folders that changed since the last run are verified again.
+
+        Args:
+            max_workers (int, optional): The number of worker processes that verify folders in
+                                         parallel. Defaults to 1.
+
+            force (bool, optional): True to verify every folder again. Defaults to False.
+
+        Returns:
+            VerificationReport: The report of every song folder.
+        """
+        return verify_custom_levels(self.path, max_workers=max_workers,
+                                    path_to_report=self.__path_to_verification_report,
+                                    force=force)
+
+
+    def extract_all_songs_in_custom_levels_folder(self, display_error_message=True,
+                                                  max_workers=1):
+        """Extract each custom song's zipfile into a new folder located
+        in the custom_levels/ folder in the beatsaber game.
+
+        Args:
+            display_error_message (bool, optional): If the user wants to see the potential
+                                                    errors that are thrown. Defaults to True.
+
+            max_workers (int, optional): The number of worker processes that extract songs in
+                                         parallel. Defaults to 1.
+
+        Returns:
+            ExtractionSummary: The timing and outcome of each zipfile's extraction.
+        """
+        list_of_zipfiles = [join(self.path, file) for file in listdir(self.path)
+                            if file.endswith('.zip')]
+
+        return self.extract_song_zipfiles(list_of_zipfiles,
+                                          display_error_message=display_error_message,
+                                          max_workers=max_workers)
@@ -0,0 +1,178 @@
+"""
+@author Eric Zair
+@file listing_parser.py
+
+Contains the ListingRecord object and parse_listing().
+
+parse_listing() reads a bsaber.com listing or search page with a streaming tokenizer that
+only pays attention to the song cards on the page. Nothing else on the page is ever turned
+into an object, and the song's fields are read from the tags themselves, so changes to the
+page's whitespace do not break it.
+"""
+
+# Handling the html tokenizer.
+from html.parser import HTMLParser
+from urllib.parse import urlparse
+
+
+""" Size of each chunk of the page that is fed to the tokenizer at once. """
+FEED_CHUNK_SIZE = 16 * 1024
+
+
+class ListingRecord():
+    """A single song card scraped from a listing or search page."""
+
+    __slots__ = ('key', 'title', 'mapper', 'page_url')
+
+    def __init__(self, key, title, mapper, page_url):
+        """Constructs a ListingRecord object.
+
+        Args:
+            key (str): The song's beatsaver key.
+
+            title (str): The song's title.
+
+            mapper (str): The name of the person who mapped the song, None if the card
+                          does not name one.
+
+            page_url (str): The link to the song's page on bsaber.com.
+        """
+        self.key = key
+        self.title = title
+        self.mapper = mapper
+        self.page_url = page_url
+
+
+    def __repr__(self):
+        return (f"ListingRecord(key={self.key!r}, title={self.title!r}, "
+                f"mapper={self.mapper!r}, page_url={self.page_url!r})")
+
+
+def song_key_from_page_url(page_url):
+    """Return the beatsaver key in the link to a song's page.
+
+    Args:
+        page_url (str): e.g. https://bsaber.com/songs/1a2b3/
+
+    Returns:
+        str: The song's key, e.g. 1a2b3. None if page_url is not a link to a song.
+    """
+    path_segments = [segment for segment in urlparse(page_url).path.split('/') if segment]
+
+    if len(path_segments) < 2 or path_segments[-2] != 'songs':
+        return None
+
+    return path_segments[-1]
+
+
+class _ListingTokenizer(HTMLParser):
+    """Helper object for parse_listing().
+    Collects a ListingRecord for each h4 song title on the page, and the mapper that
+    follows it in the same song card.
+    """
+
+    def __init__(self):
+        super().__init__()
+
+        """ Records that are done and waiting to be handed out by parse_listing(). """
+        self.finished_records = []
+
+        """ [page_url, title parts, mapper] of the card being read, None between cards. """
+        self.__card = None
+        self.__in_title = False
+        self.__in_title_link = False
+        self.__in_mapper_link = False
+
+
+    def __finish_card(self):
+        """Hand out the card being read, if there is one."""
+        if self.__card is not None:
+            self.finished_records.append(self.__card)
+            self.__card = None
+
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'h4':
+            self.__finish_card()
+            self.__card = [None, [], None]
+            self.__in_title = True
+        elif tag == 'a' and self.__card is not None:
+            attributes = dict(attrs)
+
+            if self.__in_title and self.__card[0] is None:
+                self.__card[0] = attributes.get('href')
+                self.__in_title_link = True
+            elif 'mapper_id' in (attributes.get('class') or '').split():
+                self.__in_mapper_link = True
+                self.__card[2] = ''
+
+
+    def handle_endtag(self, tag):
+        if tag == 'h4':
+            self.__in_title = False
+        elif tag == 'a':
+            self.__in_title_link = self.__in_mapper_link = False
+        elif tag == 'article':
+            self.__finish_card()
+
+
+    def handle_data(self, data):
+        if self.__in_title_link:
+            self.__card[1].append(data)
+        elif self.__in_mapper_link:
+            self.__card[2] += data
+
+
+    def close(self):
+        super().close()
+        self.__finish_card()
+
+
+def parse_listing(html, number_of_songs=None, skip=0):
+    """Yield a ListingRecord for each song card on a bsaber.com listing or search page.
+
+    Args:
+        html (str): The page's html.
+
+        number_of_songs (int, optional): Stop once the card at this position is reached,
+                                         counting the skipped cards. None reads every card.
+                                         Defaults to None.
+
+        skip (int, optional): The number of cards at the top of the page to skip, e.g. the
+                              search itself on a search page. Defaults to 0.
+
+    Yields:
+        ListingRecord: The next song card on the page.
+    """
+    tokenizer = _ListingTokenizer()
+    cards_seen = 0
+
+    def finished_records():
+        nonlocal cards_seen
+
+        for page_url, title_parts, mapper in tokenizer.finished_records:
+            cards_seen += 1
+
+            if number_of_songs is not None and cards_seen > number_of_songs:
+                return
+
+            if cards_seen <= skip or page_url is None:
+                continue
+
+            key = song_key_from_page_url(page_url)
+
+            if key is not None:
+                yield ListingRecord(key, ''.join(title_parts).strip(),
+                                    mapper.strip() if mapper else None, page_url)
+
+        tokenizer.finished_records.clear()
+
+    for chunk_start in range(0, len(html), FEED_CHUNK_SIZE):
+        tokenizer.feed(html[chunk_start: chunk_start + FEED_CHUNK_SIZE])
+        yield from finished_records()
+
+        if number_of_songs is not None and cards_seen >= number_of_songs:
+            return
+
+    tokenizer.close()
+    yield from finished_records()
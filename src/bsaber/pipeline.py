@@ -0,0 +1,203 @@
+"""
+@author Eric Zair
+@file pipeline.py
+
+Contains the PipelineResult object, stream_download_extract() and download_extract_pipelined().
+
+The pipeline extracts each song as soon as its download finishes, so extraction overlaps
+the network I/O of the songs that are still downloading. Songs are downloaded into memory
+and extracted straight from their bytes, so no intermediate .zip is written to disk unless
+it is asked for. A bounded buffer sits between the two stages, and no new download starts
+while it is full, so the memory that a run takes does not grow with the number of songs.
+"""
+
+# Handling the download and extraction stages.
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from io import BytesIO
+
+# Extracting songs straight from their downloaded bytes.
+from bsaber.extractor import extract_song_archive
+
+
+class PipelineResult():
+    """The outcome of downloading and extracting a single song."""
+
+    def __init__(self, download_result, extraction_result=None):
+        """Constructs a PipelineResult object.
+
+        Args:
+            download_result (DownloadResult): The outcome of the song's download.
+
+            extraction_result (ExtractionResult, optional): The outcome of the song's
+                                                            extraction, None if the download
+                                                            failed or was skipped.
+                                                            Defaults to None.
+        """
+        self.download_result = download_result
+        self.extraction_result = extraction_result
+
+
+    @property
+    def success(self):
+        """True if the song was downloaded and extracted, or was already installed."""
+        if self.download_result.skipped:
+            return True
+
+        return self.extraction_result is not None and self.extraction_result.success
+
+
+    @property
+    def error(self):
+        """The exception that stopped the song, None if it succeeded."""
+        if self.download_result.error is not None:
+            return self.download_result.error
+
+        return self.extraction_result.error if self.extraction_result else None
+
+
+    def __repr__(self):
+        return (f"PipelineResult(download_result={self.download_result!r}, "
+                f"extraction_result={self.extraction_result!r})")
+
+
+def _extract_downloaded_song(download_result, song_folder, keep_zipfiles, path_to_blob_store,
+                             events):
+    """Helper method for stream_download_extract().
+    Extract the song that download_result downloaded into memory to song_folder.
+    """
+    save_location = song_folder + '.zip'
+
+    # The bytes are dropped as soon as the song is extracted so that only the songs that are
+    # downloading or waiting to be extracted are held in memory.
+    content, download_result.content = download_result.content, None
+
+    if keep_zipfiles:
+        with open(save_location, 'wb') as zip_file:
+            zip_file.write(content)
+
+    extraction_result = extract_song_archive(BytesIO(content), song_folder,
+                                             save_location if keep_zipfiles else None,
+                                             path_to_blob_store)
+
+    if events is not None:
+        events.emit('extract_done', song_folder=song_folder,
+                    duration=extraction_result.elapsed, success=extraction_result.success,
+                    skipped=extraction_result.skipped)
+
+    return extraction_result
+
+
+def stream_download_extract(downloader, songs_to_download, max_workers=8, max_pending=4,
+                            extract_workers=1, keep_zipfiles=False, path_to_blob_store=None,
+                            events=None):
+    """Download every song in songs_to_download and extract each one as soon as its
+    download finishes, yielding each song's result as soon as it is done.
+
+    songs_to_download is only read as fast as songs can be downloaded, so it can be a
+    generator, e.g. of songs that are still being crawled. At most max_workers songs are
+    downloading, and at most max_pending downloaded songs wait for one of the extract_workers,
+    so no more than max_workers + max_pending + extract_workers songs are ever held in memory
+    at once, however many songs there are. Closing the generator early cancels the songs that
+    have not started yet.
+
+    Args:
+        downloader (SongDownloader): Used to download each song.
+
+        songs_to_download (iterable((str, str, str))): Each entry is
+                                                      (song name, download link, song folder).
+
+        max_workers (int, optional): The max number of songs downloaded at once. Defaults to 8.
+
+        max_pending (int, optional): No new download starts while this many downloaded songs
+                                     are waiting to be extracted. Defaults to 4.
+
+        extract_workers (int, optional): The number of threads extracting songs. Defaults to 1.
+
+        keep_zipfiles (bool, optional): True if each song's .zip should also be written next to
+                                        its song folder, False otherwise. Defaults to False.
+
+        path_to_blob_store (str, optional): If given, the songs' files are linked from the
+                                            BlobStore at this path. Defaults to None.
+
+        events (EventEmitter, optional): Emits extract_done for each song. Defaults to None.
+
+    Yields:
+        (int, PipelineResult): The position of the song in songs_to_download, and the outcome
+                               of its download and extraction.
+    """
+    if max_workers < 1 or max_pending < 1 or extract_workers < 1:
+        raise ValueError("Error: max_workers, max_pending and extract_workers must be at least 1.")
+
+    songs_to_download = enumerate(songs_to_download)
+    songs_left = True
+
+    # Future -> (position, song folder) of each song downloading, and
+    # future -> (position, DownloadResult) of each song extracting or waiting to be.
+    downloads = {}
+    extractions = {}
+
+    download_executor = ThreadPoolExecutor(max_workers=max_workers)
+    extract_executor = ThreadPoolExecutor(max_workers=extract_workers)
+
+    try:
+        while True:
+            # Only start another download while extraction is keeping up.
+            while songs_left and len(downloads) < max_workers and \
+                    len(extractions) - extract_workers < max_pending:
+                next_song = next(songs_to_download, None)
+
+                if next_song is None:
+                    songs_left = False
+                    break
+
+                index, (song, url, song_folder) = next_song
+                downloads[download_executor.submit(downloader.download, song, url)] = \
+                    (index, song_folder)
+
+            if not downloads and not extractions:
+                return
+
+            finished, _ = wait(list(downloads) + list(extractions), return_when=FIRST_COMPLETED)
+
+            for future in finished:
+                if future in downloads:
+                    index, song_folder = downloads.pop(future)
+                    download_result = future.result()
+
+                    if not download_result.success:
+                        yield index, PipelineResult(download_result)
+                        continue
+
+                    extraction = extract_executor.submit(_extract_downloaded_song, download_result,
+                                                         song_folder, keep_zipfiles,
+                                                         path_to_blob_store, events)
+                    extractions[extraction] = (index, download_result)
+                else:
+                    index, download_result = extractions.pop(future)
+                    yield index, PipelineResult(download_result, future.result())
+    finally:
+        for future in list(downloads) + list(extractions):
+            future.cancel()
+
+        download_executor.shutdown(wait=True)
+        extract_executor.shutdown(wait=True)
+
+
+def download_extract_pipelined(downloader, songs_to_download, max_workers=8, max_pending=4,
+                               extract_workers=1, keep_zipfiles=False, path_to_blob_store=None,
+                               events=None):
+    """Download every song in songs_to_download and extract each one as soon as its
+    download finishes. See stream_download_extract() for the arguments.
+
+    Returns:
+        list(PipelineResult): One result per song, in the same order that they were given.
+    """
+    pipeline_results = [None] * len(songs_to_download)
+
+    for index, pipeline_result in stream_download_extract(
+            downloader, songs_to_download, max_workers=max_workers, max_pending=max_pending,
+            extract_workers=extract_workers, keep_zipfiles=keep_zipfiles,
+            path_to_blob_store=path_to_blob_store, events=events):
+        pipeline_results[index] = pipeline_result
+
+    return pipeline_results
@@ -0,0 +1,353 @@
+"""
+@author Eric Zair
+@file rate_governor.py
+
+Contains the HostBudget, TokenBucket, AdaptiveLimiter and RateGovernor objects.
+
+RateGovernor sits under every request that SongScraper sends, so that mirroring a large
+set of songs does not get us throttled. Each host gets its own HostBudget:
+    - a token bucket capping the number of requests sent per second,
+    - a token bucket capping the number of bytes read per second,
+    - a pause honoring the Retry-After header of a 429 or 503,
+    - an AIMD limit on the number of requests open at once. It is halved whenever the host
+      answers with 403, 429 or a 5xx, and grows by about one every round trip while the
+      host answers quickly.
+
+Every request is sent inside of a permit:
+    with governor.limit(url) as permit:
+        response = session.get(url)
+        permit.record(response.status_code, response.headers.get('Retry-After'))
+        for chunk in response.iter_content():
+            permit.throttle(len(chunk))
+
+and asyncio code uses the same permit with 'async with' and 'await permit.throttle_async()',
+waiting for the host's budget on a worker thread so that the event loop keeps running.
+"""
+
+# Handling the locks and the waiting.
+from threading import Condition, Lock
+from urllib.parse import urlparse
+import time
+
+
+""" Status codes that mean the host wants us to slow down. """
+THROTTLE_STATUS_CODES = {403, 429}
+
+
+class HostBudget():
+    """How hard a single host may be hit."""
+
+    def __init__(self, requests_per_second=None, burst=1, bytes_per_second=None,
+                 min_concurrency=1, max_concurrency=16, latency_target=2.0,
+                 decrease_cooldown=1.0):
+        """Constructs a HostBudget object.
+
+        Args:
+            requests_per_second (float, optional): The most requests sent to the host per
+                                                   second, None for no limit. Defaults to None.
+
+            burst (int, optional): The number of requests that can be sent at once after the
+                                   host has been left alone for a while. Defaults to 1.
+
+            bytes_per_second (float, optional): The most bytes read from the host per second,
+                                                None for no limit. Defaults to None.
+
+            min_concurrency (int, optional): The adaptive limit on the number of open requests
+                                             never drops below this. Defaults to 1.
+
+            max_concurrency (int, optional): The adaptive limit on the number of open requests
+                                             starts at and never grows past this.
+                                             Defaults to 16.
+
+            latency_target (float, optional): Seconds that the host may take to answer for the
+                                              limit to keep growing. Defaults to 2.0.
+
+            decrease_cooldown (float, optional): Seconds after halving the limit during which
+                                                 it is not halved again, so one burst of
+                                                 errors only counts once. Defaults to 1.0.
+        """
+        if min_concurrency < 1 or max_concurrency < min_concurrency:
+            raise ValueError("Error: concurrency must be at least 1 and min <= max.")
+
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.bytes_per_second = bytes_per_second
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.latency_target = latency_target
+        self.decrease_cooldown = decrease_cooldown
+
+
+class TokenBucket():
+    """Thread safe token bucket. Taking more tokens than there are puts the bucket in debt,
+    and the caller waits until the debt is paid off, so any amount can be taken at once.
+    """
+
+    def __init__(self, rate, capacity):
+        """Constructs a full TokenBucket object.
+
+        Args:
+            rate (float): Tokens added to the bucket each second.
+
+            capacity (float): The most tokens that the bucket holds.
+        """
+        self.__rate = rate
+        self.__capacity = capacity
+        self.__tokens = capacity
+        self.__last_refill = time.monotonic()
+        self.__lock = Lock()
+
+
+    def take(self, amount=1):
+        """Take amount tokens from the bucket, waiting until the bucket can afford them."""
+        with self.__lock:
+            now = time.monotonic()
+            self.__tokens = min(self.__capacity,
+                                self.__tokens + (now - self.__last_refill) * self.__rate)
+            self.__last_refill = now
+            self.__tokens -= amount
+            wait = -self.__tokens / self.__rate if self.__tokens < 0 else 0.0
+
+        if wait > 0:
+            time.sleep(wait)
+
+
+class AdaptiveLimiter():
+    """Limit on the number of requests open at once that grows additively and shrinks
+    multiplicatively (AIMD), like TCP's congestion window.
+    """
+
+    def __init__(self, min_limit, max_limit, decrease_cooldown=1.0):
+        """Constructs an AdaptiveLimiter object, starting at max_limit."""
+        self.__min_limit = min_limit
+        self.__max_limit = max_limit
+        self.__decrease_cooldown = decrease_cooldown
+        self.__last_decrease = float('-inf')
+        self.__in_flight = 0
+        self.__condition = Condition()
+
+        """ The current limit. Fractional, so that it can grow by less than one at a time. """
+        self.limit = float(max_limit)
+
+
+    def acquire(self):
+        """Wait until a request can be opened under the limit, and open it."""
+        with self.__condition:
+            while self.__in_flight >= int(self.limit):
+                self.__condition.wait()
+
+            self.__in_flight += 1
+
+
+    def release(self):
+        """Close a request that was opened with acquire()."""
+        with self.__condition:
+            self.__in_flight -= 1
+            self.__condition.notify()
+
+
+    def increase(self):
+        """Grow the limit by 1 / limit, which adds up to about one per round trip."""
+        with self.__condition:
+            self.limit = min(self.__max_limit, self.limit + 1 / self.limit)
+            self.__condition.notify_all()
+
+
+    def decrease(self):
+        """Halve the limit, unless it was already halved within the cooldown."""
+        with self.__condition:
+            now = time.monotonic()
+
+            if now - self.__last_decrease >= self.__decrease_cooldown:
+                self.limit = max(self.__min_limit, self.limit / 2)
+                self.__last_decrease = now
+
+
+def parse_retry_after(retry_after):
+    """Return the seconds to wait given by a Retry-After header, 0 if there is nothing to wait.
+
+    Args:
+        retry_after (str): Either a number of seconds or an http date.
+    """
+    if not retry_after:
+        return 0.0
+
+    if retry_after.strip().isdigit():
+        return float(retry_after)
+
+    # Imported here since email is slow to import and hosts rarely send a date.
+    from email.utils import parsedate_to_datetime
+
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class _HostState():
+    """Helper object for RateGovernor. The buckets, limiter and pause of a single host."""
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.request_bucket = None if budget.requests_per_second is None \
+            else TokenBucket(budget.requests_per_second, budget.burst)
+        self.byte_bucket = None if budget.bytes_per_second is None \
+            else TokenBucket(budget.bytes_per_second, budget.bytes_per_second)
+        self.limiter = AdaptiveLimiter(budget.min_concurrency, budget.max_concurrency,
+                                       budget.decrease_cooldown)
+
+        """ time.monotonic() before which no request is sent, set by Retry-After. """
+        self.paused_until = 0.0
+
+
+class RequestPermit():
+    """Permission to send a single request to a host. Returned by RateGovernor.limit()."""
+
+    def __init__(self, host_state):
+        self.__host_state = host_state
+        self.__start_time = None
+        self.__recorded = False
+
+
+    def __enter__(self):
+        host_state = self.__host_state
+
+        # Paused hosts are waited out first, so a Retry-After is honored by every thread.
+        while True:
+            wait = host_state.paused_until - time.monotonic()
+            if wait <= 0:
+                break
+            time.sleep(wait)
+
+        host_state.limiter.acquire()
+
+        if host_state.request_bucket is not None:
+            host_state.request_bucket.take()
+
+        self.__start_time = time.monotonic()
+        return self
+
+
+    def record(self, status_code, retry_after=None):
+        """Tell the governor how the host answered, as soon as the headers arrive.
+
+        Args:
+            status_code (int): The status code of the answer.
+
+            retry_after (str, optional): The answer's Retry-After header. Defaults to None.
+        """
+        host_state = self.__host_state
+        latency = time.monotonic() - self.__start_time
+        self.__recorded = True
+
+        wait = parse_retry_after(retry_after)
+        if wait:
+            host_state.paused_until = max(host_state.paused_until, time.monotonic() + wait)
+
+        if status_code in THROTTLE_STATUS_CODES or status_code >= 500:
+            host_state.limiter.decrease()
+        elif latency <= host_state.budget.latency_target:
+            host_state.limiter.increase()
+
+
+    def throttle(self, number_of_bytes):
+        """Wait until number_of_bytes more bytes may be read from the host."""
+        if self.__host_state.byte_bucket is not None:
+            self.__host_state.byte_bucket.take(number_of_bytes)
+
+
+    def __exit__(self, exception_type, exception, traceback):
+        # A request that failed before the host answered, e.g. a timeout, is a sign of
+        # congestion too.
+        if exception_type is not None and not self.__recorded:
+            self.__host_state.limiter.decrease()
+
+        self.__host_state.limiter.release()
+
+
+    async def __aenter__(self):
+        # Imported here so that programs without an event loop never load asyncio.
+        import asyncio
+
+        entering = asyncio.get_running_loop().run_in_executor(None, self.__enter__)
+
+        try:
+            await asyncio.shield(entering)
+        except asyncio.CancelledError:
+            # The worker thread still gets the permit after the task was cancelled, so it is
+            # handed straight back once it does.
+            def hand_back(future):
+                if not future.cancelled() and future.exception() is None:
+                    self.__exit__(None, None, None)
+
+            entering.add_done_callback(hand_back)
+            raise
+
+        return self
+
+
+    async def __aexit__(self, exception_type, exception, traceback):
+        import asyncio
+
+        # A cancelled task says nothing about how congested the host is.
+        if exception_type is not None and issubclass(exception_type, asyncio.CancelledError):
+            exception_type = exception = traceback = None
+
+        self.__exit__(exception_type, exception, traceback)
+
+
+    async def throttle_async(self, number_of_bytes):
+        """Awaitable throttle(), for asyncio code. Waits on a worker thread."""
+        if self.__host_state.byte_bucket is not None:
+            import asyncio
+            await asyncio.to_thread(self.__host_state.byte_bucket.take, number_of_bytes)
+
+
+class RateGovernor():
+    """Governs the rate, bandwidth and concurrency of the requests sent to each host."""
+
+    def __init__(self, budgets=None, default_budget=None):
+        """Constructs a RateGovernor object.
+
+        Args:
+            budgets (dict(str, HostBudget), optional): host -> its budget, e.g.
+                                                       {'beatsaver.com': HostBudget(5)}.
+                                                       Defaults to no per host budgets.
+
+            default_budget (HostBudget, optional): The budget of every other host. Defaults to
+                                                   HostBudget(), which only adapts concurrency.
+        """
+        self.__budgets = dict(budgets or {})
+        self.__default_budget = default_budget if default_budget is not None else HostBudget()
+
+        """ host -> _HostState. """
+        self.__host_states = {}
+        self.__lock = Lock()
+
+
+    def __host_state(self, url):
+        """Return the state of url's host, creating it on the host's first request."""
+        host = urlparse(url).netloc
+
+        with self.__lock:
+            if host not in self.__host_states:
+                self.__host_states[host] = \
+                    _HostState(self.__budgets.get(host, self.__default_budget))
+
+            return self.__host_states[host]
+
+
+    def limit(self, url):
+        """Return the RequestPermit that the request to url has to be sent inside of.
+
+        Returns:
+            RequestPermit: A context manager that waits for the host's budget on entry.
+        """
+        return RequestPermit(self.__host_state(url))
+
+
+    def concurrency_limits(self):
+        """Return host -> the current adaptive limit on its open requests."""
+        with self.__lock:
+            return {host: int(host_state.limiter.limit)
+                    for host, host_state in self.__host_states.items()}
@@ -0,0 +1,204 @@
+"""
+@author Eric Zair
+@file response_cache.py
+
+Contains the CachedPage object and the response caches that SongScraper keeps the
+listing and search pages it fetches in.
+
+Every cache has the same two methods, get(url) and set(url, cached_page), so any object
+with those methods can be plugged into a SongScraper. A cached page that has expired is
+still returned by get(), so that its ETag and Last-Modified headers can be used to
+revalidate it with the site instead of fetching and parsing the whole page again.
+"""
+
+# Handling the memory and disk tiers.
+from collections import OrderedDict
+from threading import Lock
+import hashlib
+import json
+import time
+import uuid
+
+# Handling file system navigation and paths.
+from os.path import join, exists
+from os import makedirs, replace, remove
+
+
+""" Seconds that each type of page stays fresh. 'new' changes all of the time, while the
+    longer time periods of 'top' and 'most-difficult' barely change in a day. 'keys' is for
+    looking songs up by their key with the beatsaver API. """
+DEFAULT_PAGE_TTLS = {'new': 5 * 60,
+                     'search': 15 * 60,
+                     '24-hours': 30 * 60,
+                     '7-days': 60 * 60,
+                     '30-days': 3 * 60 * 60,
+                     '3-months': 6 * 60 * 60,
+                     'all': 6 * 60 * 60,
+                     'keys': 6 * 60 * 60}
+
+
+class CachedPage():
+    """A page fetched from the site, along with what is needed to revalidate it."""
+
+    def __init__(self, url, body, etag=None, last_modified=None, expires_at=0.0):
+        """Constructs a CachedPage object.
+
+        Args:
+            url (str): The url that the page was fetched from.
+
+            body (str): The html of the page.
+
+            etag (str, optional): The page's ETag header. Defaults to None.
+
+            last_modified (str, optional): The page's Last-Modified header. Defaults to None.
+
+            expires_at (float, optional): Unix time after which the page has to be revalidated.
+                                          Defaults to 0.0.
+        """
+        self.url = url
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires_at = expires_at
+
+        """ Songs parsed out of the body, so a fresh or revalidated page is never parsed twice.
+            Only kept in memory. """
+        self.parsed = {}
+
+
+    def is_fresh(self):
+        """Return True if the page can be used without revalidating it."""
+        return time.time() < self.expires_at
+
+
+    def to_dict(self):
+        """Return the page as a dict that can be written as JSON."""
+        return {'url': self.url, 'body': self.body, 'etag': self.etag,
+                'last_modified': self.last_modified, 'expires_at': self.expires_at}
+
+
+    @staticmethod
+    def from_dict(page_dict):
+        """Return the CachedPage written out by to_dict()."""
+        return CachedPage(page_dict['url'], page_dict['body'], page_dict.get('etag'),
+                          page_dict.get('last_modified'), page_dict.get('expires_at', 0.0))
+
+
+class MemoryResponseCache():
+    """Least recently used cache of pages held in memory."""
+
+    def __init__(self, max_pages=64):
+        """Constructs a MemoryResponseCache object.
+
+        Args:
+            max_pages (int, optional): The max number of pages kept before the least recently
+                                       used one is dropped. Defaults to 64.
+        """
+        self.__max_pages = max_pages
+        self.__pages = OrderedDict()
+        self.__lock = Lock()
+
+
+    def get(self, url):
+        """Return the cached page for url, None if it is not cached."""
+        with self.__lock:
+            cached_page = self.__pages.get(url)
+
+            if cached_page is not None:
+                self.__pages.move_to_end(url)
+
+            return cached_page
+
+
+    def set(self, url, cached_page):
+        """Cache cached_page for url, dropping the least recently used page if the cache is full."""
+        with self.__lock:
+            self.__pages[url] = cached_page
+            self.__pages.move_to_end(url)
+
+            while len(self.__pages) > self.__max_pages:
+                self.__pages.popitem(last=False)
+
+
+class DiskResponseCache():
+    """Cache of pages written as JSON files to a folder, so they last between runs."""
+
+    def __init__(self, path_to_cache_folder):
+        """Constructs a DiskResponseCache object.
+
+        Args:
+            path_to_cache_folder (str): The folder that pages are written to. It is created
+                                        if it does not exist.
+        """
+        self.__path_to_cache_folder = path_to_cache_folder
+        makedirs(path_to_cache_folder, exist_ok=True)
+
+
+    def __path_for_url(self, url):
+        """Return the file that url's page is written to."""
+        return join(self.__path_to_cache_folder, hashlib.sha1(url.encode()).hexdigest() + '.json')
+
+
+    def get(self, url):
+        """Return the cached page for url, None if it is not cached or can't be read."""
+        path_to_page = self.__path_for_url(url)
+
+        if not exists(path_to_page):
+            return None
+
+        try:
+            with open(path_to_page, 'r', encoding='utf-8') as page_file:
+                return CachedPage.from_dict(json.load(page_file))
+        except (OSError, ValueError, KeyError):
+            return None
+
+
+    def set(self, url, cached_page):
+        """Write cached_page for url, replacing the old file in one step."""
+        path_to_page = self.__path_for_url(url)
+        # Each write gets its own temp file, so threads writing the same url never collide.
+        temp_path = f'{path_to_page}.{uuid.uuid4().hex}.tmp'
+
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as page_file:
+                json.dump(cached_page.to_dict(), page_file)
+
+            replace(temp_path, path_to_page)
+        except BaseException:
+            if exists(temp_path):
+                remove(temp_path)
+            raise
+
+
+class TieredResponseCache():
+    """A memory cache in front of a disk cache. Pages found on disk are promoted to memory."""
+
+    def __init__(self, memory_cache, disk_cache):
+        """Constructs a TieredResponseCache object.
+
+        Args:
+            memory_cache (MemoryResponseCache): The fast tier that is checked first.
+
+            disk_cache (DiskResponseCache): The tier that lasts between runs.
+        """
+        self.__memory_cache = memory_cache
+        self.__disk_cache = disk_cache
+
+
+    def get(self, url):
+        """Return the cached page for url from the first tier that has it, None otherwise."""
+        cached_page = self.__memory_cache.get(url)
+
+        if cached_page is None:
+            cached_page = self.__disk_cache.get(url)
+
+            if cached_page is not None:
+                self.__memory_cache.set(url, cached_page)
+
+        return cached_page
+
+
+    def set(self, url, cached_page):
+        """Cache cached_page for url in both tiers."""
+        self.__memory_cache.set(url, cached_page)
+        self.__disk_cache.set(url, cached_page)
@@ -8,20 +8,141 @@ SongScraper is used for extracting zipfiles of custom songs to the custom_levels
 folder for the vr game, beatsaber.
 
 In addition to this, SongScraper can also scrape songs from the bsaber.com website.
+
+Everything that only touches the custom_levels folder lives in SongLibrary. The http stack
+(requests), the html parser and the downloader are only imported once a method that needs
+them is first called, so importing this module stays cheap.
 """
 
 # Handling webscrapping from bsaber site.
-from bs4 import BeautifulSoup
-import requests
+from collections import deque
+from itertools import count
+import time
+
+# Getting songs from beatsaver's JSON API instead.
+from bsaber.beatsaver_api import BEATSAVER_API_URL, listing_url, search_url, batch_urls, parse_songs
+
+# Extracting songs and keeping track of the installed ones.
+from bsaber.library import SongLibrary
+
+# Handling the songs that are scraped and downloaded.
+from bsaber.song import Song, SongCollection, as_song_collection
+
+# Caching the listing and search pages.
+from bsaber.response_cache import CachedPage, MemoryResponseCache, DEFAULT_PAGE_TTLS
+
+# Reporting the timing of each step of a run.
+from bsaber.events import EventEmitter
+
+# Keeping each host's request rate, bandwidth and concurrency in check.
+from bsaber.rate_governor import RateGovernor
+
+
+""" Website that songs are scraped from. """
+BSABER_SITE = 'https://www.bsaber.com/'
+
+""" A song is downloaded from this url followed by its beatsaver key. """
+BEATSAVER_DOWNLOAD_URL = 'https://beatsaver.com/api/download/key/'
+
+""" Where song listings and searches can come from: the pages of bsaber.com, or beatsaver's API. """
+METADATA_BACKENDS = ['html', 'api']
+
+""" Number of local search hits on each page of get_searched_for_song_results(). """
+LOCAL_SEARCH_PAGE_SIZE = 20
+
+""" Most local search hits that are paged through before the site is searched. """
+MAX_LOCAL_SEARCH_HITS = 200
+
+""" These are the options that we can query songs by. """
+SORTED_BY_OPTIONS = ['new', 'top', 'most-difficult']
+
+""" The time periods that we can query songs to grab by. """
+TIME_PERIOD_OPTIONS = ['24-hours', '7-days', '30-days', '3-months', 'all']
+
+
+def listing_page_url(bsaber_site, sorted_by, time_period, page):
+    """Return the url of the given page of bsaber.com's songs sorted by sorted_by from
+    time_period.
+    """
+    # Alright, now that we know that the queries are valid,
+    # we need to construct the proper URL to the webpage that
+    # the songs we want to query are on.
+    url_to_songs = bsaber_site + "songs/" + sorted_by
+
+    # Every page after the first one lives under /page/<page number>/.
+    if page > 1:
+        url_to_songs += f'/page/{page}'
+
+    # If we are querying for a new song, then no time period
+    # is assigned in the url. Only add a time period to the URL
+    # if the song is not queried for new.
+    if sorted_by != 'new':
+        url_to_songs += '/?time=' + time_period
+
+    return url_to_songs
+
+
+def search_page_url(bsaber_site, song, page):
+    """Return the url of the given page of bsaber.com's search results for song."""
+    # A search for the song "this is an example " would construct the link:
+    # https://bsaber.com/?s=this+is+an+example&orderby=relevance&order=DESC&
+    return bsaber_site + (f"page/{page}/" if page > 1 else "") + \
+        "?s=" + song.replace(' ', '+') + '&'
+
+
+def song_download_link(record, beatsaver_download_url):
+    """Return the link that the song of record is downloaded from: the direct link that the
+    beatsaver API gave for it, or beatsaver_download_url followed by the song's key when
+    record came from a page of bsaber.com or the API gave no link.
+    """
+    return getattr(record, 'download_url', None) or beatsaver_download_url + record.key
+
+
+def unseen_records(records, seen_keys):
+    """Return the records of a page of songs whose key is not in seen_keys, in page order and
+    once each. seen_keys is left as it is.
+
+    Args:
+        records (list(ListingRecord or SongRecord)): The songs on a page.
+
+        seen_keys (set(str)): The keys of the songs that were already yielded by a crawl.
+
+    Returns:
+        list(ListingRecord or SongRecord): The songs that the crawl has not yielded yet.
+    """
+    keys_on_page = set()
+    new_records = []
+
+    for record in records:
+        if record.key not in seen_keys and record.key not in keys_on_page:
+            keys_on_page.add(record.key)
+            new_records.append(record)
+
+    return new_records
+
+
+def page_of_search_hits(search_hits, page):
+    """Return the local search hits on the given page of a search. The local hits come first,
+    LOCAL_SEARCH_PAGE_SIZE to a page, and the site's search results come after them.
+
+    Args:
+        search_hits (list(SearchHit)): Every local hit of the search, best first.
 
-# Parsing html data for finding the correct beatsaber songs.
-import re
+        page (int): The page of the search, starting at 1.
 
-# Handling file system navigation and paths.
-from os.path import join, exists
-from os import mkdir, listdir
-import zipfile
-import shutil
+    Returns:
+        (list(SearchHit), int): The hits on the page, and the page of the site's search
+                                results that takes its place once the hits have run out.
+                                The list is empty when the site's page should be used.
+    """
+    number_of_local_pages = -(-len(search_hits) // LOCAL_SEARCH_PAGE_SIZE)
+
+    if page <= number_of_local_pages:
+        first_hit = (page - 1) * LOCAL_SEARCH_PAGE_SIZE
+        return search_hits[first_hit: first_hit + LOCAL_SEARCH_PAGE_SIZE], page
+
+    # The remote pages are numbered from 1 again, after the local ones.
+    return [], page - number_of_local_pages
 
 
 class SongScraper():
@@ -29,26 +150,218 @@ class SongScraper():
     downloading/extracting them to the proper location.
     """
 
-    def __init__(self, path_to_custom_levels_folder):
+    def __init__(self, path_to_custom_levels_folder, path_to_song_index=None,
+                 response_cache=None, page_ttls=None, path_to_blob_store=None,
+                 bsaber_site=BSABER_SITE, beatsaver_download_url=BEATSAVER_DOWNLOAD_URL,
+                 metadata_backend='html', beatsaver_api_url=BEATSAVER_API_URL,
+                 rate_governor=None, path_to_search_index=None):
         """ Constructs a SongScraper object.
 
         Args:
             path_to_custom_levels_folder (str): The location of the custom_levels/
                                                 folder in your beatsaber game.
-        """
 
-        """ Location that custom songs are going to be saved at. """
-        self.__path_to_custom_levels = path_to_custom_levels_folder
+            path_to_song_index (str, optional): The location of the index of installed songs.
+                                                Defaults to bsaber_index.sqlite3 inside of the
+                                                custom_levels/ folder.
+
+            response_cache (object, optional): Any cache with get(url) and set(url, page)
+                                               methods that listing and search pages are kept
+                                               in. Defaults to a MemoryResponseCache.
+
+            page_ttls (dict(str, int), optional): Seconds that each type of page stays fresh,
+                                                  keyed by 'new', 'search' or a time period.
+                                                  Defaults to DEFAULT_PAGE_TTLS.
+
+            path_to_blob_store (str, optional): If given, each song's files are stored once in a
+                                                BlobStore at this path and hard linked into the
+                                                song folders, and zipfiles are removed once they
+                                                are extracted. Defaults to None.
+
+            bsaber_site (str, optional): The site that songs are scraped from, ending in '/'.
+                                         Defaults to BSABER_SITE.
+
+            beatsaver_download_url (str, optional): The prefix that a song's key is added to
+                                                    to download it. Defaults to
+                                                    BEATSAVER_DOWNLOAD_URL.
+
+            metadata_backend (str, optional): 'api' to get song listings and searches from
+                                              beatsaver's JSON API, falling back to the pages
+                                              of bsaber.com when the API can not answer.
+                                              'html' to only use the pages of bsaber.com.
+                                              Defaults to 'html'.
+
+            beatsaver_api_url (str, optional): Root of beatsaver's JSON API, ending in '/'.
+                                               Defaults to BEATSAVER_API_URL.
+
+            rate_governor (RateGovernor, optional): Governs the rate, bandwidth and concurrency
+                                                    of the requests sent to each host, e.g. to
+                                                    give listing pages and song downloads their
+                                                    own budgets. Defaults to a RateGovernor
+                                                    that only adapts concurrency.
+
+            path_to_search_index (str, optional): The location of the search index of the
+                                                  installed and already seen songs. Defaults to
+                                                  bsaber_search.sqlite3 inside of the
+                                                  custom_levels/ folder.
+
+        Raises:
+            ValueError: If metadata_backend is not a member of METADATA_BACKENDS.
+        """
+        if metadata_backend not in METADATA_BACKENDS:
+            raise ValueError(f"Error: metadata_backend must be one of {METADATA_BACKENDS}.")
 
         """ These are the options that we can query songs by. """
-        self.__sorted_by_options = ['new', 'top', 'most-difficult']
+        self.__sorted_by_options = list(SORTED_BY_OPTIONS)
 
         """ The time periods that we can query songs to grab by. """
-        self.__time_period_options = \
-            ['24-hours', '7-days', '30-days', '3-months', 'all']
+        self.__time_period_options = list(TIME_PERIOD_OPTIONS)
 
         """ Website that we are parsing from. """
-        self.__bsaber_site = 'https://www.bsaber.com/'
+        self.__bsaber_site = bsaber_site
+
+        """ Where songs are downloaded from. The song's key is added to the end. """
+        self.__beatsaver_download_url = beatsaver_download_url
+
+        """ Where song listings and searches come from, and the API they come from if it is 'api'. """
+        self.__metadata_backend = metadata_backend
+        self.__beatsaver_api_url = beatsaver_api_url
+
+        """ Pooled keep-alive session shared by every request. Built on first use. """
+        self.__session = None
+
+        """ Cache of the listing and search pages, and how long each type of page stays fresh. """
+        self.__response_cache = response_cache if response_cache is not None \
+            else MemoryResponseCache()
+        self.__page_ttls = dict(DEFAULT_PAGE_TTLS, **(page_ttls or {}))
+
+        """ Hands the events of each run to whoever subscribed to them. """
+        self.__events = EventEmitter()
+
+        """ The custom_levels folder that songs are extracted to, its index and blob store. """
+        self.__library = SongLibrary(path_to_custom_levels_folder, path_to_song_index,
+                                     path_to_blob_store, events=self.__events,
+                                     path_to_search_index=path_to_search_index)
+
+        """ Keeps every request inside of its host's budget. """
+        self.__rate_governor = rate_governor if rate_governor is not None else RateGovernor()
+
+        """ (query, its local search hits) of the last search that was paged through. """
+        self.__last_local_search = None
+
+
+    def subscribe(self, listener, event_names=None):
+        """Call listener with each Event the scraper emits that is named in event_names.
+        See bsaber.events for the events and their fields.
+
+        Args:
+            listener (function(Event)): Called with each event, e.g. a MetricsCollector. It may
+                                        be called from worker threads, so it has to be thread
+                                        safe.
+
+            event_names (list(str), optional): The events to listen to. Defaults to every event.
+        """
+        self.__events.subscribe(listener, event_names)
+
+
+    def __get_session(self):
+        """Return the pooled session that all of the scraper's requests are sent with."""
+        if self.__session is None:
+            # Imported here so that requests is only loaded once the network is used.
+            from bsaber.session import build_session
+            self.__session = build_session()
+
+        return self.__session
+
+
+    def library(self):
+        """Return the custom_levels folder that the scraper installs songs into.
+
+        Returns:
+            SongLibrary: The scraper's song library.
+        """
+        return self.__library
+
+
+    def song_index(self):
+        """Return the index of the songs that are installed in the custom_levels folder.
+
+        Returns:
+            SongIndex: The index of installed songs.
+        """
+        return self.__library.song_index()
+
+
+    def search_local(self, query, limit=20, installed_only=False):
+        """Return the installed songs and the songs already seen on a listing, search or API
+        answer that best match query, best first. Nothing is fetched.
+
+        Args:
+            query (str): What to search for. Titles, artists and mappers are searched, and
+                         small typos are forgiven.
+
+            limit (int, optional): The most songs that are returned. Defaults to 20.
+
+            installed_only (bool, optional): True to only return installed songs.
+                                             Defaults to False.
+
+        Returns:
+            list(SearchHit): The songs that matched, an empty list on a miss.
+        """
+        return self.__library.search(query, limit=limit, installed_only=installed_only)
+
+
+    def __remember_songs(self, songs):
+        """Add the songs seen on a listing, search or API answer to the local search index."""
+        self.__library.search_index().add_records(songs)
+        return songs
+
+
+    def rebuild_song_index(self):
+        """Repopulate the index of installed songs from the custom_levels folder.
+
+        Returns:
+            int: The number of songs in the index after it was rebuilt.
+        """
+        return self.__library.rebuild_song_index()
+
+
+    def garbage_collect_blob_store(self):
+        """Remove the stored song files that no song folder uses anymore.
+
+        Returns:
+            (int, int): The number of files removed and the number of bytes freed.
+
+        Raises:
+            ValueError: If the scraper was not given a path_to_blob_store.
+        """
+        return self.__library.garbage_collect_blob_store()
+
+
+    def __split_installed_songs(self, songs, skip_installed):
+        """Helper method for download_songs() and download_extract_songs().
+        Split songs into a SongCollection of the songs that still need to be downloaded and a
+        skipped DownloadResult for each song that the index says is already installed.
+        """
+        from bsaber.downloader import DownloadResult
+        songs = as_song_collection(songs)
+
+        if not skip_installed:
+            return songs, []
+
+        song_index = self.song_index()
+        songs_to_download = SongCollection()
+        skipped_results = []
+
+        for song in songs:
+            if song.key in song_index:
+                result = DownloadResult(song.title, song.download_link, None)
+                result.success = result.skipped = True
+                skipped_results.append(result)
+            else:
+                songs_to_download.add(song)
+
+        return songs_to_download, skipped_results
 
 
     def sorted_by_options(self):
@@ -60,6 +373,31 @@ class SongScraper():
         return self.__sorted_by_options
 
 
+    def download_link_for_key(self, key):
+        """Return the link that the song with the given beatsaver key is downloaded from.
+
+        Args:
+            key (str): The song's beatsaver key.
+
+        Returns:
+            str: The song's download link.
+        """
+        return self.__beatsaver_download_url + key
+
+
+    def download_link_for_record(self, record):
+        """Return the link that the song of a ListingRecord or SongRecord is downloaded from.
+
+        Args:
+            record (ListingRecord or SongRecord): The song.
+
+        Returns:
+            str: The direct link that the beatsaver API gave for the song, or the link for
+                 its key when there is none.
+        """
+        return song_download_link(record, self.__beatsaver_download_url)
+
+
     def time_period_options(self):
         """Return all possible time periods that the user can scrape songs with.
 
@@ -103,51 +441,77 @@ class SongScraper():
                              f"{self.__time_period_options}")
 
 
-    def __extract_song_in_custom_levels_folder(self, path_to_song_zipfile,
-                                               display_error_message=True):
-        """Helper method for self.extract_all_songs_in_custom_levels_folder().
-
-        Builds a new folder for a custom song and extracts the zipfile's content
-        into that new folder.
-        """
-        # Make a new temp folder to store the zip file into.
-        song_folder = path_to_song_zipfile.split('.zip')[0] + path_to_song_zipfile.split('.zip')[1]
-
-        # Don't want to create a folder that already exists.
-        if not exists(song_folder):
-            mkdir(join(self.__path_to_custom_levels, song_folder))
-
-            try:
-                with zipfile.ZipFile(path_to_song_zipfile, 'r') as zipfile_to_extract:
-                    zipfile_to_extract.extractall(song_folder)
-            except Exception as e:
-                if display_error_message:
-                    print(e)
-
-                # Program gets stalled for input if we do not pause here.
-                pass
-
-
-    def extract_all_songs_in_custom_levels_folder(self, display_error_message=True):
+    def extract_all_songs_in_custom_levels_folder(self, display_error_message=True,
+                                                  max_workers=1):
         """Extract each custom song's zipfile into a new folder located
         in the custom_levels/ folder in the beatsaber game.
 
         Args:
             display_error_message (bool, optional): If the user wants to see the potential.
             errors that are thrown. Defaults to True.
-        """
-        all_files_in_custom_level_folder = listdir(self.__path_to_custom_levels)
 
-        list_of_zipfiles = [file for file in all_files_in_custom_level_folder
-                            if file.endswith('.zip')]
+            max_workers (int, optional): The number of worker processes that extract songs in
+                                         parallel. Defaults to 1.
+
+        Returns:
+            ExtractionSummary: The timing and outcome of each zipfile's extraction.
+        """
+        return self.__library.extract_all_songs_in_custom_levels_folder(
+            display_error_message=display_error_message, max_workers=max_workers)
 
-        for zip_file in list_of_zipfiles:
-            self.__extract_song_in_custom_levels_folder(join(self.__path_to_custom_levels, zip_file))
 
+    def __fetch_page(self, url_to_songs, page_ttl):
+        """Helper method for __find_songs_given_url().
+        Return the cached page for url_to_songs, only going to the site if the cached page has
+        expired. An expired page is revalidated with its ETag/Last-Modified headers, so an
+        unchanged page only costs a 304.
 
-    def __find_songs_given_url(self, url_to_songs, number_of_songs=21, custom_song_search=False):
-        """Given the url to songs we want to scrape, we return a dict containing each song's name
-           and download link.
+        Raises:
+            requests.exceptions.HTTPError: If the page could not be fetched.
+        """
+        cached_page = self.__response_cache.get(url_to_songs)
+
+        if cached_page is not None and cached_page.is_fresh():
+            self.__events.emit('page_fetched', url=url_to_songs, status_code=200, from_cache=True,
+                               duration=0.0, bytes=len(cached_page.body))
+            return cached_page
+
+        headers = {}
+
+        if cached_page is not None:
+            if cached_page.etag is not None:
+                headers['If-None-Match'] = cached_page.etag
+            if cached_page.last_modified is not None:
+                headers['If-Modified-Since'] = cached_page.last_modified
+
+        with self.__rate_governor.limit(url_to_songs) as permit:
+            start_time = time.perf_counter()
+            request = self.__get_session().get(url_to_songs, headers=headers)
+            permit.record(request.status_code, request.headers.get('Retry-After'))
+            permit.throttle(len(request.content))
+
+        self.__events.emit('page_fetched', url=url_to_songs, status_code=request.status_code,
+                           from_cache=request.status_code == 304,
+                           duration=time.perf_counter() - start_time, bytes=len(request.content))
+
+        if request.status_code == 304 and cached_page is not None:
+            cached_page.expires_at = time.time() + page_ttl
+        elif request.status_code == 200:
+            cached_page = CachedPage(url_to_songs, request.text,
+                                     etag=request.headers.get('ETag'),
+                                     last_modified=request.headers.get('Last-Modified'),
+                                     expires_at=time.time() + page_ttl)
+        else:
+            from requests.exceptions import HTTPError
+            raise HTTPError('Error in scrape_songs(), unable to access file.')
+
+        self.__response_cache.set(url_to_songs, cached_page)
+        return cached_page
+
+
+    def __find_songs_given_url(self, url_to_songs, number_of_songs=21, custom_song_search=False,
+                               page_ttl=0):
+        """Given the url to songs we want to scrape, we return the songs on the page.
 
         Args:
             url_to_songs (str): The url that the songs we wish to scrape are located at.
@@ -157,50 +521,121 @@ class SongScraper():
             custom_song_search (bool, optional): True if we are doing a custom song search,
                                                  False otherwise. Defaults to False.
 
+            page_ttl (int, optional): Seconds that the fetched page stays fresh in the response
+                                      cache. Defaults to 0.
+
 
         Returns:
-            dict(str, str): dict with each entry representing a song.
-            <song_name> -> <song_download_link>.
+            SongCollection: The songs on the page, in the order that they are on the page.
         """
-        request = requests.get(url_to_songs)
-
-        if request.status_code != 200:
-            raise requests.exceptions.HttpError('Error in scrape_songs(), unable to access file.')
+        cached_page = self.__fetch_page(url_to_songs, page_ttl)
 
-        soup = BeautifulSoup(request.text, features='html.parser')
+        # A page that is still fresh, or came back as a 304, was already parsed.
+        parse_options = (number_of_songs, custom_song_search)
+        if parse_options in cached_page.parsed:
+            return SongCollection(cached_page.parsed[parse_options])
 
         # If a custom song search is preformed then we need to cut the first song that is scraped out
         # of the list because when we query to get all of the songs on the page, the custom search
         # itself is added as the first member of the list.
-        starting_index_for_song_tags = 1 if custom_song_search else 0
+        number_of_cards_to_skip = 1 if custom_song_search else 0
+
+        # Imported here so that the html parser is only loaded once a page is scraped.
+        from bsaber.listing_parser import parse_listing
+        start_time = time.perf_counter()
+
+        # Only the song cards are read off of the page, and we only want the amount of
+        # songs that the user requests :)
+        songs = self.__song_collection_of_records(
+            parse_listing(cached_page.body, number_of_songs=number_of_songs,
+                          skip=number_of_cards_to_skip))
+
+        self.__events.emit('page_parsed', url=url_to_songs, duration=time.perf_counter() - start_time,
+                           songs=len(songs))
+
+        cached_page.parsed[parse_options] = SongCollection(songs)
+        return songs
+
+
+    def __fetch_song_records(self, url_to_songs, page_ttl):
+        """Helper method for the 'api' metadata backend.
+        Return the SongRecords in the API's answer at url_to_songs.
+
+        Raises:
+            requests.exceptions.RequestException: If the answer could not be fetched.
+            ValueError: If the answer is not JSON from the API.
+        """
+        cached_page = self.__fetch_page(url_to_songs, page_ttl)
+
+        if 'api' not in cached_page.parsed:
+            start_time = time.perf_counter()
+            cached_page.parsed['api'] = parse_songs(cached_page.body)
+            self.__events.emit('page_parsed', url=url_to_songs,
+                               duration=time.perf_counter() - start_time,
+                               songs=len(cached_page.parsed['api']))
+
+        return cached_page.parsed['api']
+
 
-        # The song title and song name for each song is contained in a h4 tag.
-        # Also, we only want the amount of songs that the user requests :)
-        song_tags = soup.find_all(re.compile('h4$'))[starting_index_for_song_tags: number_of_songs]
+    def __fetch_song_records_or_none(self, url_to_songs, page_ttl):
+        """Helper method for the 'api' metadata backend.
+        Return the SongRecords in the API's answer at url_to_songs, None if the scraper does not
+        use the API, url_to_songs is None, or the API could not answer. None means that the
+        pages of bsaber.com should be scraped instead.
+        """
+        if self.__metadata_backend != 'api' or url_to_songs is None:
+            return None
+
+        from requests.exceptions import RequestException
 
-        # This will be a dict of <song_title, song_download_link>.
-        # It will be the object that we return at the end of this method.
-        dict_of_songs = {}
+        try:
+            return self.__fetch_song_records(url_to_songs, page_ttl)
+        except (RequestException, ValueError):
+            return None
 
-        for bs4_song_tag in song_tags:
-            # Okay, now let's find song title.
-            song_tag_as_str = str(bs4_song_tag)
-            html_tags = song_tag_as_str.split('\n')
-            song_title = html_tags[2].strip(' </a>')
-            ahref_tag = html_tags[1]
 
-            # The song's link is always <a href="https://bsaber.com/songs/' + the primary
-            # key of the song. The primary key can be found at the end of the link that goes to
-            # the song's webpage.
-            song_primary_key = ahref_tag.replace('<a href="https://bsaber.com/songs/', "")[: 4]
-            song_link = 'https://beatsaver.com/api/download/key/' + song_primary_key
+    def __song_collection_of_records(self, records):
+        """Return the SongCollection of the ListingRecords or SongRecords in records.
+        Songs from the API are downloaded from the link that it gave for them, and every
+        other song through beatsaver_download_url.
+        """
+        return SongCollection(Song.from_record(record, self.download_link_for_record(record))
+                              for record in records)
 
-            dict_of_songs[song_title] = song_link
 
-        return dict_of_songs
+    def get_songs_by_keys(self, keys):
+        """Look up the songs with the given beatsaver keys with the beatsaver API.
+        Up to MAX_KEYS_PER_BATCH keys are looked up with a single request.
+
+        Args:
+            keys (list(str)): The keys of the songs to look up.
 
+        Returns:
+            dict(str, SongRecord): key -> the song with that key. Keys that do not belong to a
+                                   song are left out.
+
+        Raises:
+            requests.exceptions.RequestException: If the API could not be reached.
+            ValueError: If the API's answer could not be read.
+        """
+        songs_by_key = {}
+
+        for url_to_songs in batch_urls(self.__beatsaver_api_url, dict.fromkeys(keys)):
+            for song_record in self.__fetch_song_records(url_to_songs, self.__page_ttls['keys']):
+                songs_by_key[song_record.key] = song_record
+
+        self.__remember_songs(songs_by_key.values())
+        return songs_by_key
+
+
+    def __page_ttl(self, sorted_by, time_period):
+        """Return the seconds that a page of songs sorted by sorted_by from time_period stays
+        fresh. 'new' pages go stale much faster than the other sorting options.
+        """
+        return self.__page_ttls['new' if sorted_by == 'new' else time_period]
 
-    def get_song_results(self, sorted_by='new', time_period='all'):
+
+    def get_song_results(self, sorted_by='new', time_period='all', page=1):
         """Return a dict of songs based on the given sorted_by and time_period fields given.
 
         Args:
@@ -212,93 +647,498 @@ class SongScraper():
                                          Options: ['24-hours', '7-days', '30-days', '3-months', 'all']
                                         Defaults to 'all'.
 
+            page (int, optional): The page of songs to return, starting at 1. Defaults to 1.
+
         Returns:
-            dict(str, str): dict with each entry representing a song.
-            <song_name> -> <song_download_link>.
+            SongCollection: The songs on the page. Use to_dict() for the old
+                            <song_name> -> <song_download_link> form.
         """
         # Let's make sure that we are querying by valid options.
         self.__check_valid_sorted_by_option(sorted_by)
         self.__check_valid_time_period(time_period)
 
-        # Alright, now that we know that the queries are valid,
-        # we need to construct the proper URL to the webpage that
-        # the songs we want to query are on.
-        url_to_songs = self.__bsaber_site + "songs/" + sorted_by
+        page_ttl = self.__page_ttl(sorted_by, time_period)
+        song_records = self.__fetch_song_records_or_none(
+            listing_url(self.__beatsaver_api_url, sorted_by, time_period, page), page_ttl)
 
-        # If we are querying for a new song, then no time period
-        # is assigned in the url. Only add a time period to the URL
-        # if the song is not queried for new.
-        if sorted_by != 'new':
-            url_to_songs += '/?time=' + time_period
+        if song_records is not None:
+            return self.__remember_songs(self.__song_collection_of_records(song_records))
 
         # We create a dict of song_names mapped to the download link of the
         # song so that displaying the song and downloading them is an easier
         # task.
-        return self.__find_songs_given_url(url_to_songs)
+        url_to_songs = listing_page_url(self.__bsaber_site, sorted_by, time_period, page)
+        return self.__remember_songs(self.__find_songs_given_url(url_to_songs, page_ttl=page_ttl))
+
+
+    def __fetch_listing_records(self, sorted_by, time_period, page, page_ttl):
+        """Helper method for crawl_songs().
+        Return every song on the given page of songs sorted by sorted_by from time_period, as
+        SongRecords when they come from the API and as ListingRecords otherwise.
+        """
+        song_records = self.__fetch_song_records_or_none(
+            listing_url(self.__beatsaver_api_url, sorted_by, time_period, page), page_ttl)
+
+        if song_records is not None:
+            return song_records
+
+        url_to_songs = listing_page_url(self.__bsaber_site, sorted_by, time_period, page)
+        cached_page = self.__fetch_page(url_to_songs, page_ttl)
+
+        from bsaber.listing_parser import parse_listing
+        start_time = time.perf_counter()
+        listing_records = list(parse_listing(cached_page.body))
+        self.__events.emit('page_parsed', url=url_to_songs, duration=time.perf_counter() - start_time,
+                           songs=len(listing_records))
+
+        return listing_records
+
+
+    def crawl_songs(self, sorted_by='new', time_period='all', number_of_songs=None, first_page=1,
+                    last_page=None, max_workers=4):
+        """Yield the songs on many pages of songs based on the given sorted_by and time_period.
+
+        Pages are fetched at the same time over the scraper's shared session, but songs are
+        yielded in page order, as soon as the page that they are on has been fetched. This way
+        songs can start downloading before the crawl is finished. A song that shows up on more
+        than one page is only yielded once, and the crawl ends at the first page that has no
+        song that was not yielded yet.
+
+        Args:
+            sorted_by (str, optional): The type of song you are querying for.
+                                       Options: ['new', 'top', 'most-difficult'].
+                                       Defaults to 'new'.
+
+            time_period (str, optional): The time period that you want to download a song from.
+                                         Options: ['24-hours', '7-days', '30-days', '3-months', 'all']
+                                         Defaults to 'all'.
+
+            number_of_songs (int, optional): Stop once this many songs have been yielded.
+                                             Defaults to None.
+
+            first_page (int, optional): The first page of songs that is crawled. Defaults to 1.
+
+            last_page (int, optional): The last page of songs that is crawled. Defaults to None.
+
+            max_workers (int, optional): The max number of pages fetched at once. Defaults to 4.
+
+        Yields:
+            ListingRecord or SongRecord: The next song that has not been yielded yet. Both have
+                                         a key, title and mapper.
+
+        Raises:
+            ValueError: If neither number_of_songs nor last_page is given.
+        """
+        self.__check_valid_sorted_by_option(sorted_by)
+        self.__check_valid_time_period(time_period)
+
+        if number_of_songs is None and last_page is None:
+            raise ValueError("Error: number_of_songs or last_page must be given.")
+
+        # Imported here so that the thread pool is only loaded once the network is used.
+        from concurrent.futures import ThreadPoolExecutor
+
+        page_ttl = self.__page_ttl(sorted_by, time_period)
+        pages = count(first_page) if last_page is None else iter(range(first_page, last_page + 1))
+        pending_pages = deque()
+        seen_keys = set()
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            try:
+                while True:
+                    self.__schedule_pages(executor, pending_pages, pages, max_workers, sorted_by,
+                                          time_period, page_ttl)
+
+                    if not pending_pages:
+                        return
+
+                    page, pending_page = pending_pages.popleft()
+                    records = self.__records_or_end_of_listing(page == first_page, pending_page)
+
+                    # An empty page, or a page that could not be fetched, is past the last one.
+                    if not records:
+                        return
+
+                    self.__remember_songs(records)
+                    new_records = unseen_records(records, seen_keys)
+
+                    # A page without a new song is past the last one too, since some sites
+                    # answer every page after the last with the same songs.
+                    if not new_records:
+                        return
+
+                    for record in new_records:
+                        seen_keys.add(record.key)
+                        yield record
+
+                        if number_of_songs is not None and len(seen_keys) >= number_of_songs:
+                            return
+            finally:
+                # The pages that have not started are dropped, and leaving the with block
+                # waits for the ones that did, so no fetch outlives the generator.
+                for _, pending_page in pending_pages:
+                    pending_page.cancel()
+
+
+    def __schedule_pages(self, executor, pending_pages, pages, max_workers, sorted_by,
+                         time_period, page_ttl):
+        """Helper method for crawl_songs().
+        Start fetching the next pages until max_workers pages are in flight ahead of the page
+        being read, or there are no pages left.
+        """
+        while len(pending_pages) < max_workers:
+            page = next(pages, None)
+
+            if page is None:
+                return
 
+            pending_pages.append((page, executor.submit(self.__fetch_listing_records, sorted_by,
+                                                        time_period, page, page_ttl)))
 
-    def get_searched_for_song_results(self, song):
-        """Return a dict containing the songs queried by a specific song that the user wants to find.
+
+    def __records_or_end_of_listing(self, is_first_page, pending_page):
+        """Helper method for crawl_songs().
+        Return the records of the page, or [] if the page could not be fetched because the
+        listing already ended, e.g. the site 404s on the page after the last one.
+
+        Raises:
+            requests.exceptions.RequestException: If the first page of the crawl could not be
+                                                  fetched.
+        """
+        from requests.exceptions import RequestException
+
+        try:
+            return pending_page.result()
+        except RequestException:
+            if is_first_page:
+                raise
+            return []
+
+
+    def get_searched_for_song_results(self, song, page=1, remote=False):
+        """Return the songs queried by a specific song that the user wants to find.
+
+        The first pages are answered by the local search index of the installed and already
+        seen songs, so no request is sent. Once the local hits run out, the pages after them
+        are the site's, or the API's, search results, starting from its first page. So paging
+        forward goes through every local hit and then every remote one.
 
         Args:
             song_user_searched_for (str): The song that the user wants to search for.
 
+            page (int, optional): The page of search results to return, starting at 1.
+                                  Defaults to 1.
+
+            remote (bool, optional): True to skip the local hits and only search the site, so
+                                     page is the site's page. Defaults to False.
+
         Returns:
-            dict(str, str): dict with each entry representing a song.
-            <song_name> -> <song_download_link>.
+            SongCollection: The songs on the page. Use to_dict() for the old
+                            <song_name> -> <song_download_link> form.
         """
-        # A search for the song "this is an example " would construct the link:
-        # https://bsaber.com/?s=this+is+an+example&orderby=relevance&order=DESC&
-        url_to_song = self.__bsaber_site + "/?s=" + song.replace(' ', '+') + '&'
-        return self.__find_songs_given_url(url_to_song, custom_song_search=True)
+        if not remote:
+            # The hits are kept from the query's first page, since the remote pages add songs
+            # to the index that would otherwise shift the pages that come after.
+            if page == 1 or self.__last_local_search is None or \
+                    self.__last_local_search[0] != song:
+                self.__last_local_search = \
+                    song, self.search_local(song, limit=MAX_LOCAL_SEARCH_HITS)
+
+            search_hits, page = page_of_search_hits(self.__last_local_search[1], page)
+
+            if search_hits:
+                return SongCollection(Song(hit.key, hit.title, self.download_link_for_key(hit.key),
+                                           mapper=hit.mapper)
+                                      for hit in search_hits)
+
+        song_records = self.__fetch_song_records_or_none(
+            search_url(self.__beatsaver_api_url, song, page), self.__page_ttls['search'])
+
+        if song_records is not None:
+            return self.__remember_songs(self.__song_collection_of_records(song_records))
 
+        url_to_song = search_page_url(self.__bsaber_site, song, page)
+        return self.__remember_songs(
+            self.__find_songs_given_url(url_to_song, custom_song_search=True,
+                                        page_ttl=self.__page_ttls['search']))
 
-    def download_songs(self, dict_of_songs, display_error_message=True):
-        """Given a dict_of_songs <song_name> -> <song_download_link>, we download each song to
-        the custom_levels/ beatsaber folder. Each song is a .zip file when downloaded.
+
+    def download_songs(self, songs, display_error_message=True, max_workers=8,
+                       max_per_host=4, skip_installed=True):
+        """Given a collection of songs, we download each song to the custom_levels/ beatsaber
+        folder. Each song is a '<key> (<title>).zip' file when downloaded.
+
+        Songs are downloaded at the same time by a bounded pool of worker threads that all
+        share the scraper's pooled keep-alive session. The songs are not added to the song
+        index, since a song only counts as installed once it is extracted.
 
         Args:
-            dict_of_songs dict(str): A dict containing a collection of songs.
-            <song_name> -> <link to song>.
+            songs (SongCollection): The songs to download. A dict in the old
+                                    <song_name> -> <link to song> form works too.
 
             display_error_message (bool, optional): True if user wants to output an error if it occurs
                                                     , False otherwise. Defaults to True.
+
+            max_workers (int, optional): The max number of songs downloaded at once.
+                                         Defaults to 8.
+
+            max_per_host (int, optional): The max number of downloads open against a single
+                                          host at once. Defaults to 4.
+
+            skip_installed (bool, optional): True if songs whose key is in the song index should
+                                             not be downloaded again. Defaults to True.
+
+        Returns:
+            list(DownloadResult): The outcome of each song's download, in the order of songs.
+                                  The results of the skipped songs come last.
         """
-        for song in dict_of_songs:
-            try:
-                # This user agent header is required so the page does not through a 403
-                # permission denied error.
-                headers = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_10_1) '
-                                         'AppleWebKit/537.36 (KHTML, like Gecko) '
-                                         'Chrome/39.0.2171.95 Safari/537.36'}
+        songs, skipped_results = self.__split_installed_songs(songs, skip_installed)
+        download_results = [None] * len(songs)
+
+        for index, result in self.__download_as_completed(songs, max_workers, max_per_host):
+            download_results[index] = result
 
-                # Alright, lets access the location of where the .zip file we want to download is.
-                # In order to "download" it we need to copy it's file contents to a local file on
-                # our machine.
-                r = requests.get(dict_of_songs[song], stream=True, headers=headers)
+        if display_error_message:
+            for result in download_results:
+                if not result.success:
+                    print(result.error)
 
-                # Here is the local file on our machine that we will copy the .zip file content to.
-                song_save_location = join(self.__path_to_custom_levels, song) + '.zip'
+        return download_results + skipped_results
 
-                with open(song_save_location, 'wb') as download_file:
-                    r.raw.decode_content = True
-                    shutil.copyfileobj(r.raw, download_file)
 
-            # If we get a 404 or or 403 error, we come here.
-            except Exception as e:
-                if display_error_message:
-                    print(e)
+    def __download_as_completed(self, songs, max_workers, max_per_host=4):
+        """Helper method for download_songs() and download_songs_as_completed().
+        Download each song in the SongCollection songs to a .zip in the custom_levels folder,
+        yielding (position of the song in songs, DownloadResult) as each download finishes.
+        Songs are only added to the song index once they are extracted, not here.
+        """
+        # Here are the local files on our machine that we will copy each .zip file's content to.
+        songs_to_download = [(song.title, song.download_link,
+                              self.__library.song_folder(song) + '.zip')
+                             for song in songs]
+
+        from bsaber.downloader import SongDownloader
+        downloader = SongDownloader(self.__get_session(), max_workers=max_workers,
+                                    max_per_host=max_per_host, events=self.__events,
+                                    governor=self.__rate_governor)
+
+        yield from downloader.download_as_completed(songs_to_download)
 
 
-    def download_extract_songs(self, dict_of_songs, display_error_message=True):
-        """Download all songs in the given dict and then extract them in the custom_levels
-        beatsaber folder.
+    def download_songs_as_completed(self, songs, display_error_message=True, max_workers=8,
+                                    max_per_host=4, skip_installed=True):
+        """Same as download_songs(), but each DownloadResult is yielded as soon as its song
+        finishes downloading, so the song can be used before the rest are done. The results
+        of the skipped songs come first. Closing the generator early cancels the downloads
+        that have not started yet.
 
         Args:
-            dict_of_songs dict(str, str): Dict <song_title> -> <song_download_link>
+            songs (SongCollection): The songs to download.
+
+            display_error_message (bool, optional): True if user wants to output an error if it occurs
+                                                    , False otherwise. Defaults to True.
+
+            max_workers (int, optional): The max number of songs downloaded at once.
+                                         Defaults to 8.
+
+            max_per_host (int, optional): The max number of downloads open against a single
+                                          host at once. Defaults to 4.
+
+            skip_installed (bool, optional): True if songs whose key is in the song index should
+                                             not be downloaded again. Defaults to True.
+
+        Yields:
+            DownloadResult: The outcome of the next song that finished downloading.
+        """
+        songs, skipped_results = self.__split_installed_songs(songs, skip_installed)
+        yield from skipped_results
+
+        for _, result in self.__download_as_completed(songs, max_workers, max_per_host):
+            if display_error_message and not result.success:
+                print(result.error)
+
+            yield result
+
+
+    def download_extract_stream(self, songs, display_error_message=True, max_workers=8,
+                                max_pending=4, keep_zipfiles=False, skip_installed=True):
+        """Download and extract each of the given songs, yielding each song's result as soon
+        as it is done. Nothing is collected: songs are read one at a time as there is room to
+        download them, each song is extracted straight from memory, and a fixed number of
+        downloaded songs wait to be extracted. So the memory that a run takes stays the same,
+        however many songs there are, e.g. when mirroring a crawl of thousands of songs:
+
+            songs = scraper.crawl_songs('top', 'all', number_of_songs=5000)
+            for song, result in scraper.download_extract_stream(songs):
+                ...
+
+        Args:
+            songs (iterable(Song or ListingRecord or SongRecord)): The songs to install. Can be
+                                                                   a generator, e.g. of
+                                                                   crawl_songs().
 
             display_error_message (bool, optional): True if user wants to display possible errors,
                                                     False otherwise. Defaults to True.
+
+            max_workers (int, optional): The max number of songs downloaded at once.
+                                         Defaults to 8.
+
+            max_pending (int, optional): The max number of downloaded songs waiting to be
+                                         extracted. Defaults to 4.
+
+            keep_zipfiles (bool, optional): True if each song's .zip should also be saved.
+                                            Defaults to False.
+
+            skip_installed (bool, optional): True if songs whose key is in the song index are
+                                             passed over without a result. Defaults to True.
+
+        Yields:
+            (Song, PipelineResult): The next song that is done, and the outcome of its download
+                                    and extraction.
         """
-        self.download_songs(dict_of_songs, display_error_message=display_error_message)
-        self.extract_all_songs_in_custom_levels_folder(display_error_message=display_error_message)
+        from bsaber.downloader import SongDownloader
+        from bsaber.pipeline import stream_download_extract
+
+        song_index = self.song_index()
+
+        # position -> Song, of only the songs that are in the pipeline right now.
+        songs_in_pipeline = {}
+        positions = count()
+
+        def songs_to_download():
+            for song in songs:
+                if not isinstance(song, Song):
+                    song = Song.from_record(song, self.download_link_for_record(song))
+
+                if skip_installed and song.key in song_index:
+                    continue
+
+                songs_in_pipeline[next(positions)] = song
+                yield song.title, song.download_link, self.__library.song_folder(song)
+
+        downloader = SongDownloader(self.__get_session(), max_workers=max_workers,
+                                    events=self.__events, governor=self.__rate_governor)
+
+        for index, pipeline_result in stream_download_extract(
+                downloader, songs_to_download(), max_workers=max_workers, max_pending=max_pending,
+                keep_zipfiles=keep_zipfiles, path_to_blob_store=self.__library.path_to_blob_store,
+                events=self.__events):
+            song = songs_in_pipeline.pop(index)
+
+            if pipeline_result.success:
+                self.__library.record_installed_song(song, pipeline_result.download_result)
+            elif display_error_message:
+                print(pipeline_result.error)
+
+            yield song, pipeline_result
+
+
+    def download_extract_songs(self, songs, display_error_message=True, pipelined=False,
+                               max_workers=8, max_pending=4, keep_zipfiles=False,
+                               skip_installed=True):
+        """Download all of the given songs and then extract them in the custom_levels
+        beatsaber folder, each to a '<key> (<title>)' folder. Only the given songs are extracted.
+
+        Args:
+            songs (SongCollection): The songs to download. A dict in the old
+                                    <song_title> -> <song_download_link> form works too.
+
+            display_error_message (bool, optional): True if user wants to display possible errors,
+                                                    False otherwise. Defaults to True.
+
+            pipelined (bool, optional): True if each song should be extracted straight from memory
+                                        as soon as its download finishes, False if every song is
+                                        downloaded to a .zip first. Defaults to False.
+
+            max_workers (int, optional): The max number of songs downloaded at once.
+                                         Defaults to 8.
+
+            max_pending (int, optional): Only used when pipelined. The max number of downloaded
+                                         songs waiting to be extracted. Defaults to 4.
+
+            keep_zipfiles (bool, optional): Only used when pipelined. True if each song's .zip
+                                            should also be saved. Defaults to False.
+
+            skip_installed (bool, optional): True if songs whose key is in the song index should
+                                             not be downloaded again. Defaults to True.
+
+        Returns:
+            list(PipelineResult) or ExtractionSummary: The per song results of the pipeline
+                                                       when pipelined, otherwise the summary
+                                                       of the extraction.
+        """
+        if pipelined:
+            return self.__download_extract_pipelined(songs, display_error_message, max_workers,
+                                                     max_pending, keep_zipfiles, skip_installed)
+
+        return self.__download_then_extract(songs, display_error_message, max_workers,
+                                            skip_installed)
+
+
+    def __download_extract_pipelined(self, songs, display_error_message, max_workers,
+                                     max_pending, keep_zipfiles, skip_installed):
+        """Helper method for download_extract_songs().
+        Extract each song straight from memory as soon as its download finishes.
+
+        Returns:
+            list(PipelineResult): The outcome of each song, the skipped songs' come last.
+        """
+        songs, skipped_results = self.__split_installed_songs(songs, skip_installed)
+        songs_to_download = [(song.title, song.download_link, self.__library.song_folder(song))
+                             for song in songs]
+
+        from bsaber.downloader import SongDownloader
+        from bsaber.pipeline import download_extract_pipelined, PipelineResult
+        downloader = SongDownloader(self.__get_session(), max_workers=max_workers,
+                                    events=self.__events, governor=self.__rate_governor)
+        pipeline_results = \
+            download_extract_pipelined(downloader, songs_to_download, max_workers=max_workers,
+                                       max_pending=max_pending, keep_zipfiles=keep_zipfiles,
+                                       path_to_blob_store=self.__library.path_to_blob_store,
+                                       events=self.__events)
+
+        for song, result in zip(songs, pipeline_results):
+            if result.success:
+                self.__library.record_installed_song(song, result.download_result)
+
+        pipeline_results += [PipelineResult(result) for result in skipped_results]
+
+        if display_error_message:
+            for result in pipeline_results:
+                if not result.success:
+                    print(result.error)
+
+        return pipeline_results
+
+
+    def __download_then_extract(self, songs, display_error_message, max_workers, skip_installed):
+        """Helper method for download_extract_songs().
+        Download every song to a .zip first, then extract the zipfiles that were downloaded.
+        Songs are only added to the song index once they are extracted.
+
+        Returns:
+            ExtractionSummary: The outcome of each downloaded song's extraction.
+        """
+        songs, _ = self.__split_installed_songs(songs, skip_installed)
+
+        # .zip -> (Song, DownloadResult), of only the songs we just downloaded, since those
+        # are the only ones that need to be extracted, not the whole folder.
+        downloaded_songs = {}
+
+        for index, result in self.__download_as_completed(songs, max_workers):
+            if result.success:
+                downloaded_songs[result.save_location] = songs[index], result
+            elif display_error_message:
+                print(result.error)
+
+        extraction_summary = \
+            self.__library.extract_song_zipfiles(list(downloaded_songs),
+                                                 display_error_message=display_error_message)
+
+        # A song only counts as installed once it is extracted, so a song whose extraction
+        # failed is downloaded again by the next run.
+        for result in extraction_summary.results:
+            if result.success:
+                self.__library.record_installed_song(*downloaded_songs[result.path_to_song_zipfile])
+
+        return extraction_summary
@@ -0,0 +1,40 @@
+"""
+@author Eric Zair
+@file session.py
+
+Builds the pooled HTTP session that every SongScraper request goes through.
+
+Sharing one keep-alive session means that each song download and page fetch reuses
+an already open TCP/TLS connection instead of creating a new one for every request.
+"""
+
+# Handling http requests.
+import requests
+from requests.adapters import HTTPAdapter
+
+
+""" This user agent header is required so beatsaver does not throw a 403 permission denied error. """
+USER_AGENT = ('Mozilla/5.0 (Macintosh; Intel Mac OS X 10_10_1) '
+              'AppleWebKit/537.36 (KHTML, like Gecko) '
+              'Chrome/39.0.2171.95 Safari/537.36')
+
+
+def build_session(pool_size=10):
+    """Return a requests session with keep-alive connection pools big enough to be shared
+    by pool_size worker threads at once.
+
+    Args:
+        pool_size (int, optional): The max number of connections that are kept open to
+                                   a single host. Defaults to 10.
+
+    Returns:
+        requests.Session: Session with the default headers set and pooled adapters mounted.
+    """
+    session = requests.Session()
+    session.headers.update({'User-Agent': USER_AGENT})
+
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    return session
@@ -0,0 +1,200 @@
+"""
+@author Eric Zair
+@file song.py
+
+Contains the Song and SongCollection objects, and as_song_collection().
+
+A Song is a single song that can be downloaded, and a SongCollection is an ordered set of
+songs keyed by their beatsaver key. Two songs with the same title are still two different
+songs, so nothing is lost when mappers pick the same title.
+
+SongScraper used to hand around dicts of <song_title> -> <song_download_link>.
+as_song_collection() and SongCollection.to_dict() convert between the two forms.
+"""
+
+# Handling the song folder names.
+import re
+
+# Reading the key off of a song's download link.
+from bsaber.song_index import song_key_from_download_link
+
+
+""" Characters that can not be in a folder name on Windows. """
+UNSAFE_FOLDER_CHARACTERS = re.compile(r'[<>:"/\\|?*\x00-\x1f]')
+
+
+class Song():
+    """A single song that can be downloaded."""
+
+    __slots__ = ('key', 'title', 'mapper', 'download_link', 'hash', 'duration')
+
+    def __init__(self, key, title, download_link, mapper=None, hash=None, duration=None):
+        """Constructs a Song object.
+
+        Args:
+            key (str): The song's beatsaver key.
+
+            title (str): The song's title.
+
+            download_link (str): The link that the song's zipfile is downloaded from.
+
+            mapper (str, optional): The name of the person who mapped the song.
+                                    Defaults to None.
+
+            hash (str, optional): sha1 hash of the song, as the game computes it.
+                                  Defaults to None.
+
+            duration (int, optional): The length of the song in seconds. Defaults to None.
+        """
+        self.key = key
+        self.title = title
+        self.download_link = download_link
+        self.mapper = mapper
+        self.hash = hash
+        self.duration = duration
+
+
+    @staticmethod
+    def from_record(record, download_link):
+        """Return the Song of a ListingRecord or SongRecord.
+
+        Args:
+            record (ListingRecord or SongRecord): The song, as scraped or as given by the API.
+
+            download_link (str): The link that the song's zipfile is downloaded from.
+        """
+        return Song(record.key, record.title, download_link, mapper=record.mapper,
+                    hash=getattr(record, 'hash', None), duration=getattr(record, 'duration', None))
+
+
+    @property
+    def folder_name(self):
+        """The name of the folder that the song is extracted to, '<key> (<title>)' like the
+        folders that beatsaver names, so two songs with the same title never share a folder.
+        """
+        return f'{self.key} ({UNSAFE_FOLDER_CHARACTERS.sub("_", self.title).strip(". ")})'
+
+
+    def __repr__(self):
+        return f"Song(key={self.key!r}, title={self.title!r}, mapper={self.mapper!r})"
+
+
+class SongCollection():
+    """Ordered set of songs, keyed by beatsaver key.
+
+    A song can be looked up by its key or by its position in constant time, and adding the
+    songs of another page only costs the songs on that page.
+    """
+
+    def __init__(self, songs=()):
+        """Constructs a SongCollection object.
+
+        Args:
+            songs (iterable(Song), optional): The songs to start with. A song whose key is
+                                              already in the collection is left out.
+                                              Defaults to no songs.
+        """
+        self.__songs = []
+
+        """ key -> position of the song in __songs. """
+        self.__positions = {}
+
+        self.extend(songs)
+
+
+    def add(self, song):
+        """Add song to the end of the collection.
+
+        Returns:
+            bool: True if the song was added, False if its key was already in the collection.
+        """
+        if song.key in self.__positions:
+            return False
+
+        self.__positions[song.key] = len(self.__songs)
+        self.__songs.append(song)
+        return True
+
+
+    def extend(self, songs):
+        """Add each song in songs, e.g. the next page of a listing, to the end of the collection.
+
+        Returns:
+            int: The number of songs that were added.
+        """
+        return sum(self.add(song) for song in songs)
+
+
+    def get(self, key, default=None):
+        """Return the song with the given beatsaver key, default if there is none."""
+        position = self.__positions.get(key)
+        return default if position is None else self.__songs[position]
+
+
+    def position_of(self, key):
+        """Return the position of the song with the given beatsaver key, None if there is none."""
+        return self.__positions.get(key)
+
+
+    def keys(self):
+        """Return the key of every song, in order."""
+        return list(self.__positions)
+
+
+    def to_dict(self):
+        """Return the songs in the old form, <song_title> -> <song_download_link>.
+        A title that is already taken by an earlier song gets the song's key added to it.
+        """
+        dict_of_songs = {}
+
+        for song in self.__songs:
+            title = song.title if song.title not in dict_of_songs else f'{song.title} ({song.key})'
+            dict_of_songs[title] = song.download_link
+
+        return dict_of_songs
+
+
+    @staticmethod
+    def from_dict(dict_of_songs):
+        """Return the SongCollection of songs in the old form,
+        <song_title> -> <song_download_link>. Each song's key is read off of its link.
+        """
+        return SongCollection(Song(song_key_from_download_link(song_download_link), title,
+                                   song_download_link)
+                              for title, song_download_link in dict_of_songs.items())
+
+
+    def __getitem__(self, position):
+        return self.__songs[position]
+
+
+    def __contains__(self, key):
+        return key in self.__positions
+
+
+    def __iter__(self):
+        return iter(self.__songs)
+
+
+    def __len__(self):
+        return len(self.__songs)
+
+
+    def __repr__(self):
+        return f"SongCollection({self.__songs!r})"
+
+
+def as_song_collection(songs):
+    """Return songs as a SongCollection.
+
+    Args:
+        songs (SongCollection, dict(str, str) or iterable(Song)): The songs as a collection,
+            in the old <song_title> -> <song_download_link> form, or as any iterable of songs.
+    """
+    if isinstance(songs, SongCollection):
+        return songs
+
+    if isinstance(songs, dict):
+        return SongCollection.from_dict(songs)
+
+    return SongCollection(songs)
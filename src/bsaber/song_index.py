@@ -0,0 +1,200 @@
+"""
+@author Eric Zair
+@file song_index.py
+
+Contains the SongIndex object and song_key_from_download_link().
+
+SongIndex is a small SQLite database that remembers every song that has been installed
+in the custom_levels folder, keyed by the song's beatsaver key. It lets the scraper skip
+songs that are already installed without going to the network or walking the folder.
+"""
+
+# Handling the index database.
+from threading import Lock
+import sqlite3
+import time
+import re
+
+# Handling file system navigation and paths.
+from os.path import join, isdir, exists, getsize
+from os import listdir, walk
+
+
+""" Beatsaver names its song folders '<key> (<song name> - <mapper>)'. """
+BEATSAVER_FOLDER_PATTERN = re.compile(r'^([0-9a-fA-F]+) \((.*)\)$')
+
+
+def song_key_from_download_link(song_download_link):
+    """Return the beatsaver key at the end of a song's download link.
+
+    Args:
+        song_download_link (str): e.g. https://beatsaver.com/api/download/key/1a2b
+
+    Returns:
+        str: The song's beatsaver key, e.g. 1a2b.
+    """
+    return song_download_link.rstrip('/').rsplit('/', 1)[-1]
+
+
+def _folder_size(folder):
+    """Return the number of bytes of every file in folder."""
+    return sum(getsize(join(root, file)) for root, _, files in walk(folder) for file in files)
+
+
+class SongIndex():
+    """Persistent on disk index of the songs installed in the custom_levels folder."""
+
+    def __init__(self, path_to_index):
+        """Constructs a SongIndex object, creating the database if it does not exist yet.
+
+        Args:
+            path_to_index (str): The location of the SQLite database file.
+        """
+        # The index is shared with the threads of the scraper, so access goes through a lock.
+        self.__connection = sqlite3.connect(path_to_index, check_same_thread=False)
+        self.__lock = Lock()
+        self.__connection.execute('CREATE TABLE IF NOT EXISTS songs ('
+                                  'key TEXT PRIMARY KEY, '
+                                  'title TEXT NOT NULL, '
+                                  'folder TEXT NOT NULL, '
+                                  'archive_hash TEXT, '
+                                  'size INTEGER NOT NULL DEFAULT 0, '
+                                  'installed_at REAL NOT NULL)')
+        self.__connection.commit()
+
+        """ Every key in the index, loaded once so lookups never touch the database. """
+        self.__installed_keys = {key for (key,) in self.__connection.execute('SELECT key FROM songs')}
+
+
+    def __contains__(self, key):
+        return key in self.__installed_keys
+
+
+    def __len__(self):
+        return len(self.__installed_keys)
+
+
+    def installed_keys(self):
+        """Return the beatsaver key of every installed song.
+
+        Returns:
+            set(str): The keys of the installed songs.
+        """
+        return set(self.__installed_keys)
+
+
+    def get(self, key):
+        """Return the record of the installed song with the given key.
+
+        Args:
+            key (str): The song's beatsaver key.
+
+        Returns:
+            dict or None: The song's key, title, folder, archive_hash, size and installed_at,
+                          None if the song is not installed.
+        """
+        with self.__lock:
+            row = self.__connection.execute('SELECT key, title, folder, archive_hash, size, '
+                                            'installed_at FROM songs WHERE key = ?',
+                                            (key,)).fetchone()
+
+        if row is None:
+            return None
+
+        return dict(zip(('key', 'title', 'folder', 'archive_hash', 'size', 'installed_at'), row))
+
+
+    def records(self):
+        """Return the record of every installed song.
+
+        Returns:
+            list(dict): Each song's key, title, folder, archive_hash, size and installed_at.
+        """
+        with self.__lock:
+            rows = self.__connection.execute('SELECT key, title, folder, archive_hash, size, '
+                                             'installed_at FROM songs ORDER BY key').fetchall()
+
+        return [dict(zip(('key', 'title', 'folder', 'archive_hash', 'size', 'installed_at'), row))
+                for row in rows]
+
+
+    def add(self, key, title, folder, archive_hash=None, size=0, installed_at=None):
+        """Record that the song with the given key is installed, replacing any old record.
+
+        Args:
+            key (str): The song's beatsaver key.
+
+            title (str): The song's title.
+
+            folder (str): The folder that the song is installed in.
+
+            archive_hash (str, optional): The sha1 of the song's zipfile. Defaults to None.
+
+            size (int, optional): The size of the song in bytes. Defaults to 0.
+
+            installed_at (float, optional): Unix time that the song was installed at.
+                                            Defaults to now.
+        """
+        with self.__lock:
+            self.__connection.execute('INSERT OR REPLACE INTO songs VALUES (?, ?, ?, ?, ?, ?)',
+                                      (key, title, folder, archive_hash, size,
+                                       time.time() if installed_at is None else installed_at))
+            self.__connection.commit()
+            self.__installed_keys.add(key)
+
+
+    def remove(self, key):
+        """Forget the song with the given key.
+
+        Args:
+            key (str): The song's beatsaver key.
+        """
+        with self.__lock:
+            self.__connection.execute('DELETE FROM songs WHERE key = ?', (key,))
+            self.__connection.commit()
+            self.__installed_keys.discard(key)
+
+
+    def rebuild(self, path_to_custom_levels):
+        """Repopulate the index from the song folders in path_to_custom_levels.
+
+        Records whose folder no longer exists are dropped. Any folder named the way beatsaver
+        names them, '<key> (<song name> - <mapper>)', that is not in the index yet is added.
+        Folders that are named after just the song's title can't be mapped back to a key, so
+        they are only kept if the index already knew about them.
+
+        Args:
+            path_to_custom_levels (str): The location of the custom_levels/ folder.
+
+        Returns:
+            int: The number of songs in the index after it was rebuilt.
+        """
+        with self.__lock, self.__connection:
+            rows = self.__connection.execute('SELECT key, folder FROM songs').fetchall()
+
+            for key, folder in rows:
+                if not exists(folder):
+                    self.__connection.execute('DELETE FROM songs WHERE key = ?', (key,))
+
+            known_folders = {folder for _, folder in rows}
+
+            for folder_name in listdir(path_to_custom_levels):
+                folder = join(path_to_custom_levels, folder_name)
+                match = BEATSAVER_FOLDER_PATTERN.match(folder_name)
+
+                if match is None or folder in known_folders or not isdir(folder):
+                    continue
+
+                self.__connection.execute('INSERT OR IGNORE INTO songs VALUES (?, ?, ?, NULL, ?, ?)',
+                                          (match.group(1).lower(), match.group(2), folder,
+                                           _folder_size(folder), time.time()))
+
+            self.__installed_keys = \
+                {key for (key,) in self.__connection.execute('SELECT key FROM songs')}
+
+        return len(self.__installed_keys)
+
+
+    def close(self):
+        """Close the connection to the index database."""
+        self.__connection.close()
@@ -0,0 +1,428 @@
+"""
+@author Eric Zair
+@file song_search.py
+
+Contains the SearchHit and SongSearchIndex objects, and the helpers used to read the
+metadata of an installed song.
+
+SongSearchIndex is a local search engine over every song that is installed, or that has
+been seen in a listing, search or API answer. The songs' metadata is kept in a small SQLite
+database, and an inverted index from each word and each trigram (run of three characters)
+of a song's title, artist and mapper to the songs that contain it is built in memory the
+first time the index is searched. Until then, songs that are added only go to the database,
+so recording every song of a long crawl does not hold them all in memory. A query is
+answered from the inverted index alone, so it takes milliseconds and never touches the
+network. Matching on trigrams makes the search forgiving of typos, e.g. 'ligth it up' still
+finds 'Light It Up'.
+"""
+
+# Handling the index database.
+from collections import Counter
+from threading import Lock
+import unicodedata
+import sqlite3
+import json
+import time
+import re
+
+# Handling file system navigation and paths.
+from os.path import join
+from os import listdir
+
+
+""" Fields that are searched, and how much a match in each of them counts. """
+FIELD_WEIGHTS = {'title': 1.0, 'artist': 0.8, 'mapper': 0.6}
+
+""" Smallest score, from 0 to 1, that a song needs to count as a hit. """
+MIN_SCORE = 0.35
+
+""" Number of songs, sharing the most trigrams with the query, that are fully scored. """
+MAX_CANDIDATES = 500
+
+""" Anything that is not a letter or a digit separates two words. """
+WORD_SEPARATOR_PATTERN = re.compile(r'[\W_]+')
+
+
+def normalize(text):
+    """Return text in lowercase, without accents, with every run of punctuation and space
+    replaced by a single space.
+    """
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    without_accents = ''.join(character for character in decomposed
+                              if not unicodedata.combining(character))
+    return WORD_SEPARATOR_PATTERN.sub(' ', without_accents.lower()).strip()
+
+
+def trigrams(text):
+    """Return the set of trigrams of the words in text. Each word is padded the way pg_trgm
+    pads it, with two spaces in front and one behind, so the start of a word counts the most.
+    """
+    grams = set()
+
+    for word in normalize(text).split():
+        padded_word = f'  {word} '
+        grams.update(padded_word[i: i + 3] for i in range(len(padded_word) - 2))
+
+    return grams
+
+
+def text_or_none(value):
+    """Return value if it is a non empty string, None otherwise. A hand edited info.dat, or
+    an API answer, can hold anything where a title or a name should be.
+    """
+    return value if isinstance(value, str) and value else None
+
+
+def read_song_metadata(song_folder):
+    """Return the title, artist and mapper in the info.dat of the song in song_folder.
+
+    Args:
+        song_folder (str): The folder of an installed song.
+
+    Returns:
+        (str, str, str): The song's title, artist and mapper. None if the song has no
+                         info.dat, or it can not be read.
+    """
+    try:
+        info_file_name = next(file for file in listdir(song_folder) if file.lower() == 'info.dat')
+
+        with open(join(song_folder, info_file_name), 'r', encoding='utf-8-sig') as info_file:
+            info = json.load(info_file)
+    except (StopIteration, OSError, ValueError):
+        return None
+
+    if not isinstance(info, dict):
+        return None
+
+    title = ' '.join(part for part in (text_or_none(info.get('_songName')),
+                                       text_or_none(info.get('_songSubName'))) if part)
+    return title or None, text_or_none(info.get('_songAuthorName')), \
+        text_or_none(info.get('_levelAuthorName'))
+
+
+class SearchHit():
+    """A single song found by SongSearchIndex.search()."""
+
+    __slots__ = ('key', 'title', 'artist', 'mapper', 'installed', 'score')
+
+    def __init__(self, key, title, artist, mapper, installed, score):
+        """Constructs a SearchHit object.
+
+        Args:
+            key (str): The song's beatsaver key.
+
+            title (str): The song's title.
+
+            artist (str): The song's artist, None if it is not known.
+
+            mapper (str): The name of the person who mapped the song, None if it is not known.
+
+            installed (bool): True if the song is installed in the custom_levels folder.
+
+            score (float): How well the song matched the query, from 0 to 1.
+        """
+        self.key = key
+        self.title = title
+        self.artist = artist
+        self.mapper = mapper
+        self.installed = installed
+        self.score = score
+
+
+    def __repr__(self):
+        return (f"SearchHit(key={self.key!r}, title={self.title!r}, artist={self.artist!r}, "
+                f"mapper={self.mapper!r}, installed={self.installed}, score={self.score:.3f})")
+
+
+class _IndexedSong():
+    """Helper object for SongSearchIndex. A song's metadata and the terms it is indexed by."""
+
+    __slots__ = ('title', 'artist', 'mapper', 'installed', 'field_trigrams', 'words')
+
+    def __init__(self, title, artist, mapper, installed):
+        self.title = title
+        self.artist = artist
+        self.mapper = mapper
+        self.installed = installed
+
+        """ field name -> the trigrams of that field. """
+        self.field_trigrams = {field: trigrams(getattr(self, field)) for field in FIELD_WEIGHTS}
+
+        """ Every whole word of every field. """
+        self.words = set(normalize(' '.join(filter(None, (title, artist, mapper)))).split())
+
+
+    def terms(self):
+        """Return every trigram and word that the song is indexed by."""
+        return set().union(*self.field_trigrams.values()), self.words
+
+
+class SongSearchIndex():
+    """Persistent fuzzy search index of the installed songs and the songs seen on listings."""
+
+    def __init__(self, path_to_index):
+        """Constructs a SongSearchIndex object, creating the database if it does not exist yet.
+
+        Args:
+            path_to_index (str): The location of the SQLite database file, ':memory:' to only
+                                 keep the index in memory.
+        """
+        # The index is shared with the threads of the scraper, so access goes through a lock.
+        self.__connection = sqlite3.connect(path_to_index, check_same_thread=False)
+        self.__connection.execute('CREATE TABLE IF NOT EXISTS songs ('
+                                  'key TEXT PRIMARY KEY, '
+                                  'title TEXT NOT NULL, '
+                                  'artist TEXT, '
+                                  'mapper TEXT, '
+                                  'installed INTEGER NOT NULL DEFAULT 0, '
+                                  'seen_at REAL NOT NULL)')
+        self.__connection.commit()
+        self.__lock = Lock()
+
+        """ key -> _IndexedSong. None until the inverted index is built on first use. """
+        self.__songs = None
+
+        """ trigram -> keys of the songs that contain it, and word -> keys of the songs. """
+        self.__trigram_postings = {}
+        self.__word_postings = {}
+
+
+    def __contains__(self, key):
+        with self.__lock:
+            return key in self.__load()
+
+
+    def __len__(self):
+        with self.__lock:
+            return len(self.__load())
+
+
+    def __load(self):
+        """Build the inverted index of every song in the database, unless it is built already.
+
+        Returns:
+            dict(str, _IndexedSong): key -> the song with that key.
+        """
+        if self.__songs is None:
+            self.__songs = {}
+
+            for key, title, artist, mapper, installed in self.__connection.execute(
+                    'SELECT key, title, artist, mapper, installed FROM songs'):
+                self.__index_song(key, _IndexedSong(title, artist, mapper, bool(installed)))
+
+        return self.__songs
+
+
+    def __index_song(self, key, indexed_song):
+        """Put indexed_song in the inverted index under key, replacing the song it had."""
+        self.__unindex_song(key)
+        self.__songs[key] = indexed_song
+        song_trigrams, song_words = indexed_song.terms()
+
+        for gram in song_trigrams:
+            self.__trigram_postings.setdefault(gram, set()).add(key)
+
+        for word in song_words:
+            self.__word_postings.setdefault(word, set()).add(key)
+
+
+    def __unindex_song(self, key):
+        """Take the song with the given key out of the inverted index, if it is in it."""
+        indexed_song = self.__songs.pop(key, None)
+
+        if indexed_song is None:
+            return
+
+        song_trigrams, song_words = indexed_song.terms()
+
+        for postings, terms in ((self.__trigram_postings, song_trigrams),
+                                (self.__word_postings, song_words)):
+            for term in terms:
+                postings[term].discard(key)
+
+                if not postings[term]:
+                    del postings[term]
+
+
+    def __upsert(self, key, title, artist, mapper, installed):
+        """Helper method for add() and add_records(). Arguments that are None keep the value
+        that the song already had, and so do the ones that are not strings. Returns True if
+        the song changed.
+        """
+        title, artist, mapper = text_or_none(title), text_or_none(artist), text_or_none(mapper)
+        installed = None if installed is None else int(installed)
+
+        # The inverted index is not built yet, so the database merges the song on its own.
+        if self.__songs is None:
+            self.__connection.execute('INSERT INTO songs VALUES (?, COALESCE(?, ?), ?, ?, '
+                                      'COALESCE(?, 0), ?) ON CONFLICT(key) DO UPDATE SET '
+                                      'title = COALESCE(?, title), '
+                                      'artist = COALESCE(excluded.artist, artist), '
+                                      'mapper = COALESCE(excluded.mapper, mapper), '
+                                      'installed = COALESCE(?, installed), '
+                                      'seen_at = excluded.seen_at',
+                                      (key, title or None, key, artist, mapper, installed,
+                                       time.time(), title or None, installed))
+            return True
+
+        old_song = self.__songs.get(key)
+
+        if old_song is not None:
+            title = title or old_song.title
+            artist = artist if artist is not None else old_song.artist
+            mapper = mapper if mapper is not None else old_song.mapper
+            installed = installed if installed is not None else old_song.installed
+
+            if (title, artist, mapper, installed) == \
+                    (old_song.title, old_song.artist, old_song.mapper, old_song.installed):
+                return False
+
+        installed = bool(installed)
+        self.__connection.execute('INSERT OR REPLACE INTO songs VALUES (?, ?, ?, ?, ?, ?)',
+                                  (key, title or key, artist, mapper, int(installed), time.time()))
+        self.__index_song(key, _IndexedSong(title or key, artist, mapper, installed))
+        return True
+
+
+    def add(self, key, title, artist=None, mapper=None, installed=None):
+        """Add the song with the given key to the index, or update it.
+
+        Args:
+            key (str): The song's beatsaver key.
+
+            title (str): The song's title.
+
+            artist (str, optional): The song's artist. Defaults to the artist the index
+                                    already had.
+
+            mapper (str, optional): The name of the person who mapped the song. Defaults to the
+                                    mapper the index already had.
+
+            installed (bool, optional): True if the song is installed. Defaults to what the
+                                        index already had, or False for a new song.
+        """
+        with self.__lock:
+            if self.__upsert(key, title, artist, mapper, installed):
+                self.__connection.commit()
+
+
+    def add_records(self, records):
+        """Add every song seen on a listing, search or API answer to the index, in one
+        transaction. Whether a song is installed is left as the index had it.
+
+        Args:
+            records (iterable(ListingRecord or SongRecord or Song)): The songs that were seen.
+                                                                    Each has a key, title and
+                                                                    mapper.
+        """
+        with self.__lock:
+            changed = [self.__upsert(record.key, record.title, None, record.mapper, None)
+                       for record in records]
+
+            if any(changed):
+                self.__connection.commit()
+
+
+    def set_installed_keys(self, installed_keys):
+        """Mark exactly the songs with the given keys as installed, e.g. after the index of
+        installed songs was rebuilt. Keys the search index does not know are left out.
+
+        Args:
+            installed_keys (set(str)): The keys of the installed songs.
+        """
+        with self.__lock:
+            if self.__songs is None:
+                installed_by_key = self.__connection.execute('SELECT key, installed FROM songs')
+            else:
+                installed_by_key = [(key, indexed_song.installed)
+                                    for key, indexed_song in self.__songs.items()]
+
+            changed = [self.__upsert(key, None, None, None, key in installed_keys)
+                       for key, installed in list(installed_by_key)
+                       if bool(installed) != (key in installed_keys)]
+
+            if changed:
+                self.__connection.commit()
+
+
+    def search(self, query, limit=20, installed_only=False, min_score=MIN_SCORE):
+        """Return the songs that best match query, best first.
+
+        Each song sharing a trigram with the query is a candidate. The candidates that share
+        the most trigrams are scored on how much of the query each of their fields covers,
+        weighted by FIELD_WEIGHTS, with a bonus for every word of the query that one of their
+        fields contains as a whole. Installed songs win ties.
+
+        Args:
+            query (str): What to search for, e.g. 'light it up' or a mapper's name.
+
+            limit (int, optional): The most songs that are returned. Defaults to 20.
+
+            installed_only (bool, optional): True to only return installed songs.
+                                             Defaults to False.
+
+            min_score (float, optional): Songs that score lower are left out.
+                                         Defaults to MIN_SCORE.
+
+        Returns:
+            list(SearchHit): The songs that matched, an empty list on a miss.
+        """
+        query_trigrams = trigrams(query)
+        query_words = set(normalize(query).split())
+
+        if not query_trigrams:
+            return []
+
+        with self.__lock:
+            songs = self.__load()
+            shared_trigram_counts = Counter()
+
+            for gram in query_trigrams:
+                shared_trigram_counts.update(self.__trigram_postings.get(gram, ()))
+
+            keys_by_word = {word: self.__word_postings.get(word, set()) for word in query_words}
+            hits = []
+
+            for key, _ in shared_trigram_counts.most_common(MAX_CANDIDATES):
+                indexed_song = songs[key]
+
+                if installed_only and not indexed_song.installed:
+                    continue
+
+                score = self.__score(query_trigrams, indexed_song)
+                score += 0.2 * sum(key in keys for keys in keys_by_word.values()) / len(query_words)
+                score = min(1.0, score)
+
+                if score >= min_score:
+                    hits.append(SearchHit(key, indexed_song.title, indexed_song.artist,
+                                          indexed_song.mapper, indexed_song.installed, score))
+
+        hits.sort(key=lambda hit: (-hit.score, not hit.installed, hit.title.lower()))
+        return hits[: limit]
+
+
+    @staticmethod
+    def __score(query_trigrams, indexed_song):
+        """Helper method for search(). Return how well indexed_song's best field matches the
+        query's trigrams. Mostly how much of the query the field covers, and partly how much
+        of the field is the query, so a short exact title beats a long one containing it.
+        """
+        best_score = 0.0
+
+        for field, weight in FIELD_WEIGHTS.items():
+            field_trigrams = indexed_song.field_trigrams[field]
+
+            if not field_trigrams:
+                continue
+
+            shared = len(query_trigrams & field_trigrams)
+            coverage = shared / len(query_trigrams)
+            dice = 2 * shared / (len(query_trigrams) + len(field_trigrams))
+            best_score = max(best_score, weight * (0.75 * coverage + 0.25 * dice))
+
+        return best_score
+
+
+    def close(self):
+        """Close the connection to the index database."""
+        self.__connection.close()
@@ -0,0 +1,235 @@
+"""
+@author Eric Zair
+@file sync.py
+
+Contains the SyncRule and SyncReport objects, sync_library() and stream_sync().
+
+sync_library() brings the custom_levels folder up to date with a list of rules such as
+'the top 50 songs of the last 7 days'. Each rule's songs are crawled from bsaber.com, the
+songs that are already in the song index are dropped, and only the rest are downloaded and
+extracted. The newest key seen on 'new' is saved as a cursor, so the next sync stops
+crawling 'new' as soon as it gets back to a song it has already seen.
+
+stream_sync() does the same, yielding each song's result as soon as it is installed. Songs
+are crawled, downloaded and extracted one after the other as there is room for them, and
+only their keys are kept, so even a sync of thousands of songs takes the same memory.
+"""
+
+# Handling the cursor file.
+import json
+
+# Handling the songs that are installed.
+from bsaber.song import Song, SongCollection
+
+# Handling file system navigation and paths.
+from os.path import exists
+from os import replace
+
+
+class SyncRule():
+    """A set of songs that the library should always have, e.g. the top 50 of the last 7 days."""
+
+    def __init__(self, sorted_by, time_period='all', number_of_songs=20):
+        """Constructs a SyncRule object.
+
+        Args:
+            sorted_by (str): Options: ['new', 'top', 'most-difficult'].
+
+            time_period (str, optional): Options: ['24-hours', '7-days', '30-days', '3-months',
+                                         'all']. Defaults to 'all'.
+
+            number_of_songs (int, optional): The number of songs the rule covers. Defaults to 20.
+        """
+        self.sorted_by = sorted_by
+        self.time_period = 'all' if sorted_by == 'new' else time_period
+        self.number_of_songs = number_of_songs
+
+
+    @staticmethod
+    def from_string(rule):
+        """Return the SyncRule written as '<sorted_by>[/<time_period>][:<number_of_songs>]',
+        e.g. 'top/7-days:50' or 'new:100'.
+
+        Raises:
+            ValueError: If rule is not written in that form.
+        """
+        rule, _, number_of_songs = rule.partition(':')
+        sorted_by, _, time_period = rule.partition('/')
+
+        if not sorted_by or (number_of_songs and not number_of_songs.isdigit()):
+            raise ValueError(f"Error: \"{rule}\" is not a valid sync rule, "
+                             "e.g. 'top/7-days:50'.")
+
+        return SyncRule(sorted_by, time_period or 'all',
+                        int(number_of_songs) if number_of_songs else 20)
+
+
+    def __str__(self):
+        if self.sorted_by == 'new':
+            return f'new:{self.number_of_songs}'
+
+        return f'{self.sorted_by}/{self.time_period}:{self.number_of_songs}'
+
+
+class SyncReport():
+    """What a single call to sync_library() did."""
+
+    def __init__(self):
+        """Constructs an empty SyncReport object."""
+
+        """ str(SyncRule) -> number of songs that were crawled for the rule. """
+        self.songs_crawled = {}
+
+        """ The songs that were not installed yet. """
+        self.songs_to_install = SongCollection()
+
+        """ The result for each song in songs_to_install. """
+        self.results = []
+
+        """ Number of songs that were installed, and that could not be installed. Kept by
+        stream_sync() too, which does not collect songs_to_install or results. """
+        self.number_installed = 0
+        self.number_failed = 0
+
+
+    def installed(self):
+        """Return the results of the songs that were downloaded and extracted."""
+        return [result for result in self.results if result.success]
+
+
+    def failed(self):
+        """Return the results of the songs that could not be installed."""
+        return [result for result in self.results if not result.success]
+
+
+def _load_cursors(path_to_cursor):
+    """Return the cursors saved by the last sync, {} if there was no last sync."""
+    if path_to_cursor is None or not exists(path_to_cursor):
+        return {}
+
+    with open(path_to_cursor, 'r', encoding='utf-8') as cursor_file:
+        return json.load(cursor_file)
+
+
+def _save_cursors(path_to_cursor, cursors):
+    """Write the cursors for the next sync, replacing the old file in one step."""
+    with open(path_to_cursor + '.tmp', 'w', encoding='utf-8') as cursor_file:
+        json.dump(cursors, cursor_file)
+
+    replace(path_to_cursor + '.tmp', path_to_cursor)
+
+
+def _crawl_rules(scraper, rules, report, installed_keys, cursors, max_workers):
+    """Helper generator for stream_sync(). Yield each song covered by rules that is not
+    installed yet, once, moving cursors along as each rule is crawled.
+    """
+    keys_seen = set()
+
+    for rule in rules:
+        report.songs_crawled[str(rule)] = 0
+        newest_key = None
+
+        for record in scraper.crawl_songs(rule.sorted_by, rule.time_period,
+                                          number_of_songs=rule.number_of_songs,
+                                          max_workers=max_workers):
+            # 'new' is in the order songs were uploaded, so everything past the song the last
+            # sync started at has been seen before.
+            if rule.sorted_by == 'new':
+                if record.key == cursors.get('new'):
+                    break
+                newest_key = newest_key or record.key
+
+            report.songs_crawled[str(rule)] += 1
+
+            # A song that more than one rule covers is only installed once.
+            if record.key in installed_keys or record.key in keys_seen:
+                continue
+
+            keys_seen.add(record.key)
+            yield Song.from_record(record, scraper.download_link_for_record(record))
+
+        if newest_key is not None:
+            cursors['new'] = newest_key
+
+
+def stream_sync(scraper, rules, report, path_to_cursor=None, display_error_message=True,
+                max_workers=8, max_pending=4):
+    """Download and extract every song covered by rules that is not installed yet, yielding
+    each song's result as soon as it is installed. The songs are crawled as there is room to
+    download them, so neither the crawl nor the results are held in memory.
+
+    Args:
+        scraper (SongScraper): Used to crawl, download and extract the songs.
+
+        rules (list(SyncRule)): The sets of songs that the library should have.
+
+        report (SyncReport): Gets the number of songs crawled for each rule, installed and
+                             failed, as the sync goes.
+
+        path_to_cursor (str, optional): The file that the newest key seen on 'new' is saved
+                                        to between syncs. None to always crawl the whole rule.
+                                        Defaults to None.
+
+        display_error_message (bool, optional): True if user wants to display possible errors,
+                                                False otherwise. Defaults to True.
+
+        max_workers (int, optional): The max number of pages or songs fetched at once.
+                                     Defaults to 8.
+
+        max_pending (int, optional): The max number of downloaded songs waiting to be
+                                     extracted. Defaults to 4.
+
+    Yields:
+        (Song, PipelineResult): The next song that is done, and the outcome of its download
+                                and extraction.
+    """
+    installed_keys = scraper.song_index().installed_keys()
+    cursors = _load_cursors(path_to_cursor)
+    songs = _crawl_rules(scraper, rules, report, installed_keys, cursors, max_workers)
+
+    for song, result in scraper.download_extract_stream(
+            songs, display_error_message=display_error_message, max_workers=max_workers,
+            max_pending=max_pending):
+        if result.success:
+            report.number_installed += 1
+        else:
+            report.number_failed += 1
+
+        yield song, result
+
+    # The cursor only moves once every song it covers is installed, so a song that failed is
+    # crawled again by the next sync. A sync that was stopped early never gets here.
+    if path_to_cursor is not None and not report.number_failed:
+        _save_cursors(path_to_cursor, cursors)
+
+
+def sync_library(scraper, rules, path_to_cursor=None, display_error_message=True, max_workers=8):
+    """Download and extract every song covered by rules that is not installed yet.
+
+    Args:
+        scraper (SongScraper): Used to crawl, download and extract the songs.
+
+        rules (list(SyncRule)): The sets of songs that the library should have.
+
+        path_to_cursor (str, optional): The file that the newest key seen on 'new' is saved
+                                        to between syncs. None to always crawl the whole rule.
+                                        Defaults to None.
+
+        display_error_message (bool, optional): True if user wants to display possible errors,
+                                                False otherwise. Defaults to True.
+
+        max_workers (int, optional): The max number of pages or songs fetched at once.
+                                     Defaults to 8.
+
+    Returns:
+        SyncReport: The songs that were crawled, and the result of each one that was installed.
+    """
+    report = SyncReport()
+
+    for song, result in stream_sync(scraper, rules, report, path_to_cursor=path_to_cursor,
+                                    display_error_message=display_error_message,
+                                    max_workers=max_workers):
+        report.songs_to_install.add(song)
+        report.results.append(result)
+
+    return report
@@ -0,0 +1,510 @@
+"""
+@author Eric Zair
+@file verifier.py
+
+Contains the MapReport and VerificationReport objects, and the functions used to check
+that each song folder in the custom_levels folder holds a map that the game can load.
+
+For each song folder, verify_song_folder():
+    - parses info.dat, reading the song's title, artist, mapper, bpm and difficulties,
+    - checks that the audio file is there and is a complete ogg stream, by walking the
+      headers of its pages without decoding anything,
+    - checks that every difficulty file is there and parses, counting its notes,
+    - flags every empty file, which a failed download or extraction leaves behind,
+    - computes the map's hash the way the game does: the sha1 of info.dat followed by each
+      difficulty file in the order that info.dat lists them, in uppercase hex.
+
+Parsing the difficulty files is most of the work, so verify_custom_levels() spreads the
+folders over a pool of worker processes. The reports are cached in a JSON file along with
+a signature of each folder, and a folder is only verified again once the folder, or a file
+in it, changed.
+"""
+
+# Handling the worker pool and the cached report.
+import hashlib
+import json
+import time
+
+# Handling file system navigation and paths.
+from os.path import join, isfile, basename
+from os import listdir, replace, scandir, stat
+
+# Reading the key of a song out of its folder's name.
+from bsaber.song_index import BEATSAVER_FOLDER_PATTERN
+
+
+""" Version of the cached report's layout. A report of another version is ignored. """
+REPORT_VERSION = 1
+
+""" Every ogg page starts with these bytes. """
+OGG_CAPTURE_PATTERN = b'OggS'
+
+""" Files that the scraper itself leaves in a song folder, which are not part of the map. """
+SCRAPER_FILE_PREFIX = '.bsaber'
+
+
+def folder_signature(song_folder):
+    """Return [modification time of the folder, latest modification time of a file in it,
+    total size of its files], which changes whenever anything in the folder changes.
+    """
+    latest_mtime = 0
+    total_size = 0
+
+    with scandir(song_folder) as entries:
+        for entry in entries:
+            entry_stat = entry.stat()
+            latest_mtime = max(latest_mtime, entry_stat.st_mtime_ns)
+            total_size += entry_stat.st_size
+
+    return [stat(song_folder).st_mtime_ns, latest_mtime, total_size]
+
+
+def check_ogg_file(path):
+    """Return what is wrong with the ogg file at path, None if every page of it is whole.
+    Only the 27 byte header and segment table of each page are read, the rest is skipped.
+    """
+    with open(path, 'rb') as ogg_file:
+        file_size = ogg_file.seek(0, 2)
+        offset = 0
+        number_of_pages = 0
+
+        while offset < file_size:
+            ogg_file.seek(offset)
+            header = ogg_file.read(27)
+
+            if len(header) < 27 or not header.startswith(OGG_CAPTURE_PATTERN):
+                return f"not an ogg page at byte {offset}"
+
+            segment_table = ogg_file.read(header[26])
+
+            if len(segment_table) < header[26]:
+                return f"ogg page at byte {offset} is cut off"
+
+            offset += 27 + header[26] + sum(segment_table)
+            number_of_pages += 1
+
+        if offset > file_size:
+            return f"last ogg page is cut off, {offset - file_size} bytes are missing"
+
+    return None if number_of_pages else "ogg file has no pages"
+
+
+class MapReport():
+    """The outcome of verifying a single song folder."""
+
+    def __init__(self, song_folder):
+        """Constructs a MapReport object.
+
+        Args:
+            song_folder (str): The folder that was verified.
+        """
+        self.song_folder = song_folder
+
+        """ The song's beatsaver key, read from the folder's name. None if it has none. """
+        match = BEATSAVER_FOLDER_PATTERN.match(basename(song_folder))
+        self.key = match.group(1).lower() if match else None
+
+        """ The metadata in info.dat. """
+        self.title = None
+        self.artist = None
+        self.mapper = None
+        self.bpm = None
+
+        """ Each difficulty as {'characteristic', 'difficulty', 'file', 'notes'}. """
+        self.difficulties = []
+
+        """ The map's hash as the game computes it, None if a file it needs is broken. """
+        self.hash = None
+
+        """ What stops the game from loading the map. Empty if the map is fine. """
+        self.errors = []
+
+        """ What is wrong with the map that the game works around, e.g. a missing cover. """
+        self.warnings = []
+
+        """ The folder's signature when it was verified. See folder_signature(). """
+        self.signature = None
+
+        """ Number of seconds that verifying the folder took. """
+        self.elapsed = 0.0
+
+
+    @property
+    def ok(self):
+        """True if the game can load the map."""
+        return not self.errors
+
+
+    def to_dict(self):
+        """Return the report as a dict that can be written as JSON."""
+        return {'song_folder': self.song_folder, 'key': self.key, 'title': self.title,
+                'artist': self.artist, 'mapper': self.mapper, 'bpm': self.bpm,
+                'difficulties': self.difficulties, 'hash': self.hash, 'ok': self.ok,
+                'errors': self.errors, 'warnings': self.warnings, 'signature': self.signature,
+                'elapsed': self.elapsed}
+
+
+    @staticmethod
+    def from_dict(report_dict):
+        """Return the MapReport that to_dict() turned into report_dict."""
+        report = MapReport(report_dict['song_folder'])
+
+        for field in ('key', 'title', 'artist', 'mapper', 'bpm', 'difficulties', 'hash',
+                      'errors', 'warnings', 'signature', 'elapsed'):
+            setattr(report, field, report_dict.get(field, getattr(report, field)))
+
+        return report
+
+
+    def __repr__(self):
+        return (f"MapReport(song_folder={self.song_folder!r}, hash={self.hash!r}, "
+                f"errors={self.errors!r}, warnings={self.warnings!r})")
+
+
+class VerificationReport():
+    """The outcome of verifying every song folder in the custom_levels folder."""
+
+    def __init__(self, reports, number_verified, elapsed):
+        """Constructs a VerificationReport object.
+
+        Args:
+            reports (list(MapReport)): The report of each song folder, sorted by folder.
+
+            number_verified (int): The number of folders that were verified on this run. The
+                                   rest were unchanged, so their cached report was used.
+
+            elapsed (float): Wall clock seconds that the whole run took.
+        """
+        self.reports = reports
+        self.number_verified = number_verified
+        self.elapsed = elapsed
+
+
+    def broken(self):
+        """Return the reports of the maps that the game can not load."""
+        return [report for report in self.reports if not report.ok]
+
+
+    def by_hash(self):
+        """Return map hash -> the report of the map, for every map whose hash is known."""
+        return {report.hash: report for report in self.reports if report.hash is not None}
+
+
+    def __repr__(self):
+        return (f"VerificationReport(maps={len(self.reports)}, broken={len(self.broken())}, "
+                f"verified={self.number_verified}, elapsed={self.elapsed:.3f})")
+
+
+def _find_file(song_folder, file_name):
+    """Return the path of file_name in song_folder, matched without case like the game does
+    on Windows. None if there is no such file.
+    """
+    if not file_name or not isinstance(file_name, str):
+        return None
+
+    path = join(song_folder, file_name)
+
+    if isfile(path):
+        return path
+
+    return next((join(song_folder, file) for file in listdir(song_folder)
+                 if file.lower() == file_name.lower()), None)
+
+
+def _read_info(song_folder, report):
+    """Helper method for verify_song_folder().
+    Return the bytes and the parsed content of song_folder's info.dat, None if it is broken.
+    """
+    path_to_info = _find_file(song_folder, 'info.dat')
+
+    if path_to_info is None:
+        report.errors.append("info.dat is missing")
+        return None
+
+    with open(path_to_info, 'rb') as info_file:
+        info_bytes = info_file.read()
+
+    try:
+        info = json.loads(info_bytes.decode('utf-8-sig'))
+    except ValueError as e:
+        report.errors.append(f"info.dat can not be parsed: {e}")
+        return None
+
+    if not isinstance(info, dict) or '_songFilename' not in info:
+        report.errors.append("info.dat is not a map's info.dat")
+        return None
+
+    return info_bytes, info
+
+
+def _string_field(mapping, name):
+    """Return the value of name in mapping if it is a non empty string, None otherwise.
+    A hand edited info.dat can hold anything, e.g. a number where a title should be.
+    """
+    value = mapping.get(name)
+    return value if isinstance(value, str) and value else None
+
+
+def _list_field(mapping, name):
+    """Return the value of name in mapping if it is a list, an empty list otherwise."""
+    value = mapping.get(name)
+    return value if isinstance(value, list) else []
+
+
+def _count_notes(beatmap):
+    """Return the number of notes in a parsed difficulty file, of either the old (_notes)
+    or the new (colorNotes) layout.
+    """
+    notes = beatmap.get('_notes', beatmap.get('colorNotes', []))
+    return len(notes) if isinstance(notes, list) else 0
+
+
+def _check_difficulty(song_folder, characteristic, beatmap, report):
+    """Helper method for _check_difficulties().
+    Check the difficulty file of a single beatmap, recording it on report. Return the bytes
+    of the difficulty file, None if it is broken.
+    """
+    if not isinstance(beatmap, dict):
+        report.errors.append(f"info.dat lists a {characteristic} difficulty that is not a map")
+        return None
+
+    file_name = _string_field(beatmap, '_beatmapFilename') or ''
+    difficulty = {'characteristic': characteristic,
+                  'difficulty': _string_field(beatmap, '_difficulty'),
+                  'file': file_name, 'notes': None}
+    report.difficulties.append(difficulty)
+
+    path_to_beatmap = _find_file(song_folder, file_name)
+
+    if path_to_beatmap is None:
+        report.errors.append(f"difficulty file {file_name!r} is missing")
+        return None
+
+    with open(path_to_beatmap, 'rb') as beatmap_file:
+        beatmap_bytes = beatmap_file.read()
+
+    try:
+        difficulty['notes'] = _count_notes(json.loads(beatmap_bytes.decode('utf-8-sig')))
+    except (ValueError, AttributeError) as e:
+        report.errors.append(f"difficulty file {file_name} can not be parsed: {e}")
+        return None
+
+    return beatmap_bytes
+
+
+def _check_difficulties(song_folder, info, report):
+    """Helper method for verify_song_folder().
+    Check every difficulty file that info lists, recording it on report. Return the bytes
+    of each difficulty file in the order that they are listed, None if any is broken.
+    """
+    difficulty_bytes = []
+
+    for beatmap_set in _list_field(info, '_difficultyBeatmapSets'):
+        if not isinstance(beatmap_set, dict):
+            report.errors.append("info.dat lists a difficulty set that is not a set")
+            difficulty_bytes = None
+            continue
+
+        characteristic = _string_field(beatmap_set, '_beatmapCharacteristicName')
+
+        for beatmap in _list_field(beatmap_set, '_difficultyBeatmaps'):
+            beatmap_bytes = _check_difficulty(song_folder, characteristic, beatmap, report)
+
+            if beatmap_bytes is None:
+                difficulty_bytes = None
+            elif difficulty_bytes is not None:
+                difficulty_bytes.append(beatmap_bytes)
+
+    if not report.difficulties:
+        report.errors.append("info.dat lists no difficulties")
+
+    return difficulty_bytes
+
+
+def _read_metadata(info, report):
+    """Helper method for verify_song_folder().
+    Record the title, artist, mapper and bpm that info holds on report. A field of the
+    wrong type is left out.
+    """
+    report.title = ' '.join(part for part in (_string_field(info, '_songName'),
+                                              _string_field(info, '_songSubName'))
+                            if part) or None
+    report.artist = _string_field(info, '_songAuthorName')
+    report.mapper = _string_field(info, '_levelAuthorName')
+
+    bpm = info.get('_beatsPerMinute')
+    report.bpm = bpm if isinstance(bpm, (int, float)) and not isinstance(bpm, bool) else None
+
+
+def _check_empty_files(song_folder, report):
+    """Helper method for verify_song_folder().
+    Record an error on report for every empty file in song_folder, e.g. from a failed download.
+    """
+    for file in sorted(listdir(song_folder)):
+        if not file.startswith(SCRAPER_FILE_PREFIX) and stat(join(song_folder, file)).st_size == 0:
+            report.errors.append(f"{file} is empty")
+
+
+def _check_audio(song_folder, info, report):
+    """Helper method for verify_song_folder().
+    Check that the audio file that info names is there and is a whole ogg file.
+    """
+    path_to_audio = _find_file(song_folder, _string_field(info, '_songFilename'))
+
+    if path_to_audio is None:
+        report.errors.append(f"audio file {info.get('_songFilename')!r} is missing")
+        return
+
+    ogg_error = check_ogg_file(path_to_audio)
+
+    if ogg_error is not None:
+        report.errors.append(f"audio file {basename(path_to_audio)} is broken: {ogg_error}")
+
+
+def _check_cover(song_folder, info, report):
+    """Helper method for verify_song_folder().
+    Warn if info names a cover image that is not there. The game still loads the map.
+    """
+    cover_file_name = _string_field(info, '_coverImageFilename')
+
+    if cover_file_name and _find_file(song_folder, cover_file_name) is None:
+        report.warnings.append(f"cover image {cover_file_name!r} is missing")
+
+
+def _map_hash(info_bytes, difficulty_bytes):
+    """Helper method for verify_song_folder().
+    Return the map's hash from the bytes of info.dat and of each difficulty file.
+    """
+    map_hash = hashlib.sha1(info_bytes)
+
+    for beatmap_bytes in difficulty_bytes:
+        map_hash.update(beatmap_bytes)
+
+    return map_hash.hexdigest().upper()
+
+
+def verify_song_folder(song_folder):
+    """Check that the map in song_folder can be loaded by the game, and read its metadata.
+
+    Args:
+        song_folder (str): The song folder that is verified.
+
+    Returns:
+        MapReport: The outcome of the verification. Errors are stored on the report instead
+                   of being raised.
+    """
+    report = MapReport(song_folder)
+    start_time = time.perf_counter()
+
+    try:
+        report.signature = folder_signature(song_folder)
+        _check_empty_files(song_folder, report)
+        info_and_bytes = _read_info(song_folder, report)
+
+        if info_and_bytes is not None:
+            info_bytes, info = info_and_bytes
+            _read_metadata(info, report)
+            _check_audio(song_folder, info, report)
+            _check_cover(song_folder, info, report)
+            difficulty_bytes = _check_difficulties(song_folder, info, report)
+
+            if difficulty_bytes is not None:
+                report.hash = _map_hash(info_bytes, difficulty_bytes)
+    except OSError as e:
+        report.errors.append(f"folder can not be read: {e}")
+    except (TypeError, ValueError, AttributeError) as e:
+        # A field of info.dat that none of the checks expected, which only breaks this map.
+        report.errors.append(f"info.dat can not be read: {e!r}")
+
+    report.elapsed = time.perf_counter() - start_time
+    return report
+
+
+def load_report(path_to_report):
+    """Return song folder -> cached MapReport, empty if there is no readable cached report."""
+    try:
+        with open(path_to_report, 'r', encoding='utf-8') as report_file:
+            cached_report = json.load(report_file)
+    except (OSError, ValueError):
+        return {}
+
+    if not isinstance(cached_report, dict) or cached_report.get('version') != REPORT_VERSION:
+        return {}
+
+    return {report_dict['song_folder']: MapReport.from_dict(report_dict)
+            for report_dict in cached_report.get('maps', [])}
+
+
+def save_report(path_to_report, reports):
+    """Write reports to path_to_report, replacing the old report in one step."""
+    with open(path_to_report + '.tmp', 'w', encoding='utf-8') as report_file:
+        json.dump({'version': REPORT_VERSION, 'maps': [report.to_dict() for report in reports]},
+                  report_file)
+
+    replace(path_to_report + '.tmp', path_to_report)
+
+
+def verify_custom_levels(path_to_custom_levels, max_workers=1, path_to_report=None,
+                         force=False):
+    """Verify every song folder in path_to_custom_levels whose cached report is out of date.
+
+    Args:
+        path_to_custom_levels (str): The location of the custom_levels/ folder.
+
+        max_workers (int, optional): The number of worker processes that verify folders in
+                                     parallel. 1 verifies every folder in this process.
+                                     Defaults to 1.
+
+        path_to_report (str, optional): Where the reports are cached. None to not cache them.
+                                         Defaults to None.
+
+        force (bool, optional): True to verify every folder again, even the unchanged ones.
+                                Defaults to False.
+
+    Returns:
+        VerificationReport: The report of every song folder, sorted by folder.
+    """
+    if max_workers < 1:
+        raise ValueError("Error: max_workers must be at least 1.")
+
+    start_time = time.perf_counter()
+    cached_reports = {} if force or path_to_report is None else load_report(path_to_report)
+    song_folders = sorted(entry.path for entry in scandir(path_to_custom_levels)
+                          if entry.is_dir())
+
+    reports = {}
+    folders_to_verify = []
+
+    for song_folder in song_folders:
+        cached_report = cached_reports.get(song_folder)
+
+        try:
+            unchanged = cached_report is not None and \
+                cached_report.signature == folder_signature(song_folder)
+        except OSError:
+            unchanged = False
+
+        if unchanged:
+            reports[song_folder] = cached_report
+        else:
+            folders_to_verify.append(song_folder)
+
+    if max_workers == 1 or len(folders_to_verify) < 2:
+        new_reports = [verify_song_folder(song_folder) for song_folder in folders_to_verify]
+    else:
+        # Imported here since multiprocessing is slow to import and only needed for a pool.
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            new_reports = list(executor.map(verify_song_folder, folders_to_verify,
+                                            chunksize=8))
+
+    for report in new_reports:
+        reports[report.song_folder] = report
+
+    sorted_reports = [reports[song_folder] for song_folder in song_folders]
+
+    if path_to_report is not None and (new_reports or cached_reports.keys() != reports.keys()):
+        save_report(path_to_report, sorted_reports)
+
+    return VerificationReport(sorted_reports, len(new_reports), time.perf_counter() - start_time)
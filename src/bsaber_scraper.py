@@ -3,15 +3,38 @@
 @file bsaber_scraper.py
 
 Main program for scraping songs that the user requests off of bsaber.com, downloading them,
-adding them to the customlevels folder, and extracing them withthe name of the song as
-the foldername.
+adding them to the customlevels folder, and extracing them with the key and name of the
+song as the foldername.
+
+Run without any arguments, it asks the user what to do. Run with a subcommand, it does the
+one thing it is told to without asking anything, and prints each result as a line of JSON
+so that it can be scripted, e.g.:
+    python bsaber_scraper.py --library ~/CustomLevels search "light it up"
+    python bsaber_scraper.py --library ~/CustomLevels search --local --installed "ligth it"
+    python bsaber_scraper.py --library ~/CustomLevels --jobs 16 download --batch keys.txt
+    python bsaber_scraper.py --library ~/CustomLevels sync new:50 top/7-days:50
+    python bsaber_scraper.py --library ~/CustomLevels verify --broken
+    python bsaber_scraper.py --library ~/CustomLevels index --rebuild
+    python bsaber_scraper.py --library ~/CustomLevels --blob-store ~/SongBlobs gc
+Every subcommand runs in one process over one shared session. See --help for the rest.
 """
 
 # For scraping, downloading, and extracting beatsaber custom songs.
-from bsaber.scraper import SongScraper
+from bsaber.scraper import SongScraper, METADATA_BACKENDS
+from bsaber.song import Song, SongCollection
+from bsaber.sync import SyncRule, SyncReport, stream_sync
+from bsaber.song_index import song_key_from_download_link
 
+# Handling the command line and the JSON lines that are printed.
+from os import environ
+from os.path import join
+import argparse
+import json
+import sys
 
-"""Path to the location where custom levels are stored in your beatsaber game."""
+
+"""Path to the location where custom levels are stored in your beatsaber game.
+   --library, or the BSABER_LIBRARY environment variable, is used instead when given."""
 CUSTOM_LEVEL_FOLDER = "D:\Games\Beat.Saber.v1.7.0.ALL.DLC\Beat Saber\Beat Saber_Data\CustomLevels"
 
 
@@ -90,14 +113,15 @@ def get_time_period_option_from_user():
         print(f"\nSorry, {time_period} is not a valid option.")
 
 
-def display_songs_in_scrapped_dict(scrapped_songs_dict):
+def display_scrapped_songs(scrapped_songs):
     """Display the songs that the user can pick from to download.
 
     Args:
-        scrapped_songs_dict dict(str, str): dict containing the songs that a user can download.
+        scrapped_songs (SongCollection): The songs that a user can download.
     """
-    for i in range(1, len(scrapped_songs_dict) + 1):
-        print(f"{i}. {list(scrapped_songs_dict.keys())[i - 1]}")
+    for i, song in enumerate(scrapped_songs, start=1):
+        mapper = f" (mapped by {song.mapper})" if song.mapper else ""
+        print(f"{i}. {song.title}{mapper}")
 
 
 def display_other_options():
@@ -108,17 +132,17 @@ def display_other_options():
     print("q - to quit")
 
 
-def get_user_option(scrapped_songs_dict):
+def get_user_option(scrapped_songs):
     """Return the selected option for the action that the user wants to take in the program.
 
     Args:
-        scrapped_songs_dict (dict[str, str]): Dict <song name> -> <song download link>.
+        scrapped_songs (SongCollection): The songs that a user can download.
 
     Returns:
         (str, int): The option that the user wants to take in the program.
     """
     while True:
-        display_songs_in_scrapped_dict(scrapped_songs_dict)
+        display_scrapped_songs(scrapped_songs)
         display_other_options()
 
         user_option = input("\nSelect the song you want to download or "
@@ -129,7 +153,7 @@ def get_user_option(scrapped_songs_dict):
         if user_option.isdigit():
             song_number = int(user_option)
 
-            if song_number in range(1, len(scrapped_songs_dict) + 1):
+            if song_number in range(1, len(scrapped_songs) + 1):
                 return user_option
             print("\nError, please choose a valid number.\n")
 
@@ -142,93 +166,405 @@ def get_user_option(scrapped_songs_dict):
 
 
 
-def add_new_record_to_dict_of_songs_to_download(scrapped_songs_dict, dict_of_songs,
-                                                selected_song_number):
-    """Add the song that the user wants to download our dict of songs to download.
+def add_new_song_to_songs_to_download(scrapped_songs, songs_to_download, selected_song_number):
+    """Add the song that the user wants to download to our collection of songs to download.
 
     Args:
-        scrapped_songs_dict (dict[str, str]): Contains all the songs that we have scrapped from
-                                              bsaber.com
+        scrapped_songs (SongCollection): Contains all the songs that we have scrapped from
+                                         bsaber.com
 
-        dict_of_songs (dict[str, str]): Contains all of the songs that the user wants to download.
+        songs_to_download (SongCollection): Contains all of the songs that the user wants to
+                                            download.
 
-        selected_song_number (int): The number that maps to which song in the scrapped_songs_dict
+        selected_song_number (int): The number that maps to which song in the scrapped_songs
                                     that the user wants to download.
     """
-    # Convert the dict of songs that we have to a list of tuples where each entry is
-    # (name of the song, the link to download the song).
-    #
-    # This is really useful because now we can map our selected_song_number that the user choose
-    # to the entry in the scrapped_songs_dict.
-    list_of_song_names = list(scrapped_songs_dict)
-    song_user_wants_to_download = list_of_song_names[selected_song_number - 1]
-    dict_of_songs[song_user_wants_to_download] = scrapped_songs_dict[song_user_wants_to_download]
+    songs_to_download.add(scrapped_songs[selected_song_number - 1])
 
 
-def download_songs_exit_program(scraper, dict_of_songs_to_download):
-    """Download songs contained in passed in dict and exit the program.
+def download_songs_exit_program(scraper, songs_to_download):
+    """Download songs contained in passed in collection and exit the program.
 
     Args:
-        scraper (SongScraper): The Scraper object used to download in the passed in dict.
+        scraper (SongScraper): The Scraper object used to download in the passed in songs.
 
-        dict_of_songs_to_download (dict[str, str]): Dict of song names mapped to the
-                                                    download link of the song.
+        songs_to_download (SongCollection): The songs the user wants to download.
     """
-    scraper.download_extract_songs(dict_of_songs_to_download)
+    scraper.download_extract_songs(songs_to_download, pipelined=True)
 
-    if dict_of_songs_to_download:
+    if songs_to_download:
         print("The following songs have been downloaded and extracted: ")
 
-        for downloaded_song in dict_of_songs_to_download:
-            print(f"\t{downloaded_song}")
+        for downloaded_song in songs_to_download:
+            print(f"\t{downloaded_song.title}")
 
         print("\nHave a good day!\n")
 
     exit(0)
 
 
-def main():
-    # All songs that the user is going to download will go here.
-    # At the end of the method these will be downloaded and extracted.
-    dict_of_songs_to_download = {}
-    scraper = SongScraper(CUSTOM_LEVEL_FOLDER)
+def get_song_query_from_user(scraper):
+    """Ask the user what songs they want to look through, and return a function that fetches
+    any page of those songs.
 
-    while True:
-        scraped_songs_dict = {}
+    Args:
+        scraper (SongScraper): The Scraper object used to fetch the songs.
+
+    Returns:
+        function(int) -> SongCollection: Returns the songs on the given page number.
+    """
+    if user_wants_to_search_for_specific_song():
+        # The user is going to search for a song via the search bar on bsaber.com.
+        song_user_wants_to_search_for = input("Enter the song you want to search for: ")
+
+        return lambda page: scraper.get_searched_for_song_results(song=song_user_wants_to_search_for,
+                                                                  page=page)
 
-        if user_wants_to_search_for_specific_song():
-            # The user is going to search for a song via the search bar on bsaber.com.
-            song_user_wants_to_search_for = input("Enter the song you want to search for: ")
+    # The user is going to query for a song by providing a sorting type and a time period.
+    sorting_option = get_sorting_option_from_user()
 
-            scraped_songs_dict = \
-                scraper.get_searched_for_song_results(song=song_user_wants_to_search_for)
-        else:
-            # The user is going to query for a song by providing a sorting type and a time period.
-            sorting_option = get_sorting_option_from_user()
+    # If new is given to scrape_songs(), then we do not ask for a time period because
+    # scrape_songs() is called with 'all' by default when sorted_by is given.
+    time_period = 'all' if sorting_option == 'new' else get_time_period_option_from_user()
 
-            # If new is given to scrape_songs(), then we do not ask for a time period because
-            # scrape_songs() is called with 'all' by default when sorted_by is given.
-            time_period = 'all' if sorting_option == 'new' else get_time_period_option_from_user()
+    return lambda page: scraper.get_song_results(sorted_by=sorting_option, time_period=time_period,
+                                                 page=page)
 
-            scraped_songs_dict = scraper.get_song_results(sorted_by=sorting_option,
-                                                          time_period=time_period)
+
+def run_interactive(scraper):
+    """Ask the user which songs they want, page by page, then download and extract them.
+
+    Args:
+        scraper (SongScraper): The Scraper object used to find and download the songs.
+    """
+    # All songs that the user is going to download will go here.
+    # At the end of the method these will be downloaded and extracted.
+    songs_to_download = SongCollection()
+
+    # The songs the user is currently looking through, and the page of them they are on.
+    get_page_of_songs = None
+    page = 1
+
+    while True:
+        if get_page_of_songs is None:
+            get_page_of_songs = get_song_query_from_user(scraper)
+            page = 1
+
+        scraped_songs = get_page_of_songs(page)
 
         # User decides if they want to download a song, go to next/previous page of songs, or quit.
-        user_option = get_user_option(scraped_songs_dict)
+        user_option = get_user_option(scraped_songs)
 
         # The user wants to quit the program, let's exit.
         if user_option in ['q', 'quit']:
-            download_songs_exit_program(scraper, dict_of_songs_to_download)
+            download_songs_exit_program(scraper, songs_to_download)
+
+        # Same songs, just the next or previous page of them.
+        elif user_option == '>':
+            page += 1
+            continue
+
+        elif user_option == '<':
+            page = max(1, page - 1)
+            continue
 
         # Since the input is a digit, we know that the user wants to download a song,
-        # so we can go ahead and add that song to our dict of songs that we will download.
+        # so we can go ahead and add that song to our collection of songs that we will download.
         elif user_option.isdigit():
 
-            add_new_record_to_dict_of_songs_to_download(scrapped_songs_dict=scraped_songs_dict,
-                                                        dict_of_songs=dict_of_songs_to_download,
-                                                        selected_song_number=int(user_option))
+            add_new_song_to_songs_to_download(scrapped_songs=scraped_songs,
+                                              songs_to_download=songs_to_download,
+                                              selected_song_number=int(user_option))
+
+        get_page_of_songs = None
+        print(f"\nCurrent list of downloaded songs: {[song.title for song in songs_to_download]}")
+
+
+def print_json_line(record):
+    """Print record as a single line of JSON, right away so that it can be piped."""
+    print(json.dumps(record, default=str), flush=True)
+
+
+def song_to_dict(song):
+    """Return the fields of a Song or ListingRecord/SongRecord that are printed."""
+    return {'key': song.key, 'title': song.title, 'mapper': song.mapper,
+            'download_link': getattr(song, 'download_link', None)}
+
+
+def search_hit_to_dict(search_hit):
+    """Return the fields of a SearchHit that are printed."""
+    return {'key': search_hit.key, 'title': search_hit.title, 'artist': search_hit.artist,
+            'mapper': search_hit.mapper, 'installed': search_hit.installed,
+            'score': round(search_hit.score, 3)}
+
+
+def download_result_to_dict(download_result):
+    """Return the fields of a DownloadResult that are printed."""
+    return {'key': song_key_from_download_link(download_result.url),
+            'title': download_result.song,
+            'success': download_result.success,
+            'skipped': download_result.skipped,
+            'bytes': download_result.bytes_written,
+            'attempts': download_result.attempts,
+            'elapsed': round(download_result.elapsed, 3),
+            'error': None if download_result.error is None else str(download_result.error)}
+
+
+def extraction_result_to_dict(extraction_result):
+    """Return the fields of an ExtractionResult that are printed."""
+    return {'song_folder': extraction_result.song_folder,
+            'success': extraction_result.success,
+            'skipped': extraction_result.skipped,
+            'elapsed': round(extraction_result.elapsed, 3),
+            'error': None if extraction_result.error is None else str(extraction_result.error)}
+
+
+def pipeline_result_to_dict(pipeline_result):
+    """Return the fields of a PipelineResult that are printed."""
+    record = download_result_to_dict(pipeline_result.download_result)
+    record['success'] = pipeline_result.success
+    record['error'] = None if pipeline_result.error is None else str(pipeline_result.error)
+
+    if pipeline_result.extraction_result is not None:
+        record['song_folder'] = pipeline_result.extraction_result.song_folder
+
+    return record
+
+
+def read_batch_file(path_to_batch_file):
+    """Return the lines of a batch file, leaving out blank lines and '#' comments.
+
+    Args:
+        path_to_batch_file (str): The file to read, '-' for stdin.
+    """
+    if path_to_batch_file == '-':
+        lines = sys.stdin.readlines()
+    else:
+        with open(path_to_batch_file, 'r', encoding='utf-8') as batch_file:
+            lines = batch_file.readlines()
+
+    return [line.strip() for line in lines if line.strip() and not line.lstrip().startswith('#')]
+
+
+def arguments_and_batch(values, path_to_batch_file):
+    """Return the values given on the command line followed by the lines of the batch file."""
+    return list(values) + (read_batch_file(path_to_batch_file) if path_to_batch_file else [])
+
+
+def run_search(scraper, arguments):
+    """Print every song found by each search query. --local only searches the installed and
+    already seen songs, --remote skips them and only searches the site.
+    """
+    for query in arguments_and_batch(arguments.queries, arguments.batch):
+        if arguments.local or arguments.installed:
+            for search_hit in scraper.search_local(query, limit=arguments.limit,
+                                                   installed_only=arguments.installed):
+                print_json_line(dict(search_hit_to_dict(search_hit), query=query))
+            continue
+
+        for song in scraper.get_searched_for_song_results(query, page=arguments.page,
+                                                          remote=arguments.remote):
+            print_json_line(dict(song_to_dict(song), query=query))
+
+
+def run_list(scraper, arguments):
+    """Print the songs of a listing, e.g. the top 50 of the last 7 days."""
+    for record in scraper.crawl_songs(arguments.sorted_by, arguments.time_period,
+                                      number_of_songs=arguments.songs, max_workers=arguments.jobs):
+        print_json_line(dict(song_to_dict(record),
+                             download_link=scraper.download_link_for_record(record)))
+
+
+def songs_for_keys(scraper, keys):
+    """Return the SongCollection of the songs with the given keys. The titles are looked up
+    with the beatsaver API, and a song that could not be looked up is named after its key.
+    """
+    try:
+        records_by_key = scraper.get_songs_by_keys(keys)
+    except Exception as e:
+        print(f"Could not look up the titles of the songs ({e}), naming them by key.",
+              file=sys.stderr)
+        records_by_key = {}
+
+    songs = SongCollection()
+
+    for key in keys:
+        record = records_by_key.get(key)
+        songs.add(Song(key, key, scraper.download_link_for_key(key)) if record is None
+                  else Song.from_record(record, scraper.download_link_for_record(record)))
+
+    return songs
+
+
+def run_download(scraper, arguments):
+    """Download, and unless --no-extract is given extract, the songs with the given keys."""
+    songs = songs_for_keys(scraper, arguments_and_batch(arguments.keys, arguments.batch))
+
+    if arguments.no_extract:
+        for result in scraper.download_songs(songs, display_error_message=False,
+                                             max_workers=arguments.jobs,
+                                             skip_installed=not arguments.force):
+            print_json_line(download_result_to_dict(result))
+        return
+
+    for result in scraper.download_extract_songs(songs, display_error_message=False,
+                                                 pipelined=True, max_workers=arguments.jobs,
+                                                 keep_zipfiles=arguments.keep_zipfiles,
+                                                 skip_installed=not arguments.force):
+        print_json_line(pipeline_result_to_dict(result))
+
+
+def run_extract(scraper, arguments):
+    """Extract every zipfile in the library."""
+    extraction_summary = scraper.extract_all_songs_in_custom_levels_folder(
+        display_error_message=False, max_workers=arguments.jobs)
+
+    for result in extraction_summary.results:
+        print_json_line(extraction_result_to_dict(result))
+
+
+def run_verify(scraper, arguments):
+    """Print the report of every song folder in the library, or only of the broken ones."""
+    verification_report = scraper.library().verify(max_workers=arguments.jobs,
+                                                   force=arguments.force)
+
+    for report in verification_report.reports:
+        if report.ok and arguments.broken:
+            continue
 
-        print(f"\nCurrent list of downloaded songs: {[song for song in dict_of_songs_to_download]}")
+        report_dict = report.to_dict()
+        del report_dict['signature']
+        report_dict['elapsed'] = round(report_dict['elapsed'], 3)
+        print_json_line(report_dict)
+
+    print_json_line({'maps': len(verification_report.reports),
+                     'broken': len(verification_report.broken()),
+                     'verified': verification_report.number_verified,
+                     'elapsed': round(verification_report.elapsed, 3)})
+
+
+def run_sync(scraper, arguments):
+    """Install every song covered by the given sync rules that is not installed yet."""
+    rules = [SyncRule.from_string(rule)
+             for rule in arguments_and_batch(arguments.rules, arguments.batch)]
+    path_to_cursor = arguments.cursor or join(arguments.library, 'bsaber_sync_cursor.json')
+    report = SyncReport()
+
+    # Each result is printed as soon as its song is installed, and none of them are kept.
+    for _, result in stream_sync(scraper, rules, report, path_to_cursor=path_to_cursor,
+                                 display_error_message=False, max_workers=arguments.jobs):
+        print_json_line(pipeline_result_to_dict(result))
+
+    print_json_line({'songs_crawled': report.songs_crawled,
+                     'installed': report.number_installed,
+                     'failed': report.number_failed})
+
+
+def run_index(scraper, arguments):
+    """Print every song in the index of installed songs, rebuilding it first if asked to."""
+    if arguments.rebuild:
+        scraper.rebuild_song_index()
+
+    song_index = scraper.song_index()
+
+    for key in sorted(song_index.installed_keys()):
+        print_json_line(song_index.get(key))
+
+
+def run_gc(scraper, arguments):
+    """Remove the files in the blob store that no song folder uses anymore."""
+    if arguments.blob_store is None:
+        sys.exit("Error: gc needs the blob store to clean up, given with --blob-store.")
+
+    number_of_files_removed, number_of_bytes_freed = scraper.library().garbage_collect_blob_store()
+    print_json_line({'files_removed': number_of_files_removed,
+                     'bytes_freed': number_of_bytes_freed})
+
+
+def parse_arguments(argv):
+    """Return the parsed command line. No subcommand means that the user is asked instead."""
+    parser = argparse.ArgumentParser(description='Find, download and extract custom beatsaber '
+                                                 'songs. Run without a subcommand to be asked.')
+    parser.add_argument('--library', default=environ.get('BSABER_LIBRARY', CUSTOM_LEVEL_FOLDER),
+                        help='the CustomLevels folder (default: $BSABER_LIBRARY)')
+    parser.add_argument('--jobs', type=int, default=8,
+                        help='songs or pages worked on at once (default: 8)')
+    parser.add_argument('--backend', choices=METADATA_BACKENDS, default='html',
+                        help='where listings and searches come from (default: html)')
+    parser.add_argument('--blob-store', help='store song files once in this folder')
+    subparsers = parser.add_subparsers(dest='command')
+
+    search_parser = subparsers.add_parser('search', help='search for songs')
+    search_parser.add_argument('queries', nargs='*', help='what to search for')
+    search_parser.add_argument('--batch', help="file of queries, one per line, '-' for stdin")
+    search_parser.add_argument('--page', type=int, default=1,
+                               help='page of results, the local hits come before the site\'s')
+    search_parser.add_argument('--local', action='store_true',
+                               help='only search the installed and already seen songs')
+    search_parser.add_argument('--installed', action='store_true',
+                               help='only search the installed songs, implies --local')
+    search_parser.add_argument('--remote', action='store_true',
+                               help='only search the site, so --page is the site\'s page')
+    search_parser.add_argument('--limit', type=int, default=20,
+                               help='most songs printed per query with --local (default: 20)')
+    search_parser.set_defaults(run=run_search)
+
+    list_parser = subparsers.add_parser('list', help='list the songs of a listing')
+    list_parser.add_argument('sorted_by', choices=['new', 'top', 'most-difficult'])
+    list_parser.add_argument('time_period', nargs='?', default='all',
+                             choices=['24-hours', '7-days', '30-days', '3-months', 'all'])
+    list_parser.add_argument('--songs', type=int, default=20, help='songs to list (default: 20)')
+    list_parser.set_defaults(run=run_list)
+
+    download_parser = subparsers.add_parser('download', help='download songs by beatsaver key')
+    download_parser.add_argument('keys', nargs='*', help='beatsaver keys of the songs')
+    download_parser.add_argument('--batch', help="file of keys, one per line, '-' for stdin")
+    download_parser.add_argument('--no-extract', action='store_true',
+                                 help="only download each song's zipfile")
+    download_parser.add_argument('--keep-zipfiles', action='store_true',
+                                 help="keep each song's zipfile after extracting it")
+    download_parser.add_argument('--force', action='store_true',
+                                 help='download songs that are already installed too')
+    download_parser.set_defaults(run=run_download)
+
+    extract_parser = subparsers.add_parser('extract', help='extract every zipfile in the library')
+    extract_parser.set_defaults(run=run_extract)
+
+    verify_parser = subparsers.add_parser('verify', help='check that the game can load each song')
+    verify_parser.add_argument('--broken', action='store_true',
+                               help='only print the songs that the game can not load')
+    verify_parser.add_argument('--force', action='store_true',
+                               help='verify every song again, even the unchanged ones')
+    verify_parser.set_defaults(run=run_verify)
+
+    sync_parser = subparsers.add_parser('sync', help='install the songs covered by sync rules')
+    sync_parser.add_argument('rules', nargs='*', help="e.g. 'new:50' or 'top/7-days:50'")
+    sync_parser.add_argument('--batch', help="file of rules, one per line, '-' for stdin")
+    sync_parser.add_argument('--cursor', help='where the sync cursor is kept '
+                                              '(default: bsaber_sync_cursor.json in the library)')
+    sync_parser.set_defaults(run=run_sync)
+
+    index_parser = subparsers.add_parser('index', help='print the index of installed songs')
+    index_parser.add_argument('--rebuild', action='store_true',
+                              help='rebuild the index from the song folders first')
+    index_parser.set_defaults(run=run_index)
+
+    gc_parser = subparsers.add_parser('gc', help='remove the blob store files that no song uses')
+    gc_parser.set_defaults(run=run_gc)
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
+    scraper = SongScraper(arguments.library, metadata_backend=arguments.backend,
+                          path_to_blob_store=arguments.blob_store)
+
+    if arguments.command is None:
+        run_interactive(scraper)
+        return
+
+    arguments.run(scraper, arguments)
 
 
 if __name__ == "__main__":
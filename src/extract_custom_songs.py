@@ -8,18 +8,27 @@ NOTE: This program assumes that you downloaded you beatsaber zipfiles
       directly in the custom_levels folder.
 """
 
-# Extracting beatsaber zipfiles to the correct place.
-from bsaber.scraper import SongScraper
+# Extracting beatsaber zipfiles to the correct place, without loading the web stack.
+from bsaber.library import SongLibrary
 
+# Picking how many songs are extracted in parallel, and where.
+from os import cpu_count, environ
 
-""" Path to custom level folder. Each user has it saved somewhere different. """
+
+""" Path to custom level folder. Each user has it saved somewhere different, so the
+    BSABER_LIBRARY environment variable is used instead when it is set. """
 CUSTOM_LEVEL_FOLDER = "D:\Games\Beat.Saber.v1.7.0.ALL.DLC\Beat Saber\Beat Saber_Data\CustomLevels"
 
 
 def main():
-    scraper = SongScraper(CUSTOM_LEVEL_FOLDER)
-    scraper.extract_all_songs_in_custom_levels_folder()
-    print("All songs have been extracted.")
+    path_to_custom_levels = environ.get('BSABER_LIBRARY', CUSTOM_LEVEL_FOLDER)
+    library = SongLibrary(path_to_custom_levels)
+    extraction_summary = \
+        library.extract_all_songs_in_custom_levels_folder(max_workers=cpu_count() or 1)
+
+    print(f"{len(extraction_summary.extracted())} songs have been extracted, "
+          f"{len(extraction_summary.skipped())} were already extracted and "
+          f"{len(extraction_summary.failed())} failed ({extraction_summary.elapsed:.2f}s).")
 
 
 if __name__ == "__main__":
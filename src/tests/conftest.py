@@ -0,0 +1,19 @@
+"""
+@author Eric Zair
+@file conftest.py
+
+Shared setup for the tests. Run from the src/ folder:
+    python -m pytest -q
+"""
+
+# Handling file system navigation and paths.
+from os.path import join, dirname, abspath
+import sys
+
+
+""" The src/ folder, which holds the bsaber package and the bench/ folder. """
+SRC_FOLDER = dirname(dirname(abspath(__file__)))
+
+# Makes the bsaber package and bench/fixture_server.py importable from anywhere.
+sys.path.insert(0, SRC_FOLDER)
+sys.path.insert(0, join(SRC_FOLDER, 'bench'))
@@ -0,0 +1,107 @@
+"""
+@author Eric Zair
+@file scripted_server.py
+
+Contains the ScriptedServer object, a local http server that the tests script answer by
+answer, e.g. to send a 416, a 429 with a Retry-After or a corrupt zipfile on cue, and the
+RepeatingServer object, a FixtureServer that never ends its listings.
+"""
+
+# Handling the http server.
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+import time
+import re
+
+from fixture_server import FixtureServer, PAGE_PATTERN, build_song_zipfile
+
+
+""" Bytes of the song that the 'song' answer serves. """
+SONG_ZIPFILE = build_song_zipfile('1a2b', 16 * 1024)
+
+
+class ScriptedServer():
+    """Local http server that answers each request with the next answer of its script, and
+    remembers the Range header and the time of each request.
+
+    An answer is 'song' to serve SONG_ZIPFILE, honoring Range, a (status, body) tuple, or a
+    (status, body, headers) tuple.
+    """
+
+    def __init__(self, script):
+        self.script = list(script)
+
+        """ Range header of each request, None for a request without one. """
+        self.ranges = []
+
+        """ time.monotonic() of each request. """
+        self.request_times = []
+
+        self.__http_server = ThreadingHTTPServer(('127.0.0.1', 0), self.__handler_class())
+        self.__http_server.daemon_threads = True
+
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.__http_server.server_port}/api/download/key/1a2b'
+
+
+    def __handler_class(self):
+        scripted_server = self
+
+        class ScriptedRequestHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                scripted_server.ranges.append(self.headers.get('Range'))
+                scripted_server.request_times.append(time.monotonic())
+                answer = scripted_server.script.pop(0)
+                range_match = re.match(r'bytes=(\d+)-$', self.headers.get('Range', ''))
+                headers = {}
+
+                if answer != 'song':
+                    status, body, *headers = answer
+                    headers = headers[0] if headers else {}
+                    self.send_response(status)
+                elif range_match:
+                    body = SONG_ZIPFILE[int(range_match.group(1)):]
+                    self.send_response(206)
+                else:
+                    body = SONG_ZIPFILE
+                    self.send_response(200)
+
+                for name, value in headers.items():
+                    self.send_header(name, value)
+
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return ScriptedRequestHandler
+
+
+    def __enter__(self):
+        Thread(target=self.__http_server.serve_forever, args=(0.05,), daemon=True).start()
+        return self
+
+
+    def __exit__(self, *exception_info):
+        self.__http_server.shutdown()
+        self.__http_server.server_close()
+
+
+class RepeatingServer(FixtureServer):
+    """FixtureServer that answers every page past the last one with the last page, instead
+    of a 404, like sites that repeat their last page of songs.
+    """
+
+    def listing_page(self, path, query):
+        page_match = PAGE_PATTERN.search(path)
+
+        if page_match and int(page_match.group(1)) > self.number_of_pages:
+            path = f'{path[:page_match.start(1)]}{self.number_of_pages}{path[page_match.end(1):]}'
+
+        return super().listing_page(path, query)
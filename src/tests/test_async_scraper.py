@@ -0,0 +1,182 @@
+"""
+@author Eric Zair
+@file test_async_scraper.py
+
+Tests of AsyncSongScraper against a local FixtureServer, and of the RateGovernor permits
+that it sends every request inside of.
+"""
+
+# Running the coroutines.
+import asyncio
+import time
+
+import aiohttp
+import pytest
+
+from fixture_server import FixtureServer
+from scripted_server import ScriptedServer, RepeatingServer, SONG_ZIPFILE
+from bsaber.async_scraper import AsyncSongScraper
+from bsaber.rate_governor import RateGovernor, HostBudget
+from bsaber.response_cache import MemoryResponseCache
+from bsaber.song import Song, SongCollection
+
+
+@pytest.fixture(scope='module')
+def server():
+    with FixtureServer(number_of_pages=5, zipfile_size=4 * 1024) as server:
+        yield server
+
+
+def build_scraper(server, path_to_custom_levels, **options):
+    return AsyncSongScraper(str(path_to_custom_levels), bsaber_site=server.bsaber_site,
+                            beatsaver_download_url=server.beatsaver_download_url,
+                            response_cache=MemoryResponseCache(), backoff=0, **options)
+
+
+def run(scraper, coroutine_function):
+    """Run coroutine_function(scraper) in a new event loop, closing the scraper after."""
+    async def run_and_close():
+        async with scraper:
+            return await coroutine_function(scraper)
+
+    return asyncio.run(run_and_close())
+
+
+def test_get_song_results(tmp_path, server):
+    songs = run(build_scraper(server, tmp_path), lambda scraper: scraper.get_song_results('new'))
+
+    assert isinstance(songs, SongCollection) and len(songs) == 20
+    assert all(song.download_link == server.beatsaver_download_url + song.key for song in songs)
+
+
+def test_crawl_to_the_end_of_the_listing(tmp_path, server):
+    async def crawl(scraper):
+        return [record.key async for record in scraper.crawl_songs('new', number_of_songs=1000)]
+
+    keys = run(build_scraper(server, tmp_path), crawl)
+
+    # 5 pages of 20 songs, then a 404 ends the listing.
+    assert len(keys) == 100 and len(set(keys)) == 100
+
+
+def test_crawl_stops_at_number_of_songs(tmp_path, server):
+    async def crawl(scraper):
+        return [record.key async for record in scraper.crawl_songs('top', 'all',
+                                                                   number_of_songs=30)]
+
+    assert len(run(build_scraper(server, tmp_path), crawl)) == 30
+
+
+def test_search_pages_through_the_site(tmp_path, server):
+    songs = run(build_scraper(server, tmp_path),
+                lambda scraper: scraper.get_searched_for_song_results('light', remote=True))
+
+    assert len(songs) == 12
+
+
+def test_download_extract_songs(tmp_path, server):
+    songs = SongCollection(Song(key, f'Song {key}', server.beatsaver_download_url + key)
+                           for key in ['a1', 'a2', 'a3'])
+    scraper = build_scraper(server, tmp_path)
+    summary = run(scraper, lambda scraper: scraper.download_extract_songs(songs, max_workers=2))
+
+    assert len(summary.extracted()) == 3
+    assert scraper.library().song_index().installed_keys() == {'a1', 'a2', 'a3'}
+    assert (tmp_path / 'a2 (Song a2)' / 'info.dat').is_file()
+
+    # Installed songs are skipped by the next run.
+    summary = run(build_scraper(server, tmp_path),
+                  lambda scraper: scraper.download_extract_songs(songs))
+    assert summary.results == []
+
+
+def test_not_found_page_raises(tmp_path, server):
+    with pytest.raises(aiohttp.ClientResponseError):
+        run(build_scraper(server, tmp_path),
+            lambda scraper: scraper.get_song_results('new', page=99))
+
+
+def test_every_request_goes_through_the_governor(tmp_path, server):
+    rate_governor = RateGovernor()
+    songs = SongCollection([Song('b1', 'Song b1', server.beatsaver_download_url + 'b1')])
+
+    async def fetch_and_download(scraper):
+        await scraper.get_song_results('new')
+        return await scraper.download_songs(songs)
+
+    run(build_scraper(server, tmp_path, rate_governor=rate_governor), fetch_and_download)
+
+    assert list(rate_governor.concurrency_limits()) == [server.bsaber_site.split('/')[2]]
+
+
+def test_retry_after_pauses_the_host(tmp_path):
+    rate_governor = RateGovernor()
+
+    with ScriptedServer([(503, b'busy', {'Retry-After': '1'}), 'song']) as scripted_server:
+        songs = SongCollection([Song('1a2b', 'Song', scripted_server.url)])
+        results = run(AsyncSongScraper(str(tmp_path), rate_governor=rate_governor, backoff=0),
+                      lambda scraper: scraper.download_songs(songs))
+
+    assert results[0].success and results[0].attempts == 2
+    assert scripted_server.request_times[1] - scripted_server.request_times[0] >= 0.9
+    assert (tmp_path / '1a2b (Song).zip').read_bytes() == SONG_ZIPFILE
+
+
+def test_governor_limits_open_requests_from_the_event_loop():
+    rate_governor = RateGovernor(default_budget=HostBudget(max_concurrency=2))
+    open_requests = 0
+    most_open_requests = 0
+
+    async def request():
+        nonlocal open_requests, most_open_requests
+
+        async with rate_governor.limit('http://host.test/') as permit:
+            open_requests += 1
+            most_open_requests = max(most_open_requests, open_requests)
+            await asyncio.sleep(0.02)
+            permit.record(200)
+            open_requests -= 1
+
+    async def main():
+        await asyncio.gather(*(request() for _ in range(8)))
+
+    asyncio.run(main())
+
+    assert most_open_requests == 2
+
+
+def test_cancelled_request_hands_its_permit_back():
+    rate_governor = RateGovernor(default_budget=HostBudget(max_concurrency=1))
+
+    async def hold_forever():
+        async with rate_governor.limit('http://host.test/'):
+            await asyncio.sleep(60)
+
+    async def main():
+        holder = asyncio.create_task(hold_forever())
+        await asyncio.sleep(0.05)
+        holder.cancel()
+
+        # The host's only permit is free again, and cancelling was not read as congestion.
+        async with rate_governor.limit('http://host.test/'):
+            pass
+
+        return rate_governor.concurrency_limits()
+
+    start_time = time.monotonic()
+    assert asyncio.run(asyncio.wait_for(main(), 5)) == {'host.test': 1}
+    assert time.monotonic() - start_time < 5
+
+
+def test_crawl_ends_when_the_site_repeats_its_last_page(tmp_path):
+    async def crawl(scraper):
+        async def keys():
+            return [record.key async for record in scraper.crawl_songs('new', number_of_songs=1000)]
+
+        # A crawl that never ends fails the test instead of hanging it.
+        return await asyncio.wait_for(keys(), timeout=10)
+
+    with RepeatingServer(number_of_pages=2, zipfile_size=4 * 1024) as server:
+        keys = run(build_scraper(server, tmp_path), crawl)
+
+    assert len(keys) == 40 and len(set(keys)) == 40
@@ -0,0 +1,143 @@
+"""
+@author Eric Zair
+@file test_beatsaver_api.py
+
+Tests of reading answers from the beatsaver API, and of downloading the songs it finds from
+the link that it gives for them.
+"""
+
+# Building the answers.
+import json
+
+import pytest
+
+from fixture_server import FixtureServer
+from bsaber.beatsaver_api import parse_songs, batch_urls, MAX_KEYS_PER_BATCH
+from bsaber.scraper import SongScraper
+from bsaber.song import SongCollection
+
+
+def build_map(key, title='Song', mapper='Mapper', download_url=None, **fields):
+    """Return a map the way the API describes it."""
+    return dict({'id': key, 'name': title, 'metadata': {'levelAuthorName': mapper,
+                                                        'duration': 120},
+                 'versions': [{'hash': f'hash-{key}', 'state': 'Published',
+                               'createdAt': '2021-01-01T00:00:00Z',
+                               'downloadURL': download_url or f'https://cdn.test/{key}.zip'}]},
+                **fields)
+
+
+def test_search_answer():
+    songs = parse_songs(json.dumps({'docs': [build_map('1a', 'First', 'Elliot'),
+                                             build_map('2b', 'Second', 'Nolan')]}))
+
+    assert [(song.key, song.title, song.mapper, song.hash, song.duration, song.download_url)
+            for song in songs] == [('1a', 'First', 'Elliot', 'hash-1a', 120,
+                                    'https://cdn.test/1a.zip'),
+                                   ('2b', 'Second', 'Nolan', 'hash-2b', 120,
+                                    'https://cdn.test/2b.zip')]
+
+
+def test_single_and_batch_lookup_answers():
+    assert [song.key for song in parse_songs(json.dumps(build_map('1a')))] == ['1a']
+
+    # A batch lookup answers null for keys that do not exist.
+    answer = {'1a': build_map('1a'), 'ffff': None, '2b': build_map('2b')}
+    assert [song.key for song in parse_songs(json.dumps(answer))] == ['1a', '2b']
+
+
+def test_latest_published_version_is_used():
+    beatmap = build_map('1a')
+    beatmap['versions'] = [
+        {'hash': 'old', 'state': 'Published', 'createdAt': '2020-01-01T00:00:00Z',
+         'downloadURL': 'https://cdn.test/old.zip'},
+        {'hash': 'new', 'state': 'Published', 'createdAt': '2021-06-01T00:00:00Z',
+         'downloadURL': 'https://cdn.test/new.zip'},
+        {'hash': 'draft', 'state': 'Uploaded', 'createdAt': '2022-01-01T00:00:00Z',
+         'downloadURL': 'https://cdn.test/draft.zip'}]
+
+    song, = parse_songs(json.dumps(beatmap))
+
+    assert (song.hash, song.download_url) == ('new', 'https://cdn.test/new.zip')
+
+
+def test_mapper_falls_back_to_the_uploader():
+    beatmap = build_map('1a', uploader={'name': 'Uploader'})
+    beatmap['metadata'] = None
+
+    assert parse_songs(json.dumps(beatmap))[0].mapper == 'Uploader'
+
+
+@pytest.mark.parametrize('beatmap', [None, 5, 'map', {'name': 'no key'}, {'id': 7},
+                                     build_map('1a', versions=[]),
+                                     build_map('1a', versions='not a list'),
+                                     build_map('1a', versions=[None, 3])],
+                         ids=['null', 'number', 'string', 'no key', 'key not a string',
+                              'no versions', 'versions not a list', 'malformed versions'])
+def test_malformed_maps_are_left_out(beatmap):
+    answer = {'docs': [beatmap, build_map('2b')]}
+
+    assert [song.key for song in parse_songs(json.dumps(answer))] == ['2b']
+
+
+@pytest.mark.parametrize('download_url', [5, 'file:///etc/passwd', '', ['https://x']])
+def test_download_url_that_is_not_a_web_link_is_dropped(download_url):
+    beatmap = build_map('1a')
+    beatmap['versions'][0]['downloadURL'] = download_url
+
+    assert parse_songs(json.dumps(beatmap))[0].download_url is None
+
+
+@pytest.mark.parametrize('body', ['[]', '"docs"', '{"docs": {}}', 'not json'])
+def test_answer_that_is_not_from_the_api_raises(body):
+    with pytest.raises(ValueError):
+        parse_songs(body)
+
+
+def test_batch_urls_split_the_keys():
+    keys = [f'{i:x}' for i in range(MAX_KEYS_PER_BATCH + 1)]
+    urls = batch_urls('https://api.test/', keys)
+
+    assert len(urls) == 2
+    assert urls[1] == f'https://api.test/maps/ids/{keys[-1]}'
+    assert urls[0].count(',') == MAX_KEYS_PER_BATCH - 1
+
+
+class ApiServer(FixtureServer):
+    """FixtureServer that also answers API searches. Every song's download link points at
+    the zipfile of another key, so downloading through the key's link would get the wrong
+    song.
+    """
+
+    def listing_page(self, path, query):
+        if not path.startswith('/api/search/text/'):
+            return super().listing_page(path, query)
+
+        return json.dumps({'docs': [build_map(key, f'Song {key}', download_url=(
+            f'{self.beatsaver_download_url}cdn-{key}')) for key in ['1a', '2b']]})
+
+
+def test_songs_from_the_api_are_downloaded_from_its_links(tmp_path):
+    with ApiServer(number_of_pages=1, zipfile_size=4 * 1024) as server:
+        scraper = SongScraper(str(tmp_path), bsaber_site=server.bsaber_site,
+                              beatsaver_download_url=server.beatsaver_download_url,
+                              beatsaver_api_url=server.bsaber_site + 'api/',
+                              metadata_backend='api')
+        songs = scraper.get_song_results('new')
+
+        assert [song.download_link for song in songs] == \
+            [server.beatsaver_download_url + 'cdn-1a', server.beatsaver_download_url + 'cdn-2b']
+
+        scraper.download_songs(songs, display_error_message=False)
+
+        assert (tmp_path / '1a (Song 1a).zip').read_bytes() == server.song_zipfile('cdn-1a')
+
+
+def test_songs_from_bsaber_are_downloaded_through_their_key(tmp_path):
+    with FixtureServer(number_of_pages=1) as server:
+        scraper = SongScraper(str(tmp_path), bsaber_site=server.bsaber_site,
+                              beatsaver_download_url=server.beatsaver_download_url)
+        songs = scraper.get_song_results('new')
+
+    assert isinstance(songs, SongCollection) and len(songs) == 20
+    assert all(song.download_link == server.beatsaver_download_url + song.key for song in songs)
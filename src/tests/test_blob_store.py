@@ -0,0 +1,154 @@
+"""
+@author Eric Zair
+@file test_blob_store.py
+
+Tests that the BlobStore stores each file's bytes once, and that garbage_collect() only
+removes the files that no song folder links to anymore.
+"""
+
+# Building the song zipfiles.
+from io import BytesIO
+import shutil
+import zipfile
+
+# Handling file system navigation and paths.
+from os import stat, walk
+from os.path import join
+
+import pytest
+
+from bsaber.blob_store import BlobStore
+from bsaber.extractor import extract_song_archive
+
+
+""" The audio that both songs share, and the file that only one of them has. """
+SHARED_AUDIO = bytes(range(256)) * 64
+ONLY_IN_SECOND_SONG = b'{"_notes": [1, 2, 3]}'
+
+
+def build_zipfile(files):
+    zip_buffer = BytesIO()
+
+    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as song_zipfile:
+        for name, content in files.items():
+            song_zipfile.writestr(name, content)
+
+    return zip_buffer.getvalue()
+
+
+def stored_files(path_to_blob_store):
+    """Return the path of every file in the store's blobs/ folder."""
+    return [join(root, file) for root, _, files in walk(join(path_to_blob_store, 'blobs'))
+            for file in files]
+
+
+@pytest.fixture
+def songs(tmp_path):
+    """Extract two songs that share their audio through a blob store.
+
+    Returns:
+        (str, str, str): The blob store, and the folders of the first and second song.
+    """
+    path_to_blob_store = str(tmp_path / 'blobs')
+    first_song = str(tmp_path / 'levels' / '1 (First)')
+    second_song = str(tmp_path / 'levels' / '2 (Second)')
+    (tmp_path / 'levels').mkdir()
+
+    for song_folder, files in [(first_song, {'song.egg': SHARED_AUDIO}),
+                               (second_song, {'song.egg': SHARED_AUDIO,
+                                              'Expert.dat': ONLY_IN_SECOND_SONG})]:
+        result = extract_song_archive(BytesIO(build_zipfile(files)), song_folder,
+                                      path_to_blob_store=path_to_blob_store)
+        assert result.success, result.error
+
+    return path_to_blob_store, first_song, second_song
+
+
+def test_same_bytes_are_stored_once(songs):
+    path_to_blob_store, first_song, second_song = songs
+
+    assert len(stored_files(path_to_blob_store)) == 2
+    assert stat(join(first_song, 'song.egg')).st_ino == stat(join(second_song, 'song.egg')).st_ino
+
+    with open(join(second_song, 'song.egg'), 'rb') as audio_file:
+        assert audio_file.read() == SHARED_AUDIO
+
+
+def test_second_song_links_the_stored_audio(tmp_path, songs):
+    path_to_blob_store, _, _ = songs
+    result = extract_song_archive(BytesIO(build_zipfile({'song.egg': SHARED_AUDIO})),
+                                  str(tmp_path / 'levels' / '3 (Third)'),
+                                  path_to_blob_store=path_to_blob_store)
+
+    assert result.success and result.files_linked == 1
+
+
+def test_different_bytes_with_the_same_size_are_stored_apart(tmp_path):
+    path_to_blob_store = str(tmp_path / 'blobs')
+    (tmp_path / 'levels').mkdir()
+
+    for key, content in [('1', b'a' * 100), ('2', b'b' * 100)]:
+        extract_song_archive(BytesIO(build_zipfile({'song.egg': content})),
+                             str(tmp_path / 'levels' / key), path_to_blob_store=path_to_blob_store)
+
+    assert len(stored_files(path_to_blob_store)) == 2
+    assert (tmp_path / 'levels' / '2' / 'song.egg').read_bytes() == b'b' * 100
+
+
+def test_garbage_collect_keeps_linked_files(songs):
+    path_to_blob_store, _, _ = songs
+
+    assert BlobStore(path_to_blob_store).garbage_collect() == (0, 0)
+    assert len(stored_files(path_to_blob_store)) == 2
+
+
+def test_garbage_collect_removes_files_no_song_uses(songs):
+    path_to_blob_store, first_song, second_song = songs
+    shutil.rmtree(second_song)
+
+    # The audio is still linked from the first song, only Expert.dat is unused now.
+    assert BlobStore(path_to_blob_store).garbage_collect() == (1, len(ONLY_IN_SECOND_SONG))
+    assert len(stored_files(path_to_blob_store)) == 1
+
+    shutil.rmtree(first_song)
+
+    assert BlobStore(path_to_blob_store).garbage_collect() == (1, len(SHARED_AUDIO))
+    assert stored_files(path_to_blob_store) == []
+
+
+def test_garbage_collect_clears_leftover_temp_files(songs):
+    path_to_blob_store, _, _ = songs
+
+    with open(join(path_to_blob_store, 'tmp', 'left-by-a-crash'), 'wb') as temp_file:
+        temp_file.write(b'half written')
+
+    BlobStore(path_to_blob_store).garbage_collect()
+
+    assert next(walk(join(path_to_blob_store, 'tmp')))[2] == []
+
+
+def test_re_extracting_an_unchanged_song_reads_no_member(songs, monkeypatch):
+    path_to_blob_store, _, second_song = songs
+
+    def fail(*arguments):
+        raise AssertionError("an unchanged member was handed to the blob store")
+
+    monkeypatch.setattr(BlobStore, 'link_zip_member', fail)
+    result = extract_song_archive(BytesIO(build_zipfile({'song.egg': SHARED_AUDIO,
+                                                         'Expert.dat': ONLY_IN_SECOND_SONG})),
+                                  second_song, path_to_blob_store=path_to_blob_store)
+
+    assert result.success and result.skipped and result.members_written == 0
+
+
+def test_re_extracting_a_changed_member_relinks_only_it(songs):
+    path_to_blob_store, first_song, second_song = songs
+    result = extract_song_archive(BytesIO(build_zipfile({'song.egg': SHARED_AUDIO,
+                                                         'Expert.dat': b'{"_notes": []}'})),
+                                  second_song, path_to_blob_store=path_to_blob_store)
+
+    assert result.success and result.members_written == 1
+    assert stat(join(first_song, 'song.egg')).st_ino == stat(join(second_song, 'song.egg')).st_ino
+
+    with open(join(second_song, 'Expert.dat'), 'rb') as difficulty_file:
+        assert difficulty_file.read() == b'{"_notes": []}'
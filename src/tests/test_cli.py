@@ -0,0 +1,117 @@
+"""
+@author Eric Zair
+@file test_cli.py
+
+Tests of the subcommands of bsaber_scraper.py against a local FixtureServer, and of the
+JSON lines that they print.
+"""
+
+# Running the command line.
+from functools import partial
+import json
+
+import pytest
+
+from fixture_server import FixtureServer
+from bsaber.scraper import SongScraper
+import bsaber_scraper
+
+
+@pytest.fixture(scope='module')
+def server():
+    with FixtureServer(number_of_pages=3, zipfile_size=4 * 1024) as server:
+        yield server
+
+
+@pytest.fixture
+def run(tmp_path, server, monkeypatch, capsys):
+    """Return a function that runs bsaber_scraper.py with the given arguments against the
+    fixture server, with tmp_path as the library, and returns the JSON lines it printed.
+    """
+    monkeypatch.setattr(bsaber_scraper, 'SongScraper', partial(
+        SongScraper, bsaber_site=server.bsaber_site,
+        beatsaver_download_url=server.beatsaver_download_url,
+        beatsaver_api_url=server.bsaber_site + 'api/'))
+
+    def run_command(*arguments):
+        bsaber_scraper.main(['--library', str(tmp_path), '--jobs', '4', *arguments])
+        return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+    return run_command
+
+
+def test_list(run, server):
+    lines = run('list', 'top', '30-days', '--songs', '25')
+
+    assert len(lines) == 25 and len({line['key'] for line in lines}) == 25
+    assert all(line['download_link'] == server.beatsaver_download_url + line['key']
+               for line in lines)
+    assert all(line['title'] for line in lines)
+
+
+def test_remote_search(run):
+    lines = run('search', '--remote', 'light it up', 'another song')
+
+    assert {line['query'] for line in lines} == {'light it up', 'another song'}
+    assert all(set(line) == {'key', 'title', 'mapper', 'download_link', 'query'}
+               for line in lines)
+
+
+def test_download_then_index_and_local_search(run, tmp_path):
+    keys = [line['key'] for line in run('list', 'new', '--songs', '3')]
+    (tmp_path / 'keys.txt').write_text(f'# songs to download\n{keys[1]}\n\n{keys[2]}\n')
+
+    lines = run('download', keys[0], '--batch', str(tmp_path / 'keys.txt'))
+
+    assert sorted(line['key'] for line in lines) == sorted(keys)
+    assert all(line['success'] and not line['skipped'] and line['song_folder']
+               for line in lines)
+    assert [line['key'] for line in run('index')] == sorted(keys)
+
+    # Installed songs are skipped by the next download.
+    assert all(line['skipped'] for line in run('download', *keys))
+
+    title = next(line['title'] for line in run('list', 'new', '--songs', '1'))
+    lines = run('search', '--installed', title)
+
+    assert lines[0]['key'] == keys[0] and lines[0]['installed'] and lines[0]['query'] == title
+
+
+def test_download_without_extracting(run):
+    key = run('list', 'new', '--songs', '1')[0]['key']
+    lines = run('download', '--no-extract', key)
+
+    assert len(lines) == 1 and lines[0]['key'] == key and lines[0]['success']
+    assert lines[0]['bytes'] > 0
+    assert 'song_folder' not in lines[0]
+
+
+def test_sync(run, tmp_path):
+    lines = run('sync', 'new:5', 'top/30-days:3')
+
+    assert lines[-1] == {'songs_crawled': {'new:5': 5, 'top/30-days:3': 3},
+                         'installed': 8, 'failed': 0}
+    assert len(lines) == 9 and all(line['success'] for line in lines[:-1])
+    assert (tmp_path / 'bsaber_sync_cursor.json').exists()
+
+    assert run('sync', 'new:5')[-1] == {'songs_crawled': {'new:5': 0}, 'installed': 0,
+                                        'failed': 0}
+
+
+def test_verify(run):
+    run('sync', 'new:2')
+    lines = run('verify')
+
+    assert lines[-1]['maps'] == 2 and lines[-1]['verified'] == 2
+    assert len(lines) == 3 and all('signature' not in line for line in lines)
+
+
+def test_gc_needs_a_blob_store(run):
+    with pytest.raises(SystemExit, match='--blob-store'):
+        run('gc')
+
+
+def test_read_batch_file(tmp_path):
+    (tmp_path / 'batch.txt').write_text('one\n  # a comment\n\n  two  \n')
+
+    assert bsaber_scraper.read_batch_file(str(tmp_path / 'batch.txt')) == ['one', 'two']
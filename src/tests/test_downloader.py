@@ -0,0 +1,129 @@
+"""
+@author Eric Zair
+@file test_downloader.py
+
+Tests of SongDownloader's resumed downloads, 416 answers and corrupt zipfile retries,
+against a local http server that answers from a script.
+"""
+
+import pytest
+import requests
+
+from scripted_server import ScriptedServer, SONG_ZIPFILE
+from bsaber.downloader import SongDownloader, CorruptArchiveError
+
+
+@pytest.fixture
+def downloader():
+    with requests.Session() as session:
+        yield SongDownloader(session, max_workers=2, max_retries=2, backoff=0)
+
+
+def read_file(path):
+    with open(path, 'rb') as file:
+        return file.read()
+
+
+def test_download_saves_the_song(tmp_path, downloader):
+    save_location = str(tmp_path / '1a2b.zip')
+
+    with ScriptedServer(['song']) as server:
+        result = downloader.download('song', server.url, save_location)
+
+    assert result.success and result.error is None
+    assert result.attempts == 1 and result.resumed_from == 0
+    assert result.bytes_written == len(SONG_ZIPFILE)
+    assert read_file(save_location) == SONG_ZIPFILE
+    assert not (tmp_path / '1a2b.zip.part').exists()
+
+
+def test_download_resumes_from_the_part_file(tmp_path, downloader):
+    save_location = str(tmp_path / '1a2b.zip')
+    (tmp_path / '1a2b.zip.part').write_bytes(SONG_ZIPFILE[:5000])
+
+    with ScriptedServer(['song']) as server:
+        result = downloader.download('song', server.url, save_location)
+
+    assert server.ranges == ['bytes=5000-']
+    assert result.success and result.resumed_from == 5000
+    assert read_file(save_location) == SONG_ZIPFILE
+
+
+def test_download_starts_over_when_the_range_is_ignored(tmp_path, downloader):
+    save_location = str(tmp_path / '1a2b.zip')
+    (tmp_path / '1a2b.zip.part').write_bytes(b'stale bytes of some other song')
+
+    with ScriptedServer([(200, SONG_ZIPFILE)]) as server:
+        result = downloader.download('song', server.url, save_location)
+
+    assert result.success
+    assert read_file(save_location) == SONG_ZIPFILE
+
+
+def test_416_means_the_part_file_is_already_whole(tmp_path, downloader):
+    save_location = str(tmp_path / '1a2b.zip')
+    (tmp_path / '1a2b.zip.part').write_bytes(SONG_ZIPFILE)
+
+    with ScriptedServer([(416, b'')]) as server:
+        result = downloader.download('song', server.url, save_location)
+
+    assert server.ranges == [f'bytes={len(SONG_ZIPFILE)}-']
+    assert result.success and result.attempts == 1
+    assert read_file(save_location) == SONG_ZIPFILE
+
+
+def test_416_for_a_broken_part_file_starts_over(tmp_path, downloader):
+    save_location = str(tmp_path / '1a2b.zip')
+    (tmp_path / '1a2b.zip.part').write_bytes(b'not a zipfile at all')
+
+    with ScriptedServer([(416, b''), 'song']) as server:
+        result = downloader.download('song', server.url, save_location)
+
+    assert server.ranges == ['bytes=20-', None]
+    assert result.success and result.attempts == 2
+    assert read_file(save_location) == SONG_ZIPFILE
+
+
+def test_corrupt_zipfile_is_thrown_away_and_downloaded_again(tmp_path, downloader):
+    save_location = str(tmp_path / '1a2b.zip')
+    corrupt_zipfile = bytes(len(SONG_ZIPFILE))
+
+    with ScriptedServer([(200, corrupt_zipfile), 'song']) as server:
+        result = downloader.download('song', server.url, save_location)
+
+    # The retry must not resume from the corrupt bytes.
+    assert server.ranges == [None, None]
+    assert result.success and result.attempts == 2
+    assert read_file(save_location) == SONG_ZIPFILE
+
+
+def test_corrupt_zipfile_fails_once_the_retries_run_out(tmp_path, downloader):
+    save_location = str(tmp_path / '1a2b.zip')
+
+    with ScriptedServer([(200, b'garbage')] * 3) as server:
+        result = downloader.download('song', server.url, save_location)
+
+    assert not result.success and result.attempts == 3
+    assert isinstance(result.error, CorruptArchiveError)
+    assert not (tmp_path / '1a2b.zip').exists()
+    assert not (tmp_path / '1a2b.zip.part').exists()
+
+
+def test_not_found_is_not_retried(tmp_path, downloader):
+    save_location = str(tmp_path / '1a2b.zip')
+
+    with ScriptedServer([(404, b'Not Found')]) as server:
+        result = downloader.download('song', server.url, save_location)
+
+    assert not result.success and result.attempts == 1
+    assert isinstance(result.error, requests.exceptions.HTTPError)
+    assert not (tmp_path / '1a2b.zip').exists()
+    assert not (tmp_path / '1a2b.zip.part').exists()
+
+
+def test_download_into_memory_retries_a_corrupt_zipfile(downloader):
+    with ScriptedServer([(200, b'garbage'), 'song']) as server:
+        result = downloader.download('song', server.url)
+
+    assert result.success and result.attempts == 2
+    assert result.save_location is None and result.content == SONG_ZIPFILE
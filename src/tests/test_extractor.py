@@ -0,0 +1,139 @@
+"""
+@author Eric Zair
+@file test_extractor.py
+
+Tests of selective extraction: the manifest that lets an unchanged song be skipped, and
+lets a damaged or updated song folder be repaired by only writing the files it needs.
+"""
+
+# Building the song zipfiles.
+from os import remove, utime
+import zipfile
+
+import pytest
+
+from bsaber.extractor import extract_song_zipfile, extract_song_zipfiles
+from bsaber.extraction_manifest import MANIFEST_NAME
+
+
+MEMBERS = {'info.dat': b'{"_songName": "Song"}',
+           'song.egg': b'ogg audio ' * 1000,
+           'Expert.dat': b'{"_notes": []}'}
+
+
+def write_song_zipfile(path_to_song_zipfile, members):
+    with zipfile.ZipFile(path_to_song_zipfile, 'w') as song_zipfile:
+        for name, content in members.items():
+            song_zipfile.writestr(name, content)
+
+
+@pytest.fixture
+def song(tmp_path):
+    """Return the path to a song's zipfile that was extracted once, and its song folder."""
+    path_to_song_zipfile = tmp_path / 'abc1 (Song).zip'
+    write_song_zipfile(path_to_song_zipfile, MEMBERS)
+    result = extract_song_zipfile(str(path_to_song_zipfile))
+
+    assert result.success and not result.skipped and result.members_written == 3
+    return path_to_song_zipfile, tmp_path / 'abc1 (Song)'
+
+
+def files_in(song_folder):
+    return {path.name: path.read_bytes() for path in song_folder.iterdir()
+            if path.name != MANIFEST_NAME}
+
+
+def test_first_extraction_writes_every_member(song, tmp_path):
+    _, song_folder = song
+
+    assert files_in(song_folder) == MEMBERS
+    assert (song_folder / MANIFEST_NAME).exists()
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['abc1 (Song)', 'abc1 (Song).zip']
+
+
+def test_unchanged_song_is_skipped(song, monkeypatch):
+    path_to_song_zipfile, _ = song
+
+    def read_zipfile(*args, **kwargs):
+        raise AssertionError('the zipfile was opened')
+
+    monkeypatch.setattr(zipfile, 'ZipFile', read_zipfile)
+    result = extract_song_zipfile(str(path_to_song_zipfile))
+
+    assert result.success and result.skipped and result.members_written == 0
+
+
+def test_missing_file_is_written_again(song):
+    path_to_song_zipfile, song_folder = song
+    remove(song_folder / 'song.egg')
+
+    result = extract_song_zipfile(str(path_to_song_zipfile))
+
+    assert result.success and not result.skipped and result.members_written == 1
+    assert files_in(song_folder) == MEMBERS
+
+
+def test_file_changed_on_disk_is_written_again(song):
+    path_to_song_zipfile, song_folder = song
+    # Same size, so only the modification time gives the change away.
+    (song_folder / 'Expert.dat').write_bytes(b'{"_notes": {}}')
+    utime(song_folder / 'Expert.dat', (1, 1))
+
+    result = extract_song_zipfile(str(path_to_song_zipfile))
+
+    assert result.members_written == 1 and files_in(song_folder) == MEMBERS
+
+
+def test_updated_zipfile_only_writes_what_changed(song):
+    path_to_song_zipfile, song_folder = song
+    updated_members = {'info.dat': MEMBERS['info.dat'],
+                       'song.egg': b'new ogg audio ' * 1000,
+                       'ExpertPlus.dat': b'{"_notes": [2]}'}
+    write_song_zipfile(path_to_song_zipfile, updated_members)
+
+    result = extract_song_zipfile(str(path_to_song_zipfile))
+
+    assert result.success and not result.skipped and result.members_written == 2
+    # Expert.dat is gone from the updated zipfile, so it is removed from the folder too.
+    assert files_in(song_folder) == updated_members
+
+
+def test_folder_without_a_manifest_is_checked_by_crc(song):
+    path_to_song_zipfile, song_folder = song
+    remove(song_folder / MANIFEST_NAME)
+    (song_folder / 'info.dat').write_bytes(b'x' * len(MEMBERS['info.dat']))
+
+    result = extract_song_zipfile(str(path_to_song_zipfile))
+
+    assert result.members_written == 1 and files_in(song_folder) == MEMBERS
+    assert extract_song_zipfile(str(path_to_song_zipfile)).skipped
+
+
+def test_without_selective_extraction_existing_folders_are_skipped(song):
+    path_to_song_zipfile, song_folder = song
+    remove(song_folder / 'song.egg')
+
+    result = extract_song_zipfile(str(path_to_song_zipfile), selective=False)
+
+    assert result.success and result.skipped and 'song.egg' not in files_in(song_folder)
+
+
+def test_zipfile_is_removed_once_extracted(tmp_path):
+    path_to_song_zipfile = tmp_path / 'abc2 (Song).zip'
+    write_song_zipfile(path_to_song_zipfile, MEMBERS)
+
+    assert extract_song_zipfile(str(path_to_song_zipfile), keep_zipfile=False).success
+    assert not path_to_song_zipfile.exists()
+    assert files_in(tmp_path / 'abc2 (Song)') == MEMBERS
+
+
+def test_extract_many_zipfiles(tmp_path):
+    paths = [tmp_path / f'abc{number} (Song).zip' for number in range(3)]
+
+    for path_to_song_zipfile in paths:
+        write_song_zipfile(path_to_song_zipfile, MEMBERS)
+
+    summary = extract_song_zipfiles([str(path) for path in paths])
+
+    assert len(summary.extracted()) == 3 and not summary.failed()
+    assert len(extract_song_zipfiles([str(path) for path in paths]).skipped()) == 3
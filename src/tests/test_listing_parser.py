@@ -0,0 +1,86 @@
+"""
+@author Eric Zair
+@file test_listing_parser.py
+
+Tests of parse_listing() against the recorded pages in bench/fixtures/.
+"""
+
+# Handling file system navigation and paths.
+from os.path import join
+import re
+
+import pytest
+
+from conftest import SRC_FOLDER
+from bsaber import listing_parser
+from bsaber.listing_parser import parse_listing, song_key_from_page_url
+
+
+""" Folder holding the recorded pages. """
+FIXTURES_FOLDER = join(SRC_FOLDER, 'bench', 'fixtures')
+
+""" Recorded page, number of cards to skip on it, and number of songs it lists. """
+FIXTURE_PAGES = [('listing_new.html', 0, 20), ('listing_top_30_days.html', 0, 20),
+                 ('search_light.html', 1, 12)]
+
+
+def read_fixture(page_name):
+    with open(join(FIXTURES_FOLDER, page_name), 'r', encoding='utf-8') as page:
+        return page.read()
+
+
+def parsed(html, number_of_songs=None, skip=0):
+    """Return parse_listing()'s records as tuples, which compare by value."""
+    return [(record.key, record.title, record.mapper, record.page_url)
+            for record in parse_listing(html, number_of_songs, skip)]
+
+
+@pytest.mark.parametrize('page_name, skip, number_of_songs', FIXTURE_PAGES)
+def test_every_song_card_is_parsed(page_name, skip, number_of_songs):
+    records = list(parse_listing(read_fixture(page_name), skip=skip))
+
+    assert len(records) == number_of_songs
+    assert len({record.key for record in records}) == number_of_songs
+
+    for record in records:
+        assert re.fullmatch(r'[0-9a-f]+', record.key)
+        assert record.page_url == f'https://bsaber.com/songs/{record.key}/'
+        assert song_key_from_page_url(record.page_url) == record.key
+        assert record.title and record.title == record.title.strip()
+        assert '&amp;' not in record.title and '<' not in record.title
+        assert record.mapper
+
+
+def test_html_entities_in_titles_are_decoded():
+    titles = [record.title for record in parse_listing(read_fixture('listing_new.html'))]
+
+    assert 'Ghost Neon Rain City & Star' in titles
+
+
+@pytest.mark.parametrize('page_name, skip, _', FIXTURE_PAGES)
+def test_number_of_songs_counts_the_skipped_cards(page_name, skip, _):
+    html = read_fixture(page_name)
+    every_record = parsed(html, skip=skip)
+
+    assert parsed(html, number_of_songs=5, skip=skip) == every_record[: 5 - skip]
+
+
+def test_skip_drops_the_cards_at_the_top():
+    html = read_fixture('listing_new.html')
+
+    assert parsed(html, skip=2) == parsed(html)[2:]
+
+
+@pytest.mark.parametrize('page_name, skip, _', FIXTURE_PAGES)
+def test_chunk_size_does_not_change_the_records(monkeypatch, page_name, skip, _):
+    html = read_fixture(page_name)
+    every_record = parsed(html, skip=skip)
+
+    # Cards, tags and entities get split across chunks at every possible place.
+    monkeypatch.setattr(listing_parser, 'FEED_CHUNK_SIZE', 7)
+
+    assert parsed(html, skip=skip) == every_record
+
+
+def test_page_without_cards_has_no_records():
+    assert list(parse_listing('<html><body><p>Nothing found</p></body></html>')) == []
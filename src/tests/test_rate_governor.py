@@ -0,0 +1,195 @@
+"""
+@author Eric Zair
+@file test_rate_governor.py
+
+Tests of the RateGovernor: the AIMD limit on open requests, the Retry-After pause and the
+token buckets that cap the requests and bytes sent to each host.
+"""
+
+# Timing the waits.
+from email.utils import formatdate
+from threading import Thread, Event
+import time
+
+import pytest
+
+from bsaber.rate_governor import RateGovernor, HostBudget, TokenBucket, AdaptiveLimiter, \
+    parse_retry_after
+
+
+URL = 'https://host.test/songs/new/'
+
+
+def build_governor(**budget):
+    return RateGovernor(default_budget=HostBudget(**budget))
+
+
+def send(governor, status_code, retry_after=None):
+    with governor.limit(URL) as permit:
+        permit.record(status_code, retry_after)
+
+
+def test_limiter_halves_and_grows_back():
+    limiter = AdaptiveLimiter(min_limit=1, max_limit=8, decrease_cooldown=0)
+
+    limiter.decrease()
+    assert limiter.limit == 4
+    limiter.increase()
+    assert limiter.limit == 4.25
+
+    for _ in range(100):
+        limiter.increase()
+    assert limiter.limit == 8
+
+    for _ in range(10):
+        limiter.decrease()
+    assert limiter.limit == 1
+
+
+def test_limiter_only_halves_once_within_the_cooldown():
+    limiter = AdaptiveLimiter(min_limit=1, max_limit=8, decrease_cooldown=60)
+    limiter.decrease()
+    limiter.decrease()
+
+    assert limiter.limit == 4
+
+
+@pytest.mark.parametrize('status_code', [403, 429, 500, 503])
+def test_throttling_answers_halve_the_limit(status_code):
+    governor = build_governor(max_concurrency=8)
+    send(governor, status_code)
+
+    assert governor.concurrency_limits() == {'host.test': 4}
+
+
+def test_quick_answers_grow_the_limit():
+    governor = build_governor(max_concurrency=8, decrease_cooldown=0)
+    send(governor, 429)
+    send(governor, 429)
+
+    for _ in range(10):
+        send(governor, 200)
+
+    assert governor.concurrency_limits() == {'host.test': 4}
+
+
+def test_slow_answers_do_not_grow_the_limit():
+    governor = build_governor(max_concurrency=8, latency_target=0)
+    send(governor, 429)
+
+    for _ in range(10):
+        send(governor, 200)
+
+    assert governor.concurrency_limits() == {'host.test': 4}
+
+
+def test_failure_before_an_answer_halves_the_limit():
+    governor = build_governor(max_concurrency=8, decrease_cooldown=0)
+
+    with pytest.raises(OSError):
+        with governor.limit(URL):
+            raise OSError('connection reset')
+
+    assert governor.concurrency_limits() == {'host.test': 4}
+
+    # A failure after the host answered was already counted by record().
+    with pytest.raises(OSError):
+        with governor.limit(URL) as permit:
+            permit.record(200)
+            raise OSError('connection reset')
+
+    assert governor.concurrency_limits() == {'host.test': 4}
+
+
+def test_limit_holds_requests_back():
+    governor = build_governor(max_concurrency=1)
+    second_permit = Event()
+
+    def send_second_request():
+        with governor.limit(URL):
+            second_permit.set()
+
+    with governor.limit(URL):
+        Thread(target=send_second_request, daemon=True).start()
+
+        assert not second_permit.wait(0.2)
+
+    assert second_permit.wait(5)
+
+
+def test_retry_after_pauses_the_host():
+    governor = RateGovernor()
+    send(governor, 429, '1')
+    start_time = time.monotonic()
+
+    with governor.limit(URL):
+        pass
+
+    assert time.monotonic() - start_time >= 0.9
+
+    # Other hosts are not paused.
+    start_time = time.monotonic()
+
+    with governor.limit('https://other.test/'):
+        pass
+
+    assert time.monotonic() - start_time < 0.5
+
+
+@pytest.mark.parametrize('retry_after, expected', [
+    (None, 0.0),
+    ('', 0.0),
+    ('120', 120.0),
+    ('Wed, 21 Oct 2015 07:28:00 GMT', 0.0),
+    ('soon', 0.0),
+], ids=['none', 'empty', 'seconds', 'date-in-the-past', 'garbage'])
+def test_parse_retry_after(retry_after, expected):
+    assert parse_retry_after(retry_after) == expected
+
+
+def test_parse_retry_after_date():
+    assert 50 < parse_retry_after(formatdate(time.time() + 60, usegmt=True)) <= 60
+
+
+def test_token_bucket_spaces_out_requests():
+    bucket = TokenBucket(rate=20, capacity=1)
+    start_time = time.monotonic()
+
+    for _ in range(5):
+        bucket.take()
+
+    assert time.monotonic() - start_time >= 0.18
+
+
+def test_host_budgets_only_apply_to_their_host():
+    governor = RateGovernor({'slow.test': HostBudget(requests_per_second=5)})
+    start_time = time.monotonic()
+
+    for _ in range(3):
+        with governor.limit('https://fast.test/'):
+            pass
+
+    assert time.monotonic() - start_time < 0.1
+
+    for _ in range(3):
+        with governor.limit('https://slow.test/'):
+            pass
+
+    assert time.monotonic() - start_time >= 0.35
+
+
+def test_byte_budget_throttles_reads():
+    governor = build_governor(bytes_per_second=1000)
+    start_time = time.monotonic()
+
+    with governor.limit(URL) as permit:
+        permit.throttle(1000)
+        permit.throttle(300)
+
+    assert time.monotonic() - start_time >= 0.25
+
+
+@pytest.mark.parametrize('concurrency', [(0, 4), (4, 2)], ids=['zero', 'min-over-max'])
+def test_invalid_host_budget(concurrency):
+    with pytest.raises(ValueError):
+        HostBudget(min_concurrency=concurrency[0], max_concurrency=concurrency[1])
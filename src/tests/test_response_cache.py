@@ -0,0 +1,125 @@
+"""
+@author Eric Zair
+@file test_response_cache.py
+
+Tests of the response caches, and of SongScraper revalidating the pages in them with the
+ETag that the local FixtureServer sends.
+"""
+
+# Checking the caches.
+import time
+
+import pytest
+
+from fixture_server import FixtureServer
+from bsaber.scraper import SongScraper, listing_page_url
+from bsaber.response_cache import CachedPage, MemoryResponseCache, DiskResponseCache, \
+    TieredResponseCache
+
+
+@pytest.fixture(scope='module')
+def server():
+    with FixtureServer(number_of_pages=1, zipfile_size=4 * 1024) as server:
+        yield server
+
+
+def build_scraper(server, path_to_custom_levels, response_cache, page_ttl):
+    scraper = SongScraper(str(path_to_custom_levels), bsaber_site=server.bsaber_site,
+                          beatsaver_download_url=server.beatsaver_download_url,
+                          response_cache=response_cache, page_ttls={'new': page_ttl})
+    fetches = []
+    scraper.subscribe(lambda event: fetches.append(event.fields), ['page_fetched'])
+    return scraper, fetches
+
+
+def keys_of(songs):
+    return [song.key for song in songs]
+
+
+def test_fresh_page_is_not_fetched_again(tmp_path, server):
+    scraper, fetches = build_scraper(server, tmp_path, MemoryResponseCache(), page_ttl=60)
+    songs = scraper.get_song_results('new')
+
+    assert keys_of(scraper.get_song_results('new')) == keys_of(songs)
+    assert [fetch['status_code'] for fetch in fetches] == [200, 200]
+    assert [fetch['from_cache'] for fetch in fetches] == [False, True]
+    assert fetches[1]['duration'] == 0.0
+
+
+def test_expired_page_is_revalidated_with_its_etag(tmp_path, server):
+    response_cache = MemoryResponseCache()
+    scraper, fetches = build_scraper(server, tmp_path, response_cache, page_ttl=0)
+    songs = scraper.get_song_results('new')
+    cached_page = response_cache.get(listing_page_url(server.bsaber_site, 'new', 'all', 1))
+
+    assert keys_of(scraper.get_song_results('new')) == keys_of(songs)
+    assert [fetch['status_code'] for fetch in fetches] == [200, 304]
+    assert fetches[1]['from_cache'] and fetches[1]['bytes'] == 0
+    # The 304 keeps the page that was already parsed.
+    assert response_cache.get(cached_page.url) is cached_page and cached_page.parsed
+
+
+def test_changed_page_is_fetched_again(tmp_path, server):
+    url = listing_page_url(server.bsaber_site, 'new', 'all', 1)
+    response_cache = MemoryResponseCache()
+    response_cache.set(url, CachedPage(url, '<html></html>', etag='"old"'))
+    scraper, fetches = build_scraper(server, tmp_path, response_cache, page_ttl=60)
+
+    assert len(scraper.get_song_results('new')) == 20
+    assert [fetch['status_code'] for fetch in fetches] == [200]
+    assert response_cache.get(url).etag != '"old"' and response_cache.get(url).is_fresh()
+
+
+def test_disk_cache_revalidates_pages_from_an_earlier_run(tmp_path, server):
+    path_to_cache_folder = str(tmp_path / 'cache')
+    first_scraper, _ = build_scraper(server, tmp_path, DiskResponseCache(path_to_cache_folder),
+                                     page_ttl=0)
+    songs = first_scraper.get_song_results('new')
+
+    scraper, fetches = build_scraper(server, tmp_path, DiskResponseCache(path_to_cache_folder),
+                                     page_ttl=0)
+
+    assert keys_of(scraper.get_song_results('new')) == keys_of(songs)
+    assert [fetch['status_code'] for fetch in fetches] == [304]
+
+
+def test_memory_cache_drops_the_least_recently_used_page():
+    response_cache = MemoryResponseCache(max_pages=2)
+    response_cache.set('a', CachedPage('a', 'a'))
+    response_cache.set('b', CachedPage('b', 'b'))
+    response_cache.get('a')
+    response_cache.set('c', CachedPage('c', 'c'))
+
+    assert response_cache.get('b') is None
+    assert response_cache.get('a').body == 'a' and response_cache.get('c').body == 'c'
+
+
+def test_disk_cache_round_trip(tmp_path):
+    response_cache = DiskResponseCache(str(tmp_path))
+    expires_at = time.time() + 60
+    response_cache.set('url', CachedPage('url', 'body', '"etag"', 'yesterday', expires_at))
+    cached_page = DiskResponseCache(str(tmp_path)).get('url')
+
+    assert (cached_page.url, cached_page.body, cached_page.etag, cached_page.last_modified,
+            cached_page.expires_at) == ('url', 'body', '"etag"', 'yesterday', expires_at)
+    assert cached_page.is_fresh()
+    assert [path.suffix for path in tmp_path.iterdir()] == ['.json']
+
+
+def test_disk_cache_ignores_unreadable_pages(tmp_path):
+    response_cache = DiskResponseCache(str(tmp_path))
+    response_cache.set('url', CachedPage('url', 'body'))
+    next(tmp_path.iterdir()).write_text('{"url": "url"')
+
+    assert response_cache.get('url') is None
+    assert response_cache.get('another url') is None
+
+
+def test_tiered_cache_promotes_pages_from_disk(tmp_path):
+    memory_cache = MemoryResponseCache()
+    DiskResponseCache(str(tmp_path)).set('url', CachedPage('url', 'body'))
+    response_cache = TieredResponseCache(memory_cache, DiskResponseCache(str(tmp_path)))
+
+    assert memory_cache.get('url') is None
+    assert response_cache.get('url').body == 'body'
+    assert memory_cache.get('url').body == 'body'
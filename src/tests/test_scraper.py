@@ -0,0 +1,83 @@
+"""
+@author Eric Zair
+@file test_scraper.py
+
+Tests of SongScraper.crawl_songs() against a local FixtureServer.
+"""
+
+# Checking the crawls.
+from threading import Thread
+
+import pytest
+from requests.exceptions import HTTPError
+
+from fixture_server import FixtureServer
+from scripted_server import RepeatingServer
+from bsaber.scraper import SongScraper, unseen_records
+from bsaber.listing_parser import ListingRecord
+from bsaber.response_cache import MemoryResponseCache
+
+
+@pytest.fixture(scope='module')
+def server():
+    with FixtureServer(number_of_pages=3, zipfile_size=4 * 1024) as server:
+        yield server
+
+
+def build_scraper(server, path_to_custom_levels):
+    return SongScraper(str(path_to_custom_levels), bsaber_site=server.bsaber_site,
+                       beatsaver_download_url=server.beatsaver_download_url,
+                       response_cache=MemoryResponseCache())
+
+
+def test_crawl_to_the_end_of_the_listing(tmp_path, server):
+    keys = [record.key for record in build_scraper(server, tmp_path).crawl_songs(
+        'new', number_of_songs=1000)]
+
+    assert len(keys) == 60 and len(set(keys)) == 60
+
+
+def test_crawl_stops_at_number_of_songs(tmp_path, server):
+    songs = list(build_scraper(server, tmp_path).crawl_songs('top', number_of_songs=25))
+
+    assert len(songs) == 25
+
+
+def test_crawl_of_pages_in_range(tmp_path, server):
+    keys = [record.key for record in build_scraper(server, tmp_path).crawl_songs(
+        'new', first_page=2, last_page=3)]
+
+    assert len(set(keys)) == 40
+    assert not set(keys) & {record.key for record in build_scraper(server, tmp_path).crawl_songs(
+        'new', last_page=1)}
+
+
+def test_crawl_ends_when_the_site_repeats_its_last_page(tmp_path):
+    keys = []
+
+    with RepeatingServer(number_of_pages=2, zipfile_size=4 * 1024) as server:
+        crawl = build_scraper(server, tmp_path).crawl_songs('new', number_of_songs=1000)
+        # The crawl runs on a thread so that a crawl that never ends fails the test.
+        crawler = Thread(target=lambda: keys.extend(record.key for record in crawl), daemon=True)
+        crawler.start()
+        crawler.join(timeout=10)
+
+        assert not crawler.is_alive()
+
+    assert len(keys) == 40 and len(set(keys)) == 40
+
+
+def test_crawl_raises_when_the_first_page_can_not_be_fetched(tmp_path, server):
+    with pytest.raises(HTTPError):
+        list(build_scraper(server, tmp_path).crawl_songs('new', first_page=4, last_page=5))
+
+
+def test_crawl_needs_an_end(tmp_path, server):
+    with pytest.raises(ValueError):
+        next(build_scraper(server, tmp_path).crawl_songs('new'))
+
+
+def test_unseen_records():
+    records = [ListingRecord(key, key, 'mapper', None) for key in ['a', 'b', 'a', 'c', 'b']]
+
+    assert [record.key for record in unseen_records(records, {'c'})] == ['a', 'b']
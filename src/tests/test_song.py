@@ -0,0 +1,88 @@
+"""
+@author Eric Zair
+@file test_song.py
+
+Tests of Song and SongCollection, and of converting the old <song_title> ->
+<song_download_link> dicts to and from them.
+"""
+
+# Checking the songs.
+import pytest
+
+from bsaber.listing_parser import ListingRecord
+from bsaber.song import Song, SongCollection, as_song_collection
+
+
+DOWNLOAD_URL = 'https://beatsaver.com/api/download/key/'
+
+
+def build_song(key, title):
+    return Song(key, title, DOWNLOAD_URL + key)
+
+
+def test_collection_keeps_the_first_song_of_each_key():
+    songs = SongCollection([build_song('1', 'One'), build_song('2', 'Two'),
+                            build_song('1', 'One again')])
+
+    assert songs.keys() == ['1', '2']
+    assert songs.get('1').title == 'One' and songs.get('3') is None
+    assert not songs.add(build_song('2', 'Two again'))
+    assert songs.extend([build_song('2', 'Two'), build_song('3', 'Three')]) == 1
+    assert [song.key for song in songs] == ['1', '2', '3'] and len(songs) == 3
+
+
+def test_collection_lookups():
+    songs = SongCollection([build_song('a', 'A'), build_song('b', 'B')])
+
+    assert songs[1].key == 'b' and songs[-1].key == 'b'
+    assert songs.position_of('b') == 1 and songs.position_of('c') is None
+    assert 'a' in songs and 'A' not in songs
+
+
+def test_songs_with_the_same_title_are_kept():
+    songs = SongCollection([build_song('1', 'Song'), build_song('2', 'Song')])
+
+    assert len(songs) == 2
+    assert songs.to_dict() == {'Song': DOWNLOAD_URL + '1', 'Song (2)': DOWNLOAD_URL + '2'}
+
+
+def test_collection_round_trips_through_the_old_dict():
+    dict_of_songs = {'One': DOWNLOAD_URL + '1a', 'Two': DOWNLOAD_URL + '2b/'}
+    songs = SongCollection.from_dict(dict_of_songs)
+
+    assert [(song.key, song.title) for song in songs] == [('1a', 'One'), ('2b', 'Two')]
+    assert songs.to_dict() == dict_of_songs
+
+
+@pytest.mark.parametrize('songs', [
+    {'One': DOWNLOAD_URL + '1'},
+    [build_song('1', 'One')],
+    (song for song in [build_song('1', 'One')]),
+], ids=['dict', 'list', 'generator'])
+def test_as_song_collection(songs):
+    song_collection = as_song_collection(songs)
+
+    assert isinstance(song_collection, SongCollection)
+    assert [(song.key, song.title) for song in song_collection] == [('1', 'One')]
+
+
+def test_as_song_collection_keeps_a_collection():
+    songs = SongCollection([build_song('1', 'One')])
+
+    assert as_song_collection(songs) is songs
+
+
+@pytest.mark.parametrize('title, folder_name', [
+    ('Song', '1a2b (Song)'),
+    ('AC/DC: Back In Black?', '1a2b (AC_DC_ Back In Black_)'),
+    ('Ends with a dot.', '1a2b (Ends with a dot)'),
+], ids=['plain', 'unsafe-characters', 'trailing-dot'])
+def test_folder_name(title, folder_name):
+    assert build_song('1a2b', title).folder_name == folder_name
+
+
+def test_song_from_record():
+    song = Song.from_record(ListingRecord('1a2b', 'Title', 'Mapper', None), DOWNLOAD_URL + '1a2b')
+
+    assert (song.key, song.title, song.mapper, song.download_link, song.hash) == \
+        ('1a2b', 'Title', 'Mapper', DOWNLOAD_URL + '1a2b', None)
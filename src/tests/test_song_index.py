@@ -0,0 +1,108 @@
+"""
+@author Eric Zair
+@file test_song_index.py
+
+Tests that SongScraper only records a song in the SongIndex once it is extracted, so a song
+whose extraction failed is downloaded again by the next run.
+"""
+
+# Building the zipfile that can not be extracted.
+from io import BytesIO
+import zipfile
+
+import pytest
+
+from fixture_server import FixtureServer
+from bsaber.scraper import SongScraper
+from bsaber.song import Song, SongCollection
+from bsaber.response_cache import MemoryResponseCache
+
+
+""" Key of the song whose zipfile can not be extracted. """
+BROKEN_KEY = 'bad1'
+
+
+def build_unextractable_zipfile():
+    """Return the bytes of a zipfile that passes its CRC checks, but whose member would be
+    extracted outside of its song folder, so extracting it fails.
+    """
+    zip_buffer = BytesIO()
+
+    with zipfile.ZipFile(zip_buffer, 'w') as song_zipfile:
+        song_zipfile.writestr('info.dat', '{}')
+        song_zipfile.writestr('../escaped.dat', 'outside of the song folder')
+
+    return zip_buffer.getvalue()
+
+
+class BrokenSongServer(FixtureServer):
+    """FixtureServer that serves an unextractable zipfile for BROKEN_KEY."""
+
+    def song_zipfile(self, key):
+        if key == BROKEN_KEY:
+            return build_unextractable_zipfile()
+
+        return super().song_zipfile(key)
+
+
+@pytest.fixture
+def server():
+    with BrokenSongServer(number_of_pages=1, zipfile_size=4 * 1024) as server:
+        yield server
+
+
+def build_scraper(server, path_to_custom_levels):
+    return SongScraper(str(path_to_custom_levels), bsaber_site=server.bsaber_site,
+                       beatsaver_download_url=server.beatsaver_download_url,
+                       response_cache=MemoryResponseCache(max_pages=0))
+
+
+def build_songs(server, keys):
+    return SongCollection(Song(key, f'Song {key}', server.beatsaver_download_url + key)
+                          for key in keys)
+
+
+@pytest.mark.parametrize('pipelined', [False, True])
+def test_failed_extraction_is_not_recorded(tmp_path, server, pipelined):
+    scraper = build_scraper(server, tmp_path)
+    songs = build_songs(server, ['a1', BROKEN_KEY, 'a2'])
+
+    scraper.download_extract_songs(songs, display_error_message=False, pipelined=pipelined,
+                                   max_workers=2)
+    song_index = scraper.song_index()
+
+    assert song_index.installed_keys() == {'a1', 'a2'}
+    assert song_index.get(BROKEN_KEY) is None
+    assert (tmp_path / 'a1 (Song a1)' / 'info.dat').is_file()
+
+    # Neither a partial song folder nor the escaped file is left behind.
+    assert not (tmp_path / f'{BROKEN_KEY} (Song {BROKEN_KEY})').exists()
+    assert not (tmp_path / 'escaped.dat').exists()
+
+
+@pytest.mark.parametrize('pipelined', [False, True])
+def test_installed_song_records_its_download(tmp_path, server, pipelined):
+    scraper = build_scraper(server, tmp_path)
+
+    scraper.download_extract_songs(build_songs(server, ['a1']), display_error_message=False,
+                                   pipelined=pipelined)
+    record = scraper.song_index().get('a1')
+
+    assert record['title'] == 'Song a1'
+    assert record['folder'] == str(tmp_path / 'a1 (Song a1)')
+    assert record['size'] == len(server.song_zipfile('a1'))
+    assert record['archive_hash'] is not None
+
+
+def test_failed_song_is_downloaded_again_by_the_next_run(tmp_path, server):
+    songs = build_songs(server, ['a1', BROKEN_KEY])
+    build_scraper(server, tmp_path).download_extract_songs(songs, display_error_message=False)
+
+    # A new scraper reads the index back from disk.
+    scraper = build_scraper(server, tmp_path)
+    summary = scraper.download_extract_songs(songs, display_error_message=False)
+
+    assert [result.path_to_song_zipfile for result in summary.results] == \
+        [str(tmp_path / f'{BROKEN_KEY} (Song {BROKEN_KEY}).zip')]
+    assert not summary.results[0].success
+    assert scraper.song_index().installed_keys() == {'a1'}
@@ -0,0 +1,159 @@
+"""
+@author Eric Zair
+@file test_song_search.py
+
+Tests of SongSearchIndex's trigram search and ranking, and of reading the metadata of
+installed songs whose info.dat holds fields of the wrong type.
+"""
+
+# Building the song folders.
+import json
+
+import pytest
+
+from bsaber.library import SongLibrary
+from bsaber.song_search import SongSearchIndex, read_song_metadata
+
+
+""" key, title, artist, mapper and whether the song is installed. """
+SONGS = [('1', 'Light It Up', 'Marshmello', 'Elliot', False),
+         ('2', 'Light It Up (Remix)', 'Marshmello', 'Skyler', False),
+         ('3', 'Lights Out', 'Nightcore', 'Freeek', True),
+         ('4', 'Neon Storm', 'Elliot', 'Nolan', False),
+         ('5', 'Light', 'San Holo', 'Teuflum', False)]
+
+
+@pytest.fixture
+def search_index(tmp_path):
+    search_index = SongSearchIndex(str(tmp_path / 'search.sqlite3'))
+
+    for key, title, artist, mapper, installed in SONGS:
+        search_index.add(key, title, artist, mapper, installed)
+
+    yield search_index
+    search_index.close()
+
+
+def keys_of(hits):
+    return [hit.key for hit in hits]
+
+
+def test_best_match_ranks_first(search_index):
+    hits = search_index.search('light it up')
+
+    assert keys_of(hits) == ['1', '2', '5', '3']
+    assert [hit.score for hit in hits] == sorted((hit.score for hit in hits), reverse=True)
+
+
+def test_whole_word_beats_a_partial_match(search_index):
+    assert keys_of(search_index.search('lights'))[0] == '3'
+    assert keys_of(search_index.search('light'))[0] == '5'
+
+
+def test_typos_are_forgiven(search_index):
+    assert keys_of(search_index.search('ligth it up'))[0] == '1'
+
+
+def test_artist_and_mapper_are_searched(search_index):
+    assert keys_of(search_index.search('marshmello')) == ['1', '2']
+    assert keys_of(search_index.search('teuflum')) == ['5']
+
+
+def test_artist_match_beats_a_mapper_match(search_index):
+    hits = search_index.search('elliot')
+
+    assert keys_of(hits) == ['4', '1']
+    assert hits[0].score > hits[1].score
+
+
+def test_installed_song_wins_a_tie(tmp_path):
+    search_index = SongSearchIndex(str(tmp_path / 'search.sqlite3'))
+    search_index.add('a', 'Same Title', installed=False)
+    search_index.add('b', 'Same Title', installed=True)
+
+    assert keys_of(search_index.search('same title')) == ['b', 'a']
+
+
+def test_installed_only(search_index):
+    assert keys_of(search_index.search('light', installed_only=True)) == ['3']
+
+
+def test_limit_and_miss(search_index):
+    assert len(search_index.search('light', limit=2)) == 2
+    assert search_index.search('zzzzqqq') == []
+    assert search_index.search('') == []
+
+
+def test_index_is_kept_on_disk(tmp_path, search_index):
+    search_index.close()
+    reopened_index = SongSearchIndex(str(tmp_path / 'search.sqlite3'))
+
+    assert keys_of(reopened_index.search('neon storm'))[0] == '4'
+    assert len(reopened_index) == len(SONGS)
+
+
+def test_songs_added_after_the_first_search_are_found(search_index):
+    search_index.search('light')
+    search_index.add('6', 'Ghost Fire', mapper='Nolan')
+
+    assert keys_of(search_index.search('ghost fire')) == ['6']
+
+
+def test_update_keeps_the_fields_that_are_not_given(search_index):
+    search_index.add('4', 'Neon Storm')
+
+    assert search_index.search('neon storm')[0].artist == 'Elliot'
+
+
+@pytest.mark.parametrize('artist, mapper', [(['A', 'B'], 'Nolan'), ('Elliot', {'name': 'x'}),
+                                            (5, 7.5)])
+def test_fields_that_are_not_strings_are_dropped(tmp_path, artist, mapper):
+    search_index = SongSearchIndex(str(tmp_path / 'search.sqlite3'))
+    search_index.add('7', 12345, artist, mapper)
+    hit = search_index.search('7', min_score=0)[0]
+
+    # A title that is not a string falls back to the key.
+    assert hit.title == '7'
+    assert hit.artist == (artist if isinstance(artist, str) else None)
+    assert hit.mapper == (mapper if isinstance(mapper, str) else None)
+
+
+def write_song_folder(path_to_custom_levels, folder_name, info):
+    song_folder = path_to_custom_levels / folder_name
+    song_folder.mkdir()
+    (song_folder / 'Info.dat').write_text(json.dumps(info))
+    return song_folder
+
+
+def test_read_song_metadata(tmp_path):
+    song_folder = write_song_folder(tmp_path, '1 (Song)', {
+        '_songName': 'Light It Up', '_songSubName': 'Remix', '_songAuthorName': 'Marshmello',
+        '_levelAuthorName': 'Elliot'})
+
+    assert read_song_metadata(str(song_folder)) == ('Light It Up Remix', 'Marshmello', 'Elliot')
+
+
+def test_read_song_metadata_drops_fields_that_are_not_strings(tmp_path):
+    song_folder = write_song_folder(tmp_path, '1 (Song)', {
+        '_songName': 5, '_songSubName': 'Remix', '_songAuthorName': ['Marshmello'],
+        '_levelAuthorName': {'name': 'Elliot'}})
+
+    assert read_song_metadata(str(song_folder)) == ('Remix', None, None)
+
+
+def test_read_song_metadata_of_a_folder_without_info(tmp_path):
+    assert read_song_metadata(str(tmp_path)) is None
+
+
+def test_rebuild_survives_malformed_info_files(tmp_path):
+    write_song_folder(tmp_path, 'a1 (Good - Elliot)', {'_songName': 'Good Song',
+                                                       '_levelAuthorName': 'Elliot'})
+    write_song_folder(tmp_path, 'b2 (Bad - Nolan)', {'_songName': 5,
+                                                     '_songAuthorName': ['x', 'y'],
+                                                     '_levelAuthorName': ['Nolan']})
+    write_song_folder(tmp_path, 'c3 (Worse - Skyler)', ['not', 'an', 'object'])
+    library = SongLibrary(str(tmp_path))
+
+    assert library.rebuild_song_index() == 3
+    assert keys_of(library.search('good song', installed_only=True)) == ['a1']
+    assert keys_of(library.search('bad', installed_only=True)) == ['b2']
@@ -0,0 +1,103 @@
+"""
+@author Eric Zair
+@file test_stream.py
+
+Tests of SongScraper.download_extract_stream() against a local FixtureServer: songs are
+read only as fast as there is room for them, and each one is installed straight from memory.
+"""
+
+# Counting the songs read off of the stream.
+from itertools import islice
+from os import listdir
+
+import pytest
+
+from fixture_server import FixtureServer
+from bsaber.scraper import SongScraper
+from bsaber.response_cache import MemoryResponseCache
+from bsaber.song import Song
+
+
+@pytest.fixture(scope='module')
+def server():
+    with FixtureServer(number_of_pages=2, zipfile_size=4 * 1024) as server:
+        yield server
+
+
+def build_scraper(server, path_to_custom_levels):
+    return SongScraper(str(path_to_custom_levels), bsaber_site=server.bsaber_site,
+                       beatsaver_download_url=server.beatsaver_download_url,
+                       response_cache=MemoryResponseCache())
+
+
+class CountingSongs():
+    """Iterable of songs that remembers how many of them were read."""
+
+    def __init__(self, server, number_of_songs):
+        keys = [f'{number:x}0' for number in range(number_of_songs)]
+        self.songs = [Song(key, f'Song {key}', server.beatsaver_download_url + key)
+                      for key in keys]
+        self.number_read = 0
+
+    def __iter__(self):
+        for song in self.songs:
+            self.number_read += 1
+            yield song
+
+
+def test_stream_installs_a_crawl(tmp_path, server):
+    scraper = build_scraper(server, tmp_path)
+    results = list(scraper.download_extract_stream(scraper.crawl_songs('new', last_page=2),
+                                                   display_error_message=False, max_workers=4))
+
+    assert len(results) == 40 and all(result.success for _, result in results)
+    assert scraper.song_index().installed_keys() == {song.key for song, _ in results}
+    assert all((tmp_path / song.folder_name / 'info.dat').exists() for song, _ in results)
+    assert not [name for name in listdir(tmp_path) if name.endswith('.zip')]
+
+    # Every song is installed now, so a second run has nothing to do.
+    assert not list(scraper.download_extract_stream(scraper.crawl_songs('new', last_page=2)))
+
+
+def test_stream_only_reads_the_songs_there_is_room_for(tmp_path, server):
+    songs = CountingSongs(server, 50)
+    stream = build_scraper(server, tmp_path).download_extract_stream(
+        songs, display_error_message=False, max_workers=2, max_pending=1)
+
+    next(stream)
+    # 2 downloading, 1 waiting to be extracted, 1 being extracted and 1 that was just read.
+    assert songs.number_read <= 5
+
+    stream.close()
+    number_read = songs.number_read
+
+    assert number_read < 50
+    assert len([name for name in listdir(tmp_path) if name.endswith(')')]) <= number_read
+
+
+def test_stream_keeps_zipfiles_when_asked_to(tmp_path, server):
+    songs = CountingSongs(server, 3).songs
+    results = list(build_scraper(server, tmp_path).download_extract_stream(
+        songs, display_error_message=False, keep_zipfiles=True))
+
+    assert all(result.success for _, result in results)
+    assert {name for name in listdir(tmp_path) if name.endswith('.zip')} == \
+        {song.folder_name + '.zip' for song in songs}
+
+
+def test_stream_yields_each_song_with_its_result(tmp_path, server):
+    songs = CountingSongs(server, 6).songs
+    results = list(islice(build_scraper(server, tmp_path).download_extract_stream(
+        songs, display_error_message=False, max_workers=3), 6))
+
+    assert {song.key for song, _ in results} == {song.key for song in songs}
+    assert all(result.extraction_result.song_folder.endswith(song.folder_name)
+               for song, result in results)
+
+
+@pytest.mark.parametrize('option', ['max_workers', 'max_pending'])
+def test_stream_needs_room_for_a_song(tmp_path, server, option):
+    stream = build_scraper(server, tmp_path).download_extract_stream([], **{option: 0})
+
+    with pytest.raises(ValueError):
+        next(stream)
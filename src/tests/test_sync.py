@@ -0,0 +1,121 @@
+"""
+@author Eric Zair
+@file test_sync.py
+
+Tests of SyncRule, and of sync_library() and stream_sync() against a local FixtureServer,
+including the cursor that lets a sync stop crawling 'new' at the songs it has already seen.
+"""
+
+# Checking the syncs.
+import json
+
+import pytest
+
+from fixture_server import FixtureServer
+from bsaber.scraper import SongScraper
+from bsaber.response_cache import MemoryResponseCache
+from bsaber.sync import SyncRule, SyncReport, sync_library, stream_sync
+
+
+class FailingSongServer(FixtureServer):
+    """FixtureServer that serves a body that is not a zipfile for the keys in failing_keys."""
+
+    failing_keys = set()
+
+    def song_zipfile(self, key):
+        if key in self.failing_keys:
+            return b'not a zipfile'
+
+        return super().song_zipfile(key)
+
+
+@pytest.fixture
+def server():
+    with FailingSongServer(number_of_pages=3, zipfile_size=4 * 1024) as server:
+        yield server
+
+
+def build_scraper(server, path_to_custom_levels):
+    path_to_custom_levels.mkdir(exist_ok=True)
+    return SongScraper(str(path_to_custom_levels), bsaber_site=server.bsaber_site,
+                       beatsaver_download_url=server.beatsaver_download_url,
+                       response_cache=MemoryResponseCache(max_pages=0))
+
+
+def keys_on_new(server, path_to_custom_levels):
+    scraper = build_scraper(server, path_to_custom_levels / 'listing')
+    return [record.key for record in scraper.crawl_songs('new', last_page=3)]
+
+
+@pytest.mark.parametrize('rule, expected', [
+    ('top/7-days:50', ('top', '7-days', 50, 'top/7-days:50')),
+    ('most-difficult', ('most-difficult', 'all', 20, 'most-difficult/all:20')),
+    ('new/7-days:5', ('new', 'all', 5, 'new:5')),
+], ids=['everything', 'defaults', 'new-has-no-time-period'])
+def test_sync_rule_from_string(rule, expected):
+    sync_rule = SyncRule.from_string(rule)
+
+    assert (sync_rule.sorted_by, sync_rule.time_period, sync_rule.number_of_songs,
+            str(sync_rule)) == expected
+
+
+@pytest.mark.parametrize('rule', ['', ':5', 'top:many'])
+def test_invalid_sync_rule(rule):
+    with pytest.raises(ValueError):
+        SyncRule.from_string(rule)
+
+
+def test_sync_saves_a_cursor_and_stops_at_it(tmp_path, server):
+    new_keys = keys_on_new(server, tmp_path)
+    scraper = build_scraper(server, tmp_path / 'custom_levels')
+    path_to_cursor = str(tmp_path / 'cursor.json')
+
+    report = sync_library(scraper, [SyncRule('new', number_of_songs=30)], path_to_cursor,
+                          display_error_message=False)
+
+    assert {song.key for song in report.songs_to_install} == set(new_keys[:30])
+    assert len(report.installed()) == 30 and not report.failed()
+    assert scraper.song_index().installed_keys() >= set(new_keys[:30])
+    with open(path_to_cursor, 'r', encoding='utf-8') as cursor_file:
+        assert json.load(cursor_file) == {'new': new_keys[0]}
+
+    # Nothing was uploaded since, so the next sync stops at the first song.
+    report = sync_library(scraper, [SyncRule('new', number_of_songs=30)], path_to_cursor,
+                          display_error_message=False)
+
+    assert report.songs_crawled == {'new:30': 0} and not report.results
+
+
+def test_sync_skips_installed_songs(tmp_path, server):
+    scraper = build_scraper(server, tmp_path)
+    sync_library(scraper, [SyncRule('top', '30-days', 10)], display_error_message=False)
+
+    report = sync_library(scraper, [SyncRule('top', '30-days', 30)], display_error_message=False)
+
+    assert report.songs_crawled == {'top/30-days:30': 30}
+    assert len(report.songs_to_install) == 20 and len(report.installed()) == 20
+
+
+def test_sync_installs_a_song_covered_by_two_rules_once(tmp_path, server):
+    report = sync_library(build_scraper(server, tmp_path),
+                          [SyncRule('top', '30-days', 10), SyncRule('top', '30-days', 20)],
+                          display_error_message=False)
+
+    assert report.songs_crawled == {'top/30-days:10': 10, 'top/30-days:20': 20}
+    assert len(report.songs_to_install) == 20
+
+
+def test_failed_song_keeps_the_cursor(tmp_path, server):
+    new_keys = keys_on_new(server, tmp_path)
+    server.failing_keys = {new_keys[25]}
+    path_to_cursor = str(tmp_path / 'cursor.json')
+    scraper = build_scraper(server, tmp_path / 'custom_levels')
+    report = SyncReport()
+
+    results = list(stream_sync(scraper, [SyncRule('new', number_of_songs=30)], report,
+                               path_to_cursor, display_error_message=False))
+
+    assert (report.number_installed, report.number_failed) == (29, 1)
+    assert [song.key for song, result in results if not result.success] == [new_keys[25]]
+    # The song that failed is crawled again by the next sync.
+    assert not (tmp_path / 'cursor.json').exists()
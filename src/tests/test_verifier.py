@@ -0,0 +1,221 @@
+"""
+@author Eric Zair
+@file test_verifier.py
+
+Tests of the verifier's ogg and difficulty checks on synthetic song folders.
+"""
+
+# Building the song folders.
+import hashlib
+import json
+import struct
+
+import pytest
+
+from bsaber.verifier import check_ogg_file, verify_song_folder, verify_custom_levels
+
+
+def ogg_page(payload, sequence_number=0):
+    """Return the bytes of an ogg page holding payload. The CRC is not checked, so it is 0."""
+    segment_table = bytes([255] * (len(payload) // 255) + [len(payload) % 255])
+    return b'OggS' + struct.pack('<BBqIII', 0, 0, 0, 1, sequence_number, 0) + \
+        bytes([len(segment_table)]) + segment_table + payload
+
+
+""" A whole ogg stream of three pages. """
+OGG_STREAM = b''.join(ogg_page(bytes(size), number)
+                      for number, size in enumerate([30, 600, 4000]))
+
+""" An info.dat with one characteristic holding two difficulties. """
+INFO = {'_songName': 'Light It Up', '_songSubName': 'Remix', '_songAuthorName': 'Artist',
+        '_levelAuthorName': 'Mapper', '_beatsPerMinute': 128, '_songFilename': 'song.egg',
+        '_coverImageFilename': 'cover.jpg',
+        '_difficultyBeatmapSets': [{'_beatmapCharacteristicName': 'Standard',
+                                    '_difficultyBeatmaps': [
+                                        {'_difficulty': 'Hard', '_beatmapFilename': 'Hard.dat'},
+                                        {'_difficulty': 'Expert',
+                                         '_beatmapFilename': 'Expert.dat'}]}]}
+
+
+def write_info(song_folder, **fields):
+    """Write INFO into song_folder's info.dat, with fields changed."""
+    (song_folder / 'info.dat').write_text(json.dumps(dict(INFO, **fields)))
+
+
+@pytest.fixture
+def song_folder(tmp_path):
+    """Return a song folder holding a map that the game can load."""
+    song_folder = tmp_path / '1a2b (Light It Up - Mapper)'
+    song_folder.mkdir()
+    (song_folder / 'info.dat').write_text(json.dumps(INFO))
+    (song_folder / 'song.egg').write_bytes(OGG_STREAM)
+    (song_folder / 'cover.jpg').write_bytes(b'\xff\xd8\xff' + bytes(64))
+    (song_folder / 'Hard.dat').write_text(json.dumps({'_notes': [{}, {}, {}]}))
+    (song_folder / 'Expert.dat').write_text(json.dumps({'colorNotes': [{}] * 5}))
+    return song_folder
+
+
+def test_whole_ogg_file_is_fine(tmp_path):
+    (tmp_path / 'song.egg').write_bytes(OGG_STREAM)
+
+    assert check_ogg_file(str(tmp_path / 'song.egg')) is None
+
+
+""" Size of the first page of OGG_STREAM. """
+FIRST_PAGE_SIZE = len(ogg_page(bytes(30)))
+
+
+@pytest.mark.parametrize('ogg_bytes, error', [
+    (OGG_STREAM[:-100], 'last ogg page is cut off, 100 bytes are missing'),
+    (OGG_STREAM[:FIRST_PAGE_SIZE + 28], f'ogg page at byte {FIRST_PAGE_SIZE} is cut off'),
+    (OGG_STREAM[:FIRST_PAGE_SIZE + 10], f'not an ogg page at byte {FIRST_PAGE_SIZE}'),
+    (b'RIFF' + OGG_STREAM[4:], 'not an ogg page at byte 0'),
+    (OGG_STREAM + b'junk', f'not an ogg page at byte {len(OGG_STREAM)}'),
+    (b'', 'ogg file has no pages'),
+], ids=['cut off payload', 'cut off segment table', 'cut off header', 'not ogg',
+        'trailing junk', 'empty'])
+def test_broken_ogg_file_is_found(tmp_path, ogg_bytes, error):
+    (tmp_path / 'song.egg').write_bytes(ogg_bytes)
+
+    assert check_ogg_file(str(tmp_path / 'song.egg')) == error
+
+
+def test_loadable_map_has_no_errors(song_folder):
+    report = verify_song_folder(str(song_folder))
+
+    assert report.ok and report.errors == [] and report.warnings == []
+    assert report.key == '1a2b'
+    assert report.title == 'Light It Up Remix'
+    assert report.artist == 'Artist' and report.mapper == 'Mapper' and report.bpm == 128
+    assert [(difficulty['difficulty'], difficulty['notes'])
+            for difficulty in report.difficulties] == [('Hard', 3), ('Expert', 5)]
+
+
+def test_map_hash_is_computed_like_the_game(song_folder):
+    map_bytes = b''.join((song_folder / file).read_bytes()
+                         for file in ['info.dat', 'Hard.dat', 'Expert.dat'])
+    expected_hash = hashlib.sha1(map_bytes).hexdigest().upper()
+
+    assert verify_song_folder(str(song_folder)).hash == expected_hash
+
+
+def test_cut_off_audio_is_an_error(song_folder):
+    (song_folder / 'song.egg').write_bytes(OGG_STREAM[:-1])
+    report = verify_song_folder(str(song_folder))
+
+    assert not report.ok
+    assert report.errors == ['audio file song.egg is broken: '
+                             'last ogg page is cut off, 1 bytes are missing']
+
+
+def test_missing_audio_is_an_error(song_folder):
+    (song_folder / 'song.egg').unlink()
+
+    assert verify_song_folder(str(song_folder)).errors == ["audio file 'song.egg' is missing"]
+
+
+def test_empty_audio_is_an_error(song_folder):
+    (song_folder / 'song.egg').write_bytes(b'')
+
+    assert 'song.egg is empty' in verify_song_folder(str(song_folder)).errors
+
+
+def test_files_are_found_without_case(song_folder):
+    (song_folder / 'Hard.dat').rename(song_folder / 'hard.DAT')
+
+    assert verify_song_folder(str(song_folder)).ok
+
+
+def test_missing_difficulty_file_is_an_error(song_folder):
+    (song_folder / 'Expert.dat').unlink()
+    report = verify_song_folder(str(song_folder))
+
+    assert report.errors == ["difficulty file 'Expert.dat' is missing"]
+    assert report.hash is None
+    assert report.difficulties[1]['notes'] is None
+
+
+def test_unparseable_difficulty_file_is_an_error(song_folder):
+    (song_folder / 'Hard.dat').write_text('{"_notes": [')
+    report = verify_song_folder(str(song_folder))
+
+    assert len(report.errors) == 1
+    assert report.errors[0].startswith('difficulty file Hard.dat can not be parsed')
+    assert report.hash is None
+    assert report.difficulties[1]['notes'] == 5
+
+
+def test_map_without_difficulties_is_an_error(song_folder):
+    write_info(song_folder, _difficultyBeatmapSets=[])
+
+    assert verify_song_folder(str(song_folder)).errors == ["info.dat lists no difficulties"]
+
+
+def test_missing_cover_is_only_a_warning(song_folder):
+    (song_folder / 'cover.jpg').unlink()
+    report = verify_song_folder(str(song_folder))
+
+    assert report.ok
+    assert report.warnings == ["cover image 'cover.jpg' is missing"]
+
+
+@pytest.mark.parametrize('difficulty_sets, error', [
+    ([None], "info.dat lists a difficulty set that is not a set"),
+    ([{'_beatmapCharacteristicName': 'Standard', '_difficultyBeatmaps': [None]}],
+     "info.dat lists a Standard difficulty that is not a map"),
+    ([{'_beatmapCharacteristicName': 'Standard',
+       '_difficultyBeatmaps': [{'_difficulty': 'Hard', '_beatmapFilename': 5}]}],
+     "difficulty file '' is missing"),
+    ('not a list', "info.dat lists no difficulties"),
+    ([{'_difficultyBeatmaps': 'not a list'}], "info.dat lists no difficulties"),
+], ids=['null set', 'null beatmap', 'number file name', 'sets not a list', 'beatmaps not a list'])
+def test_malformed_difficulties_are_an_error(song_folder, difficulty_sets, error):
+    write_info(song_folder, _difficultyBeatmapSets=difficulty_sets)
+    report = verify_song_folder(str(song_folder))
+
+    assert not report.ok and error in report.errors
+
+
+def test_malformed_difficulty_set_does_not_hide_the_others(song_folder):
+    difficulty_sets = [None] + INFO['_difficultyBeatmapSets']
+    write_info(song_folder, _difficultyBeatmapSets=difficulty_sets)
+    report = verify_song_folder(str(song_folder))
+
+    assert report.errors == ["info.dat lists a difficulty set that is not a set"]
+    assert [difficulty['notes'] for difficulty in report.difficulties] == [3, 5]
+
+
+@pytest.mark.parametrize('song_filename', [5, ['song.egg'], None, {'name': 'song.egg'}])
+def test_audio_file_name_that_is_not_a_string_is_an_error(song_folder, song_filename):
+    write_info(song_folder, _songFilename=song_filename)
+
+    assert verify_song_folder(str(song_folder)).errors == \
+        [f"audio file {song_filename!r} is missing"]
+
+
+def test_metadata_that_is_not_a_string_is_left_out(song_folder):
+    write_info(song_folder, _songName=5, _songSubName='Remix', _songAuthorName=['Artist'],
+               _levelAuthorName={'name': 'Mapper'}, _beatsPerMinute='fast',
+               _coverImageFilename=7)
+    report = verify_song_folder(str(song_folder))
+
+    assert report.ok
+    assert report.title == 'Remix'
+    assert report.artist is None and report.mapper is None and report.bpm is None
+
+
+def test_info_that_is_not_an_object_is_an_error(song_folder):
+    (song_folder / 'info.dat').write_text('[1, 2, 3]')
+
+    assert verify_song_folder(str(song_folder)).errors == ["info.dat is not a map's info.dat"]
+
+
+def test_one_malformed_map_does_not_stop_the_run(tmp_path, song_folder):
+    broken_folder = tmp_path / '3c4d (Broken)'
+    broken_folder.mkdir()
+    write_info(broken_folder, _difficultyBeatmapSets=[None], _songName=5)
+
+    reports = verify_custom_levels(str(tmp_path)).reports
+
+    assert sorted((report.key, report.ok) for report in reports) == [('1a2b', True),
+                                                                      ('3c4d', False)]